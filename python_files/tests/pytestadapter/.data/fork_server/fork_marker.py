@@ -0,0 +1,6 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import os
+
+# The process which imported this module, the fork server when it is preloaded.
+IMPORT_PID = os.getpid()
@@ -0,0 +1,10 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import os
+
+import fork_marker
+
+
+def test_preloaded():  # test_marker--test_preloaded
+    # Only passes in a fork of the process which preloaded the module.
+    assert fork_marker.IMPORT_PID != os.getpid()
@@ -0,0 +1,82 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for building the discovery tree of heavily parametrized test suites.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_build_test_tree [total_cases]
+
+Half of the cases belong to a parametrized function and half to a parametrized method of a
+class, which exercises the function and class child insertion paths of build_test_tree. The
+time per case should stay flat as the number of cases grows.
+"""
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import pytest
+
+script_dir = pathlib.Path(__file__).parent.parent.parent.parent
+sys.path.append(os.fspath(script_dir))
+
+from vscode_pytest import build_test_tree  # noqa: E402
+
+TEST_FILE_TEMPLATE = """
+import pytest
+
+
+@pytest.mark.parametrize("case", range({cases}))
+def test_function(case):
+    pass
+
+
+class TestClass:
+    @pytest.mark.parametrize("case", range({cases}))
+    def test_method(self, case):
+        pass
+"""
+
+
+class SessionCapture:
+    """A pytest plugin that keeps a reference to the session once collection has finished."""
+
+    def __init__(self):
+        self.session = None
+
+    def pytest_collection_finish(self, session):
+        self.session = session
+
+
+def collect(folder: pathlib.Path, total_cases: int) -> pytest.Session:
+    test_file = folder / f"test_bench_{total_cases}.py"
+    test_file.write_text(TEST_FILE_TEMPLATE.format(cases=total_cases // 2), encoding="utf-8")
+    capture = SessionCapture()
+    pytest.main(
+        [os.fspath(test_file), "--collect-only", "-q", "-p", "no:cacheprovider"],
+        plugins=[capture],
+    )
+    if capture.session is None:
+        raise RuntimeError(f"Collection of {test_file} failed.")
+    return capture.session
+
+
+def main(max_cases: int) -> None:
+    sizes = [max_cases // 8, max_cases // 4, max_cases // 2, max_cases]
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for total_cases in sizes:
+            session = collect(pathlib.Path(temp_dir), total_cases)
+            start = time.perf_counter()
+            build_test_tree(session)
+            elapsed = time.perf_counter() - start
+            results.append((len(session.items), elapsed))
+
+    print(f"{'cases':>10} {'build (s)':>12} {'per case (us)':>15}")
+    for item_count, elapsed in results:
+        print(f"{item_count:>10} {elapsed:>12.3f} {elapsed / item_count * 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
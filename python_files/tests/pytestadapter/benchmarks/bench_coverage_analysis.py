@@ -0,0 +1,111 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for the analysis of the measured files of a coverage run.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_coverage_analysis [files] [workers]
+
+A coverage data file with branch data is generated for 2,000 source files of 20 functions each
+by default, with the first half of the functions of each file executed. The files are then
+analyzed serially, with the worker processes, "auto" workers by default, and again with the
+analysis of the workers read from the cache, and the results are compared.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import coverage
+
+import vscode_coverage_cache
+from vscode_pytest import _coverage_analysis
+
+FUNCTION_TEMPLATE = """
+def function_{index}(value):
+    if value > {index}:
+        value -= 1
+    else:
+        value += 1
+    for item in range(value):
+        value += item
+    return value
+"""
+FUNCTION_LINES = FUNCTION_TEMPLATE.count("\n")
+FUNCTIONS_PER_FILE = 20
+
+
+def get_executed_arcs(function_index: int) -> list[tuple[int, int]]:
+    """Returns the arcs of a call of a function that takes the `if` branch and loops once."""
+    first = function_index * FUNCTION_LINES + 2
+    lines = [first, first + 1, first + 2, first + 5, first + 6, first + 5, first + 7]
+    return [(-first, first + 1), *zip(lines[1:], lines[2:]), (first + 7, -first)]
+
+
+def generate_run(folder: pathlib.Path, file_count: int) -> str:
+    """Writes the source files and the coverage data of their run, returns the data file."""
+    data = coverage.CoverageData(basename=os.fspath(folder / ".coverage"))
+    arcs: dict[str, list[tuple[int, int]]] = {}
+    for file_index in range(file_count):
+        path = folder / f"module_{file_index}.py"
+        path.write_text(
+            "".join(FUNCTION_TEMPLATE.format(index=index) for index in range(FUNCTIONS_PER_FILE)),
+            encoding="utf-8",
+        )
+        arcs[os.fspath(path)] = [
+            arc for index in range(FUNCTIONS_PER_FILE // 2) for arc in get_executed_arcs(index)
+        ]
+    data.add_arcs(arcs)
+    data.write()
+    return data.data_filename()
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = sys.argv[2] if len(sys.argv) > 2 else "auto"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir)
+        data_file = generate_run(folder, file_count)
+        os.chdir(folder)
+        cov = coverage.Coverage(data_file=data_file, branch=True)
+        cov.load()
+        files = sorted(cov.get_data().measured_files())
+
+        start = time.perf_counter()
+        cache = vscode_coverage_cache.AnalysisCache(cov)
+        serial = _coverage_analysis.analyze_files(cov, files, cache, include_branches=True)
+        serial_time = time.perf_counter() - start
+
+        os.environ[_coverage_analysis.ANALYSIS_WORKERS_ENV] = workers
+        worker_count = _coverage_analysis.get_worker_count(len(files))
+        # A new coverage object, so the workers do not benefit from the serial run's caches.
+        cov = coverage.Coverage(data_file=data_file, branch=True)
+        cov.load()
+        start = time.perf_counter()
+        cache_path = folder / "analysis.json"
+        parallel = _coverage_analysis.analyze_coverage(
+            cov, files, include_branches=True, cache_path=cache_path
+        )
+        parallel_time = time.perf_counter() - start
+
+        cov = coverage.Coverage(data_file=data_file, branch=True)
+        cov.load()
+        start = time.perf_counter()
+        cached = _coverage_analysis.analyze_coverage(
+            cov, files, include_branches=True, cache_path=cache_path
+        )
+        cached_time = time.perf_counter() - start
+
+        assert parallel == serial
+        assert cached == serial
+        print(f"{len(files)} files, {os.cpu_count()} CPUs")
+        print(f"  serial: {serial_time:6.2f}s")
+        print(f"{worker_count:>2} workers: {parallel_time:6.2f}s")
+        print(f"  cached: {cached_time:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for the size and the memory of the coverage payloads of a large run.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_coverage_payload [files] [source files]
+
+The statements of 500 modules of the standard library are analyzed by default, and their
+lines are split into covered and missed blocks of 10 lines, like partly tested functions. The
+run then has 20,000 files by default, the analyzed modules repeated under other names. The
+regular payload and the chunks of the `ranges` encoding are serialized like they are sent, and
+their size and the peak memory of building and serializing them are compared.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import sys
+import sysconfig
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Iterator
+
+import coverage
+
+from vscode_pytest import _coverage_encoding
+
+if TYPE_CHECKING:
+    from vscode_pytest._coverage_analysis import FileCoverageInfo
+
+
+def get_line_sets(source_count: int) -> list[FileCoverageInfo]:
+    """Returns the coverage of standard library modules with every other block of lines hit."""
+    stdlib = pathlib.Path(sysconfig.get_paths()["stdlib"])
+    cov = coverage.Coverage(data_file=None)
+    line_sets: list[FileCoverageInfo] = []
+    for path in sorted(stdlib.glob("*.py"))[:source_count]:
+        try:
+            statements = cov.analysis2(os.fspath(path))[1]
+        except Exception:
+            continue
+        line_sets.append(
+            {
+                "lines_covered": [line for line in statements if line // 10 % 2 == 0],
+                "lines_missed": [line for line in statements if line // 10 % 2 == 1],
+                "executed_branches": 0,
+                "total_branches": -1,
+            }
+        )
+    return line_sets
+
+
+def iter_files(
+    line_sets: list[FileCoverageInfo], file_count: int
+) -> Iterator[tuple[str, FileCoverageInfo]]:
+    """Yields new coverage for each file, like the analysis of the files of a run."""
+    for index in range(file_count):
+        line_set = line_sets[index % len(line_sets)]
+        yield (
+            f"/workspace/project/package_{index // 100}/module_{index}.py",
+            {
+                "lines_covered": list(line_set["lines_covered"]),
+                "lines_missed": list(line_set["lines_missed"]),
+                "executed_branches": line_set["executed_branches"],
+                "total_branches": line_set["total_branches"],
+            },
+        )
+
+
+def measure_regular(line_sets: list[FileCoverageInfo], file_count: int) -> tuple[int, int]:
+    """Returns the size of the regular payload and the peak memory of sending it."""
+    tracemalloc.start()
+    payload = {
+        "coverage": True,
+        "cwd": "/workspace/project",
+        "result": dict(iter_files(line_sets, file_count)),
+        "error": None,
+    }
+    size = len(json.dumps(payload))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak
+
+
+def measure_ranges(line_sets: list[FileCoverageInfo], file_count: int) -> tuple[int, int]:
+    """Returns the total size of the chunks of the `ranges` encoding and the peak memory."""
+    tracemalloc.start()
+    size = 0
+    for chunk in _coverage_encoding.iter_encoded_chunks(iter_files(line_sets, file_count)):
+        payload = {
+            "coverage": True,
+            "cwd": "/workspace/project",
+            "result": chunk,
+            "error": None,
+            "encoding": _coverage_encoding.ENCODING_RANGES,
+        }
+        size += len(json.dumps(payload))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    line_sets = get_line_sets(source_count)
+    lines = sum(len(s["lines_covered"]) + len(s["lines_missed"]) for s in line_sets)
+    print(f"{file_count} files, {lines // len(line_sets)} statements per file on average")
+    for name, measure in (("regular", measure_regular), ("ranges", measure_ranges)):
+        start = time.perf_counter()
+        size, peak = measure(line_sets, file_count)
+        duration = time.perf_counter() - start
+        print(
+            f"{name:>8}: {size / 2**20:8.1f} MiB sent, {peak / 2**20:8.1f} MiB peak, {duration:6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
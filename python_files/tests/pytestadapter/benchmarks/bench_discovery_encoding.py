@@ -0,0 +1,115 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for the size and the encode time of the regular and the compact discovery payloads.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_discovery_encoding [modules] [tests]
+
+The tree has 500 test modules by default, in folders of 50 modules, with a class and a function
+of 20 parametrized tests in each module. The folders are nested under a long root, like the
+path of a workspace. The discovery runs once in each format with the payload written to a file,
+then the tree is encoded repeatedly in the process like the plugin does.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import timeit
+from typing import Any
+
+from vscode_pytest import PathEncoder
+from vscode_pytest._compact_encoding import decode_tree, encode_payload
+
+SCRIPT_DIR = pathlib.Path(__file__).parent.parent.parent.parent
+MODULES_PER_FOLDER = 50
+
+TEST_MODULE_TEMPLATE = """
+import pytest
+
+
+class TestModule{index}:
+    @pytest.mark.parametrize("case", range({tests}))
+    def test_method(self, case):
+        pass
+
+
+@pytest.mark.parametrize("case", range({tests}))
+def test_function(case):
+    pass
+"""
+
+
+def discover(folder: pathlib.Path, encoding: str) -> str:
+    """Runs a discovery of the folder and returns the JSON of the payload."""
+    payload_path = folder.parent / f"payload-{encoding}.txt"
+    env = os.environ.copy()
+    env.update(
+        {
+            "PYTHONPATH": os.fspath(SCRIPT_DIR),
+            "TEST_RUN_PIPE": os.fspath(payload_path),
+            "DISCOVERY_ENCODING": encoding,
+        }
+    )
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-p", "vscode_pytest", "--collect-only", "-q"],
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+    content = payload_path.read_text(encoding="utf-8")
+    message = json.loads(content[content.index("{") :])
+    return json.dumps(message["params"])
+
+
+def to_path_objects(node: dict[str, Any]) -> dict[str, Any]:
+    """Returns a tree with `pathlib.Path` paths, like the tree the plugin builds."""
+    node = {**node, "path": pathlib.Path(node["path"])}
+    if "children" in node:
+        node["children"] = [to_path_objects(child) for child in node["children"]]
+    return node
+
+
+def main() -> None:
+    modules = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    tests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir, "workspace", "my-project", "src", "tests")
+        for index in range(modules):
+            module_folder = folder / f"folder_{index // MODULES_PER_FOLDER}"
+            module_folder.mkdir(parents=True, exist_ok=True)
+            (module_folder / f"test_module_{index}.py").write_text(
+                TEST_MODULE_TEMPLATE.format(index=index, tests=tests), encoding="utf-8"
+            )
+
+        regular_json = discover(folder, "")
+        compact_json = discover(folder, "v2")
+        regular = json.loads(regular_json)
+        compact = json.loads(compact_json)
+        if decode_tree(compact["tests"], compact["paths"]) != regular["tests"]:
+            raise RuntimeError("The compact tree does not decode to the regular tree.")
+
+        payload = {**regular, "tests": to_path_objects(regular["tests"])}
+        number = 5
+        regular_time = timeit.timeit(lambda: json.dumps(payload, cls=PathEncoder), number=number)
+        compact_time = timeit.timeit(lambda: json.dumps(encode_payload(payload)), number=number)
+
+        print(f"{modules} test modules, {modules * tests * 2} tests, root {folder}")
+        print(
+            f"{'regular':>8}: {len(regular_json):>11,} bytes, "
+            f"{regular_time / number * 1000:7.1f}ms to encode"
+        )
+        print(
+            f"{'compact':>8}: {len(compact_json):>11,} bytes, "
+            f"{compact_time / number * 1000:7.1f}ms to encode, "
+            f"{len(compact_json) / len(regular_json):.0%} of the size"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for the discovery of a function parametrized over a large table of cases.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_lazy_parametrize [cases] [threshold]
+
+The test file has one function parametrized over 50,000 cases by default, next to a few regular
+tests. The discovery runs once sending all the cases and once with the cases of functions above
+the threshold written to pages, with the payload written to a file. The size of the payload is
+what the extension parses before it can show the tree, the pages are only read on expansion.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = pathlib.Path(__file__).parent.parent.parent.parent
+
+TEST_FILE_TEMPLATE = """
+import pytest
+
+ROWS = [(i, str(i)) for i in range({cases})]
+
+
+@pytest.mark.parametrize(("number", "text"), ROWS)
+def test_row(number, text):
+    assert str(number) == text
+
+
+@pytest.mark.parametrize("case", range(10))
+def test_small(case):
+    pass
+
+
+def test_plain():
+    pass
+"""
+
+
+def discover(folder: pathlib.Path, threshold: str) -> tuple[float, int, int]:
+    """Runs a discovery and returns the elapsed time, the payload size and the number of tests."""
+    payload_path = folder.parent / f"payload-{threshold or 'all'}.txt"
+    env = os.environ.copy()
+    env.update(
+        {
+            "PYTHONPATH": os.fspath(SCRIPT_DIR),
+            "TEST_RUN_PIPE": os.fspath(payload_path),
+            "DISCOVERY_LAZY_PARAMETRIZE_THRESHOLD": threshold,
+        }
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-p", "vscode_pytest", "--collect-only", "-q"],
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+    elapsed = time.perf_counter() - start
+    content = payload_path.read_text(encoding="utf-8")
+    payload = json.loads(content[content.index("{") :])["params"]
+
+    def count(node: dict) -> int:
+        if node["type_"] == "test":
+            return 1
+        return node.get("count", 0) + sum(map(count, node["children"]))
+
+    return elapsed, len(json.dumps(payload)), count(payload["tests"])
+
+
+def main() -> None:
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    threshold = sys.argv[2] if len(sys.argv) > 2 else "1000"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir, "tests")
+        folder.mkdir()
+        (folder / "test_table.py").write_text(
+            TEST_FILE_TEMPLATE.format(cases=cases), encoding="utf-8"
+        )
+
+        print(f"{cases} cases, threshold {threshold}")
+        for name, value in (("all cases", ""), ("paged", threshold)):
+            elapsed, size, tests = discover(folder, value)
+            print(f"{name:>10}: {elapsed:7.2f}s, {size:>11,} bytes, {tests} tests")
+
+
+if __name__ == "__main__":
+    main()
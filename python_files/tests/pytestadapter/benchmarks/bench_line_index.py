@@ -0,0 +1,81 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for looking up the lines of test classes and methods.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_line_index [classes] [methods]
+
+A module with 20 classes of 500 test methods each by default is imported, then the line of
+each class and method is looked up with `inspect.getsourcelines` like the adapters used to,
+and with the line index of the module.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import inspect
+import linecache
+import pathlib
+import sys
+import tempfile
+import time
+
+import vscode_line_index
+
+
+def write_module(path: pathlib.Path, classes: int, methods: int) -> None:
+    lines = ["import unittest", ""]
+    for class_index in range(classes):
+        lines += ["", f"class TestClass{class_index}(unittest.TestCase):"]
+        for method_index in range(methods):
+            lines += [f"    def test_{method_index}(self):", "        self.assertTrue(True)", ""]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def inspect_lines(classes: list[type]) -> None:
+    """Looks up the lines the way the adapters did before the index."""
+    for cls in classes:
+        inspect.getsourcelines(cls)
+        for name, method in vars(cls).items():
+            if name.startswith("test_"):
+                source_lines, start_line = inspect.getsourcelines(method)
+                for offset, line in enumerate(source_lines):
+                    if line.strip().startswith("def"):
+                        start_line += offset
+                        break
+
+
+def index_lines(classes: list[type]) -> None:
+    for cls in classes:
+        vscode_line_index.get_definition_lines(cls)
+        for name, method in vars(cls).items():
+            if name.startswith("test_"):
+                vscode_line_index.get_definition_lines(method)
+
+
+def main() -> None:
+    classes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    methods = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = pathlib.Path(temp_dir, "test_large.py")
+        write_module(path, classes, methods)
+        spec = importlib.util.spec_from_file_location("test_large", path)
+        assert spec is not None
+        assert spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["test_large"] = module
+        spec.loader.exec_module(module)
+        test_classes = [getattr(module, f"TestClass{index}") for index in range(classes)]
+
+        print(f"{classes} classes of {methods} methods")
+        for name, lookup in (("inspect", inspect_lines), ("index", index_lines)):
+            linecache.clearcache()
+            vscode_line_index.clear()
+            start = time.perf_counter()
+            lookup(test_classes)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>8}: {elapsed:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Profile of the per-item cost of resolving node paths and absolute test ids.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_node_paths [files] [tests] [--profile]
+
+The tests are collected once in the process, 100 files with a class and a function of 250
+parametrized cases each by default, 50,000 items. Then the discovery tree is built and the
+absolute id of each item is resolved like for its test report, without and with a symlinked
+root. With `--profile` the functions the tree building spends the most time in are printed.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import io
+import os
+import pathlib
+import pstats
+import sys
+import tempfile
+import time
+
+import pytest
+
+import vscode_pytest
+
+TEST_FILE_TEMPLATE = """
+import pytest
+
+
+class TestClass:
+    @pytest.mark.parametrize("case", range({tests}))
+    def test_method(self, case):
+        pass
+
+
+@pytest.mark.parametrize("case", range({tests}))
+def test_function(case):
+    pass
+"""
+
+
+class SessionGrabber:
+    """Keeps the session after the collection."""
+
+    session: pytest.Session | None = None
+
+    def pytest_collection_finish(self, session: pytest.Session) -> None:
+        self.session = session
+
+
+def report_ids(items: list[pytest.Item]) -> None:
+    """Resolves the absolute id of each item like the reporting hooks do."""
+    for item in items:
+        vscode_pytest.map_id_to_path[item.nodeid] = vscode_pytest.get_node_path(item)
+    for item in items:
+        vscode_pytest.get_absolute_test_id(item.nodeid, vscode_pytest.map_id_to_path[item.nodeid])
+        vscode_pytest.node_path_resolver.get_cwd()
+
+
+def measure(session: pytest.Session, label: str, *, profile: bool) -> None:
+    items = session.items
+    # The first build also reads the source of the classes, which is cached after.
+    vscode_pytest.build_test_tree(session)
+    start = time.perf_counter()
+    vscode_pytest.build_test_tree(session)
+    tree_time = time.perf_counter() - start
+    start = time.perf_counter()
+    report_ids(items)
+    report_time = time.perf_counter() - start
+    print(
+        f"{label:>10}: tree {tree_time:6.2f}s ({tree_time / len(items) * 1e6:5.1f}us/item), "
+        f"reports {report_time:6.2f}s ({report_time / len(items) * 1e6:5.1f}us/item)"
+    )
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(vscode_pytest.build_test_tree, session)
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(8)
+
+
+def main() -> None:
+    args = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    profile = "--profile" in sys.argv
+    files = int(args[0]) if args else 100
+    tests = int(args[1]) if len(args) > 1 else 250
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = pathlib.Path(temp_dir).resolve()
+        folder = root / "tests"
+        folder.mkdir()
+        for index in range(files):
+            (folder / f"test_file_{index}.py").write_text(
+                TEST_FILE_TEMPLATE.format(tests=tests), encoding="utf-8"
+            )
+        link = root / "link"
+        link.symlink_to(folder, target_is_directory=True)
+
+        grabber = SessionGrabber()
+        os.chdir(folder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            pytest.main(
+                [os.fspath(folder), "--collect-only", "-q", "-p", "no:cacheprovider"],
+                plugins=[grabber],
+            )
+        session = grabber.session
+        assert session is not None
+        print(f"{len(session.items)} items in {files} files")
+        measure(session, "no symlink", profile=profile)
+        vscode_pytest.SYMLINK_PATH = link
+        measure(session, "symlink", profile=profile)
+
+
+if __name__ == "__main__":
+    main()
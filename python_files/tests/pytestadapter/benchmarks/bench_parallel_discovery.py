@@ -0,0 +1,98 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for discovering a large generated test tree in parallel worker processes.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_parallel_discovery [modules] [workers]
+
+The tree has 2,000 test modules by default, in folders of 50 modules. Importing each module
+does a fixed amount of CPU work, like the imports of a real test suite. The discovery runs once
+in a single process and once with one worker per CPU by default, with the payload written to a
+file. The speedup should approach the number of workers as the tree grows, less the startup of
+each worker and the merge.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = pathlib.Path(__file__).parent.parent.parent.parent
+MODULES_PER_FOLDER = 50
+
+TEST_MODULE_TEMPLATE = """
+import pytest
+
+# The import-time work of a real test module, like importing the code under test.
+TABLE = sorted(str(i * i) for i in range(20_000))
+
+
+class TestModule{index}:
+    def test_method(self):
+        pass
+
+
+@pytest.mark.parametrize("case", range(5))
+def test_function(case):
+    pass
+"""
+
+
+def discover(folder: pathlib.Path, workers: int) -> tuple[float, int]:
+    """Runs a discovery of the folder and returns the elapsed time and the number of tests."""
+    payload_path = folder.parent / "payload.txt"
+    env = os.environ.copy()
+    env.update(
+        {
+            "PYTHONPATH": os.fspath(SCRIPT_DIR),
+            "TEST_RUN_PIPE": os.fspath(payload_path),
+            "TEST_DISCOVERY_WORKERS": str(workers),
+        }
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-p", "vscode_pytest", "--collect-only", "-q"],
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+    elapsed = time.perf_counter() - start
+    content = payload_path.read_text(encoding="utf-8")
+    payload = json.loads(content[content.index("{") :])["params"]
+
+    def count(node: dict) -> int:
+        return 1 if node["type_"] == "test" else sum(map(count, node["children"]))
+
+    return elapsed, count(payload["tests"])
+
+
+def main() -> None:
+    modules = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir, "tests")
+        for index in range(modules):
+            module_folder = folder / f"folder_{index // MODULES_PER_FOLDER}"
+            module_folder.mkdir(parents=True, exist_ok=True)
+            (module_folder / f"test_module_{index}.py").write_text(
+                TEST_MODULE_TEMPLATE.format(index=index), encoding="utf-8"
+            )
+
+        print(f"{modules} test modules, {workers} workers, {os.cpu_count()} CPUs")
+        serial_time, serial_tests = discover(folder, 1)
+        print(f"{'single process':>15}: {serial_time:7.2f}s, {serial_tests} tests")
+        parallel_time, parallel_tests = discover(folder, workers)
+        print(
+            f"{f'{workers} workers':>15}: {parallel_time:7.2f}s, {parallel_tests} tests, "
+            f"{serial_time / parallel_time:.2f}x speedup"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for running a CPU bound test suite in parallel shards through run_pytest_script.py.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_sharded_execution [files] [tests] [shards]
+
+Every test does a fixed amount of CPU work, about 50ms on a dev box. The suite runs once
+without sharding and once with one shard per CPU by default, both through the extension's pipe.
+The speedup should approach the number of CPUs as the suite grows, less the startup of each
+shard.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+script_dir = pathlib.Path(__file__).parent.parent.parent.parent
+sys.path.append(os.fspath(script_dir))
+
+from tests.pytestadapter.helpers import runner_with_cwd_env  # noqa: E402
+
+TEST_FILE_TEMPLATE = """
+import pytest
+
+
+@pytest.mark.parametrize("case", range({tests}))
+def test_cpu_bound(case):
+    assert sum(i * i for i in range(500_000)) > case
+"""
+
+
+def run(folder: pathlib.Path, test_ids: list[str], shards: str) -> tuple[float, int]:
+    """Runs the tests and returns the elapsed time and the number of results received."""
+    ids_path = folder / "test_ids.txt"
+    ids_path.write_text("\n".join(test_ids), encoding="utf-8")
+    start = time.perf_counter()
+    messages = runner_with_cwd_env(
+        [f"--rootdir={os.fspath(folder)}", "-p", "no:cacheprovider"],
+        folder,
+        {"RUN_TEST_IDS_PIPE": os.fspath(ids_path), "TEST_RUN_SHARDS": shards},
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(len(message.get("result") or {}) for message in messages or [])
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    tests_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    cpus = os.cpu_count() or 1
+    shards = int(sys.argv[3]) if len(sys.argv) > 3 else cpus
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir)
+        test_ids = []
+        for index in range(files):
+            test_file = folder / f"test_bench_{index}.py"
+            test_file.write_text(TEST_FILE_TEMPLATE.format(tests=tests_per_file), encoding="utf-8")
+            test_ids.extend(
+                f"{test_file}::test_cpu_bound[{case}]" for case in range(tests_per_file)
+            )
+
+        print(f"{len(test_ids)} tests in {files} files, {cpus} CPUs")
+        serial_time, serial_results = run(folder, test_ids, "1")
+        print(f"{'not sharded':>12}: {serial_time:7.2f}s, {serial_results} results")
+        sharded_time, sharded_results = run(folder, test_ids, str(shards))
+        print(
+            f"{f'{shards} shards':>12}: {sharded_time:7.2f}s, {sharded_results} results, "
+            f"{serial_time / sharded_time:.2f}x speedup"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for running only the tests affected by a change, from the test impact index.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_test_impact [modules] [functions] [sleep ms]
+
+Each of the 20 source modules has 20 functions by default, each tested by one test that sleeps
+for 5ms like a test that does some work. The whole suite runs with coverage, without and with
+the index, then one line of one function changes and the tests the diff affects are selected
+and run with coverage.
+"""
+
+from __future__ import annotations
+
+import difflib
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from vscode_pytest import affected_tests
+
+SCRIPT = (
+    pathlib.Path(__file__).parent.parent.parent.parent / "vscode_pytest" / "run_pytest_script.py"
+)
+
+FUNCTION_TEMPLATE = """
+def function_{index}(value):
+    if value > {index}:
+        return value - {index}
+    return value + {index}
+"""
+
+TEST_TEMPLATE = """
+def test_function_{index}():
+    time.sleep({sleep})
+    assert module_{module}.function_{index}({index}) == {expected}
+"""
+
+
+def run(folder: pathlib.Path, test_ids: list[str], *, index: bool) -> float:
+    """Runs the tests with coverage and returns the elapsed time."""
+    ids_path = folder / "test_ids.txt"
+    ids_path.write_text("\n".join(test_ids), encoding="utf-8")
+    env = os.environ.copy()
+    env.update(
+        {
+            "COVERAGE_ENABLED": "True",
+            "RUN_TEST_IDS_PIPE": os.fspath(ids_path),
+            "TEST_RUN_PIPE": os.fspath(folder / "messages.txt"),
+            "TEST_IMPACT_INDEX_ENABLED": "True" if index else "False",
+        }
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.fspath(SCRIPT), f"--rootdir={os.fspath(folder)}"],
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    modules = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    sleep = (int(sys.argv[3]) if len(sys.argv) > 3 else 5) / 1000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir).resolve()
+        test_files = []
+        for module in range(modules):
+            (folder / f"module_{module}.py").write_text(
+                "".join(FUNCTION_TEMPLATE.format(index=index) for index in range(functions)),
+                encoding="utf-8",
+            )
+            test_file = folder / f"test_module_{module}.py"
+            test_file.write_text(
+                f"import time\n\nimport module_{module}\n\n"
+                + "".join(
+                    TEST_TEMPLATE.format(
+                        module=module, index=index, sleep=sleep, expected=index * 2
+                    )
+                    for index in range(functions)
+                ),
+                encoding="utf-8",
+            )
+            test_files.append(os.fspath(test_file))
+
+        print(f"{modules * functions} tests in {modules} files")
+        plain_time = run(folder, test_files, index=False)
+        print(f"{'full run':>22}: {plain_time:7.2f}s")
+        index_time = run(folder, test_files, index=True)
+        print(f"{'full run with index':>22}: {index_time:7.2f}s")
+
+        # The last line of the middle function of the first module changes.
+        source_path = folder / "module_0.py"
+        old_lines = source_path.read_text(encoding="utf-8").splitlines(keepends=True)
+        line_number = (functions // 2) * FUNCTION_TEMPLATE.count("\n") + 4
+        new_lines = list(old_lines)
+        new_lines[line_number] = new_lines[line_number].replace("return value +", "return +value +")
+        diff = "".join(
+            difflib.unified_diff(old_lines, new_lines, "a/module_0.py", "b/module_0.py", n=0)
+        )
+        source_path.write_text("".join(new_lines), encoding="utf-8")
+        diff_path = folder / "changes.diff"
+        diff_path.write_text(diff, encoding="utf-8")
+        ids_path = folder / "affected.txt"
+        os.chdir(folder)
+        start = time.perf_counter()
+        affected_tests.main(["--diff", os.fspath(diff_path), "--output", os.fspath(ids_path)])
+        select_time = time.perf_counter() - start
+        test_ids = ids_path.read_text(encoding="utf-8").splitlines()
+        print(f"{'selection':>22}: {select_time:7.2f}s, {len(test_ids)} tests affected")
+        affected_time = run(folder, test_ids, index=True)
+        print(f"{'affected tests run':>22}: {affected_time:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
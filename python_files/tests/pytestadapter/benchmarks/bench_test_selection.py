@@ -0,0 +1,91 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for running a large selection of test ids through run_pytest_script.py.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_test_selection [files] [tests] [step]
+
+Every `step`th test of each file is selected, all of them by default like when running the
+whole workspace. The tests do nothing, so the time is spent in pytest and the plugin. The
+selection runs once with each test id as a pytest argument and once selecting by file, where
+only the files are arguments and the plugin deselects the tests that were not requested.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = (
+    pathlib.Path(__file__).parent.parent.parent.parent / "vscode_pytest" / "run_pytest_script.py"
+)
+
+TEST_FILE_TEMPLATE = """
+import pytest
+
+
+@pytest.mark.parametrize("case", range({tests}))
+def test_case(case):
+    pass
+"""
+
+
+def run(folder: pathlib.Path, test_ids: list[str], select_by_file: str) -> float:
+    """Runs the tests and returns the elapsed time.
+
+    The messages are written to a file, which is faster to receive than the extension's pipe.
+    """
+    ids_path = folder / "test_ids.txt"
+    ids_path.write_text("\n".join(test_ids), encoding="utf-8")
+    env = os.environ.copy()
+    env.update(
+        {
+            "RUN_TEST_IDS_PIPE": os.fspath(ids_path),
+            "TEST_RUN_PIPE": os.fspath(folder / "messages.txt"),
+            "TEST_RUN_SELECT_BY_FILE": select_by_file,
+        }
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            os.fspath(SCRIPT),
+            f"--rootdir={os.fspath(folder)}",
+            "-p",
+            "no:cacheprovider",
+        ],
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    tests_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    step = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = pathlib.Path(temp_dir)
+        test_ids = []
+        for index in range(files):
+            test_file = folder / f"test_bench_{index}.py"
+            test_file.write_text(TEST_FILE_TEMPLATE.format(tests=tests_per_file), encoding="utf-8")
+            test_ids.extend(
+                f"{test_file}::test_case[{case}]" for case in range(0, tests_per_file, step)
+            )
+
+        print(f"{len(test_ids)} of {files * tests_per_file} tests selected in {files} files")
+        ids_time = run(folder, test_ids, "False")
+        print(f"{'test ids':>15}: {ids_time:7.2f}s")
+        files_time = run(folder, test_ids, "True")
+        print(f"{'select by file':>15}: {files_time:7.2f}s, {ids_time / files_time:.2f}x speedup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmark for distributing a test suite with skewed durations across pytest-xdist workers.
+
+Run from the python_files folder with:
+    python -m tests.pytestadapter.benchmarks.bench_xdist_scheduling [workers] [modules]
+
+The suite has many fast modules and a few slow integration modules. Each idle worker takes the
+next work unit of the queue, like pytest-xdist's loadscope scheduling, and the makespan is the
+time the last worker finishes. The queue is ordered like pytest-xdist (most tests first) and
+longest expected duration first, as by the duration balanced scheduler. The lower bound is the
+larger of the total duration divided by the workers and the longest work unit.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import pathlib
+import random
+import sys
+
+script_dir = pathlib.Path(__file__).parent.parent.parent.parent
+sys.path.append(os.fspath(script_dir))
+
+from vscode_pytest._xdist_scheduling import get_work_unit_duration, sort_work_units  # noqa: E402
+
+
+def create_suite(
+    modules: int, seed: int = 0
+) -> tuple[dict[str, dict[str, bool]], dict[str, float]]:
+    """Returns the work units of a synthetic suite and the durations of its tests."""
+    rng = random.Random(seed)
+    work_units: dict[str, dict[str, bool]] = {}
+    durations: dict[str, float] = {}
+    for module in range(modules):
+        scope = f"tests/test_module_{module}.py"
+        is_slow = module % 25 == 0
+        test_count = rng.randint(2, 8) if is_slow else rng.randint(5, 60)
+        work_units[scope] = {}
+        for test in range(test_count):
+            nodeid = f"{scope}::test_{test}"
+            work_units[scope][nodeid] = False
+            durations[nodeid] = rng.uniform(5.0, 20.0) if is_slow else rng.expovariate(1 / 0.05)
+    return work_units, durations
+
+
+def get_makespan(unit_durations: list[float], workers: int) -> float:
+    """Returns when the last worker finishes when each idle worker takes the next unit."""
+    finish_times = [0.0] * workers
+    for duration in unit_durations:
+        heapq.heapreplace(finish_times, finish_times[0] + duration)
+    return max(finish_times)
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    modules = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    work_units, durations = create_suite(modules)
+
+    def get_duration(nodeid: str) -> float:
+        return durations[nodeid]
+
+    def get_unit_durations(units: dict[str, dict[str, bool]]) -> list[float]:
+        return [get_work_unit_duration(nodeids, get_duration, 0.0) for nodeids in units.values()]
+
+    by_test_count = dict(sorted(work_units.items(), key=lambda item: -len(item[1])))
+    by_duration = sort_work_units(work_units, get_duration, 0.0)
+
+    unit_durations = get_unit_durations(work_units)
+    lower_bound = max(sum(unit_durations) / workers, max(unit_durations))
+    print(f"{len(durations)} tests in {modules} modules on {workers} workers")
+    print(f"{'lower bound':>20}: {lower_bound:8.2f}s")
+    for name, units in (
+        ("collection order", work_units),
+        ("most tests first", by_test_count),
+        ("longest first", by_duration),
+    ):
+        makespan = get_makespan(get_unit_durations(units), workers)
+        print(f"{name:>20}: {makespan:8.2f}s ({makespan / lower_bound:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -259,6 +259,11 @@ def runner_with_cwd_env(
         test_ids_arr = after_ids
         with open(test_ids_pipe, "w") as f:  # noqa: PTH123
             f.write("\n".join(test_ids_arr))
+    elif "RUN_TEST_IDS_PIPE" in env_add:
+        # Run the test ids in the file like the execution adapter does, through the script.
+        run_script = script_dir / "vscode_pytest" / "run_pytest_script.py"
+        process_args = [sys.executable, os.fspath(run_script), "-s", *args]
+        pipe_name = generate_random_pipe_name("pytest-execution-test")
     else:
         process_args = [sys.executable, "-m", "pytest", "-p", "vscode_pytest", "-s", *args]
         pipe_name = generate_random_pipe_name("pytest-discovery-test")
@@ -398,6 +403,18 @@ def get_absolute_test_id(test_id: str, test_path: pathlib.Path) -> str:
     return "::".join([str(test_path), *split_id])
 
 
+def pop_durations(result_dict: Dict[str, Dict[str, Any]]) -> None:
+    """Check that the durations of the test results are valid and remove them.
+
+    Durations vary between runs, so they cannot be part of the expected outputs.
+    """
+    for result in result_dict.values():
+        if "duration" in result:
+            duration = result.pop("duration")
+            assert isinstance(duration, float)
+            assert duration >= 0
+
+
 def generate_random_pipe_name(prefix=""):
     # Generate a random suffix using UUID4, ensuring uniqueness.
     random_suffix = uuid.uuid4().hex[:10]
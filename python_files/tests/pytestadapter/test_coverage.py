@@ -12,6 +12,14 @@ from packaging.version import Version
 script_dir = pathlib.Path(__file__).parent.parent
 sys.path.append(os.fspath(script_dir))
 
+import vscode_coverage_cache  # noqa: E402
+from vscode_pytest import (  # noqa: E402
+    _coverage_analysis,
+    _coverage_encoding,
+    _test_impact,
+    affected_tests,
+)
+
 from .helpers import (  # noqa: E402
     TEST_DATA_PATH,
     runner_with_cwd_env,
@@ -55,6 +63,70 @@ def test_simple_pytest_coverage():
         assert focal_function_coverage.get("total_branches") == 6
 
 
+def test_pytest_coverage_ranges_encoding():
+    """Test that the coverage sent in chunks with the lines as ranges decodes to the regular payload."""
+    cov_folder_path = TEST_DATA_PATH / "coverage_gen"
+    expected = runner_with_cwd_env([], cov_folder_path, {"COVERAGE_ENABLED": "True"})
+    assert expected
+    env_add = {"COVERAGE_ENABLED": "True", "COVERAGE_ENCODING": "ranges"}
+    actual = runner_with_cwd_env([], cov_folder_path, env_add)
+    assert actual
+    chunks = [payload for payload in actual if "coverage" in payload]
+    # The three files fit in one chunk.
+    assert len(chunks) == 1
+    assert chunks[0]["encoding"] == "ranges"
+    decoded = {
+        file: {
+            **file_coverage,
+            "lines_covered": _coverage_encoding.decode_lines(file_coverage["lines_covered"]),
+            "lines_missed": _coverage_encoding.decode_lines(file_coverage["lines_missed"]),
+        }
+        for file, file_coverage in chunks[0]["result"].items()
+    }
+    expected_result = {
+        file: {
+            **file_coverage,
+            "lines_covered": sorted(file_coverage["lines_covered"]),
+            "lines_missed": sorted(file_coverage["lines_missed"]),
+        }
+        for file, file_coverage in expected[-1]["result"].items()
+    }
+    assert decoded == expected_result
+
+
+@pytest.mark.parametrize(
+    ("lines", "encoded"),
+    [
+        ([], []),
+        ([5], [5, 1]),
+        ([10, 8, 7, 3, 2, 1], [1, 3, 3, 2, 1, 1]),
+        ([1, 2, 3, 4], [1, 4]),
+        ([3, 1, 2, 3, 1], [1, 3]),
+    ],
+)
+def test_coverage_lines_ranges(lines, encoded):
+    """Test that line sets are encoded as gap, length pairs and decoded back in order."""
+    assert _coverage_encoding.encode_lines(lines) == encoded
+    assert _coverage_encoding.decode_lines(encoded) == sorted(set(lines))
+
+
+def test_coverage_encoded_chunks():
+    """Test that the files are encoded in chunks, with one empty chunk for a run without files."""
+    file_coverage = _coverage_analysis.FileCoverageInfo(
+        lines_covered=[1, 2], lines_missed=[4], executed_branches=0, total_branches=-1
+    )
+    files_coverage = [(f"module_{index}.py", file_coverage) for index in range(5)]
+    chunks = list(_coverage_encoding.iter_encoded_chunks(files_coverage, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0]["module_0.py"] == {
+        "lines_covered": [1, 2],
+        "lines_missed": [4, 1],
+        "executed_branches": 0,
+        "total_branches": -1,
+    }
+    assert list(_coverage_encoding.iter_encoded_chunks([], chunk_size=2)) == [{}]
+
+
 coverage_gen_file_path = TEST_DATA_PATH / "coverage_gen" / "coverage.json"
 
 
@@ -142,3 +214,163 @@ def test_coverage_w_omit_config():
     assert results
     # assert one file is reported and one file (as specified in pyproject.toml) is omitted
     assert len(results) == 1
+
+
+def test_coverage_analysis_workers(tmp_path, monkeypatch):
+    """Test that the files analyzed in worker processes have the same coverage as serially."""
+    data = coverage.CoverageData(basename=os.fspath(tmp_path / ".coverage"))
+    arcs = {}
+    for index in range(4):
+        path = tmp_path / f"module_{index}.py"
+        path.write_text("def f(value):\n    if value:\n        return 1\n    return 2\n")
+        # The module is imported and `f` is called once with a true value.
+        arcs[os.fspath(path)] = [(-1, 1), (1, -1), (-1, 2), (2, 3), (3, -1)]
+    data.add_arcs(arcs)
+    data.write()
+    monkeypatch.chdir(tmp_path)
+    cov = coverage.Coverage(data_file=data.data_filename(), branch=True)
+    cov.load()
+    files = sorted(cov.get_data().measured_files())
+
+    cache = vscode_coverage_cache.AnalysisCache(cov)
+    serial = _coverage_analysis.analyze_files(cov, files, cache, include_branches=True)
+    assert serial[files[0]] == {
+        "lines_covered": [1, 2, 3],
+        "lines_missed": [4],
+        "executed_branches": 1,
+        "total_branches": 2,
+    }
+    monkeypatch.setenv(_coverage_analysis.ANALYSIS_WORKERS_ENV, "2")
+    monkeypatch.setattr(_coverage_analysis, "MIN_FILES_PER_WORKER", 2)
+    assert _coverage_analysis.get_worker_count(len(files)) == 2
+    assert _coverage_analysis.analyze_coverage(cov, files, include_branches=True) == serial
+    # Too few files for a second worker, they are analyzed serially.
+    assert _coverage_analysis.get_worker_count(3) == 1
+
+
+def test_coverage_analysis_cache(tmp_path, monkeypatch):
+    """Test that the analysis of the workers is cached for the files of the next run."""
+    data = coverage.CoverageData(basename=os.fspath(tmp_path / ".coverage"))
+    arcs = {}
+    for index in range(4):
+        path = tmp_path / f"module_{index}.py"
+        path.write_text("def f(value):\n    if value:\n        return 1\n    return 2\n")
+        arcs[os.fspath(path)] = [(-1, 1), (1, -1), (-1, 2), (2, 3), (3, -1)]
+    data.add_arcs(arcs)
+    data.write()
+    monkeypatch.chdir(tmp_path)
+    cov = coverage.Coverage(data_file=data.data_filename(), branch=True)
+    cov.load()
+    files = sorted(cov.get_data().measured_files())
+    monkeypatch.setenv(_coverage_analysis.ANALYSIS_WORKERS_ENV, "2")
+    monkeypatch.setattr(_coverage_analysis, "MIN_FILES_PER_WORKER", 2)
+    cache_path = tmp_path / "cache" / "analysis.json"
+
+    first_run = _coverage_analysis.analyze_coverage(
+        cov, files, include_branches=True, cache_path=cache_path
+    )
+    assert vscode_coverage_cache.AnalysisCache(cov, cache_path).files.keys() == set(files)
+
+    # Only the changed file is analyzed, serially.
+    pathlib.Path(files[0]).write_text("def f(value):\n    return 1\n")
+    monkeypatch.setattr(
+        _coverage_analysis,
+        "analyze_slice",
+        lambda *_args, **_kwargs: pytest.fail("Unchanged files were sent to the workers."),
+    )
+    second_run = _coverage_analysis.analyze_coverage(
+        cov, files, include_branches=True, cache_path=cache_path
+    )
+    assert second_run[files[1]] == first_run[files[1]]
+    assert second_run[files[0]] == {
+        "lines_covered": [1, 2],
+        "lines_missed": [],
+        "executed_branches": 0,
+        "total_branches": 0,
+    }
+
+
+def test_pytest_coverage_test_impact_index(tmp_path, monkeypatch, capsys):
+    """Test that the lines each test executes are indexed to select the tests of a change."""
+    (tmp_path / "shapes.py").write_text(
+        "def area(w, h):\n"
+        "    if w < 0:\n"
+        "        raise ValueError\n"
+        "    return w * h\n"
+        "\n"
+        "\n"
+        "def perimeter(w, h):\n"
+        "    return 2 * (w + h)\n"
+    )
+    test_file = tmp_path / "test_shapes.py"
+    test_file.write_text(
+        "from shapes import area, perimeter\n"
+        "\n"
+        "\n"
+        "def test_area():\n"
+        "    assert area(2, 3) == 6\n"
+        "\n"
+        "\n"
+        "def test_perimeter():\n"
+        "    assert perimeter(2, 3) == 10\n"
+    )
+    env_add = {"COVERAGE_ENABLED": "True", "TEST_IMPACT_INDEX_ENABLED": "True"}
+    actual = runner_with_cwd_env([os.fspath(test_file)], tmp_path, env_add)
+    assert actual
+
+    index = _test_impact.ImpactIndex.load(tmp_path / _test_impact.DEFAULT_INDEX_PATH)
+    shapes = os.fspath(tmp_path / "shapes.py")
+    test_area = f"{test_file}::test_area"
+    test_perimeter = f"{test_file}::test_perimeter"
+    assert index.test_lines[shapes] == {test_area: {2, 4}, test_perimeter: {8}}
+    assert index.import_lines[shapes] == {1, 7}
+    assert index.select({shapes: [(3, 4)]}) == ({test_area}, [])
+    assert index.select({shapes: [(5, 6)]}) == (set(), [])
+    # A change of a line executed on import selects every test of the file.
+    assert index.select({shapes: [(7, 7)]}) == ({test_area, test_perimeter}, [])
+    assert index.select({shapes: None, os.fspath(tmp_path / "new.py"): None}) == (
+        {test_area, test_perimeter},
+        [os.fspath(tmp_path / "new.py")],
+    )
+
+    # A rerun of one test replaces its lines and keeps the lines of the others.
+    test_file.write_text(test_file.read_text().replace("area(2, 3) == 6", "area(-1, 3)"))
+    actual = runner_with_cwd_env([os.fspath(test_file), "-k", "test_area"], tmp_path, env_add)
+    assert actual
+    index = _test_impact.ImpactIndex.load(tmp_path / _test_impact.DEFAULT_INDEX_PATH)
+    assert index.test_lines[shapes] == {test_area: {2, 3}, test_perimeter: {8}}
+
+    monkeypatch.chdir(tmp_path)
+    ids_path = tmp_path / "ids.txt"
+    assert affected_tests.main(["shapes.py:8", "--output", os.fspath(ids_path)]) == 0
+    assert ids_path.read_text(encoding="utf-8").splitlines() == [test_perimeter]
+    assert affected_tests.main(["new.py"]) == 2
+    assert "Not in the test impact index" in capsys.readouterr().err
+
+
+def test_test_impact_parse_diff(tmp_path):
+    """Test that the changed lines of a diff are read from its old side."""
+    diff = (
+        "diff --git a/shapes.py b/shapes.py\n"
+        "--- a/shapes.py\n"
+        "+++ b/shapes.py\n"
+        "@@ -4 +4 @@ def area(w, h):\n"
+        "-    return w * h\n"
+        "+    return h * w\n"
+        "@@ -8,0 +9,2 @@ def perimeter(w, h):\n"
+        "+\n"
+        "+--- not a header\n"
+        "@@ -10,2 +11,0 @@\n"
+        "--- removed\n"
+        "-+++ removed\n"
+        "diff --git a/test_new.py b/test_new.py\n"
+        "new file mode 100644\n"
+        "--- /dev/null\n"
+        "+++ b/test_new.py\n"
+        "@@ -0,0 +1 @@\n"
+        "+def test_new(): pass\n"
+    )
+    assert affected_tests.parse_diff(diff, tmp_path) == {
+        os.fspath(tmp_path / "shapes.py"): [(4, 4), (8, 9), (10, 11)],
+        os.fspath(tmp_path / "test_new.py"): None,
+    }
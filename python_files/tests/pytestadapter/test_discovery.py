@@ -2,12 +2,14 @@
 # Licensed under the MIT License.
 import json
 import os
+import pathlib
 import sys
 from typing import Any, Dict, List, Optional
 
 import pytest
 
 from tests.tree_comparison_helper import is_same_tree
+from vscode_pytest._compact_encoding import decode_tree
 
 from . import expected_discovery_test_output, helpers
 
@@ -337,6 +339,404 @@ def test_config_sub_folder():
             assert tests.get("name") == "config_sub_folder"
 
 
+def merge_streamed_tree(tree: Dict[str, Any], partial: Dict[str, Any]) -> None:
+    """Merge a partial tree from streaming discovery into a tree, matching nodes by id."""
+    children_by_id = {child["id_"]: child for child in tree["children"]}
+    for child in partial.get("children", []):
+        existing = children_by_id.get(child["id_"])
+        if existing is None:
+            tree["children"].append(child)
+        elif "children" in child:
+            merge_streamed_tree(existing, child)
+
+
+@pytest.mark.parametrize(
+    ("file", "expected_const"),
+    [
+        (
+            "dual_level_nested_folder",
+            expected_discovery_test_output.dual_level_nested_folder_expected_output,
+        ),
+        (
+            "folder_a",
+            expected_discovery_test_output.double_nested_folder_expected_output,
+        ),
+        (
+            "parametrize_tests.py",
+            expected_discovery_test_output.parametrize_tests_expected_output,
+        ),
+    ],
+)
+def test_pytest_collect_streaming(file, expected_const):
+    """Test streaming discovery, which sends one partial tree per collected file and a final message.
+
+    Merging the partial trees should result in the same tree as non-streaming discovery.
+    """
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(helpers.TEST_DATA_PATH / file), "--collect-only"],
+        helpers.TEST_DATA_PATH,
+        {"DISCOVERY_STREAMING_ENABLED": "True"},
+    )
+
+    assert actual
+    actual_list: List[Dict[str, Any]] = actual
+    complete_item = actual_list.pop()
+    assert complete_item.get("stream") == "complete"
+    assert complete_item.get("status") == "success"
+    assert complete_item.get("tests") is None
+    assert complete_item.get("deselected") == []
+    assert actual_list
+    merged_tree: Optional[Dict[str, Any]] = None
+    for actual_item in actual_list:
+        assert actual_item.get("stream") == "partial"
+        assert actual_item.get("cwd") == os.fspath(helpers.TEST_DATA_PATH)
+        if merged_tree is None:
+            merged_tree = actual_item["tests"]
+        else:
+            merge_streamed_tree(merged_tree, actual_item["tests"])
+    assert is_same_tree(
+        merged_tree,
+        expected_const,
+        ["id_", "lineno", "name", "runID"],
+    ), (
+        f"Tests tree does not match expected value. \n Expected: {json.dumps(expected_const, indent=4)}. \n Actual: {json.dumps(merged_tree, indent=4)}"
+    )
+
+
+def test_pytest_collect_streaming_deselected():
+    """Test that items deselected after being streamed are sent with the final message."""
+    file_path = helpers.TEST_DATA_PATH / "dual_level_nested_folder"
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(file_path), "--collect-only", "-k", "not test_top_function_t"],
+        helpers.TEST_DATA_PATH,
+        {"DISCOVERY_STREAMING_ENABLED": "True"},
+    )
+
+    assert actual
+    actual_list: List[Dict[str, Any]] = actual
+    complete_item = actual_list.pop()
+    assert complete_item.get("stream") == "complete"
+    test_file = file_path / "test_top_folder.py"
+    assert complete_item.get("deselected") == [
+        f"{os.fspath(test_file)}::test_top_function_t",
+    ]
+
+
+def get_test_ids(node: Dict[str, Any]) -> List[str]:
+    """Returns the ids of the test nodes in a tree."""
+    if node.get("type_") == "test":
+        return [node["id_"]]
+    return [test_id for child in node.get("children", []) for test_id in get_test_ids(child)]
+
+
+def test_pytest_collect_cached(tmp_path):
+    """Test that cached discovery only sends the changes since the discovery the extension has.
+
+    Unchanged files are not collected again, which is checked with a file that writes a marker
+    file when it is imported.
+    """
+    marker = tmp_path / "imported.txt"
+    (tmp_path / "test_unchanged.py").write_text(
+        f"open({os.fspath(marker)!r}, 'w').close()\n\n\ndef test_unchanged():\n    pass\n"
+    )
+    (tmp_path / "test_updated.py").write_text("def test_old():\n    pass\n")
+    (tmp_path / "test_removed.py").write_text("def test_removed():\n    pass\n")
+    args = [os.fspath(tmp_path), "--collect-only"]
+    actual = helpers.runner_with_cwd_env(args, tmp_path, {"DISCOVERY_CACHE_ENABLED": "True"})
+
+    assert actual
+    full_payload = actual[-1]
+    assert full_payload.get("status") == "success"
+    assert "delta" not in full_payload
+    assert full_payload.get("cache_id")
+    assert len(get_test_ids(full_payload["tests"])) == 3
+    assert marker.exists()
+
+    marker.unlink()
+    (tmp_path / "test_updated.py").write_text("def test_new():\n    pass\n")
+    (tmp_path / "test_removed.py").unlink()
+    (tmp_path / "test_added.py").write_text("def test_added():\n    pass\n")
+    actual = helpers.runner_with_cwd_env(
+        args,
+        tmp_path,
+        {"DISCOVERY_CACHE_ENABLED": "True", "DISCOVERY_CACHE_ID": full_payload["cache_id"]},
+    )
+
+    assert actual
+    delta_payload = actual[-1]
+    assert delta_payload.get("status") == "success"
+    assert delta_payload.get("tests") is None
+    assert delta_payload.get("cache_id") not in (None, full_payload["cache_id"])
+    delta = delta_payload["delta"]
+    assert [get_test_ids(tree) for tree in delta["added"]] == [
+        [f"{os.fspath(tmp_path / 'test_added.py')}::test_added"]
+    ]
+    assert [get_test_ids(tree) for tree in delta["updated"]] == [
+        [f"{os.fspath(tmp_path / 'test_updated.py')}::test_new"]
+    ]
+    assert delta["removed"] == [os.fspath(tmp_path / "test_removed.py")]
+    assert not marker.exists()
+
+
+def test_pytest_collect_cached_unknown_cache_id(tmp_path):
+    """Test that cached discovery sends the whole tree if the extension has another discovery."""
+    (tmp_path / "test_simple.py").write_text("def test_simple():\n    pass\n")
+    args = [os.fspath(tmp_path), "--collect-only"]
+    first = helpers.runner_with_cwd_env(args, tmp_path, {"DISCOVERY_CACHE_ENABLED": "True"})
+    actual = helpers.runner_with_cwd_env(
+        args, tmp_path, {"DISCOVERY_CACHE_ENABLED": "True", "DISCOVERY_CACHE_ID": "unknown"}
+    )
+
+    assert first
+    assert actual
+    payload = actual[-1]
+    assert "delta" not in payload
+    assert payload.get("cache_id") not in (None, first[-1]["cache_id"])
+    assert get_test_ids(payload["tests"]) == [
+        f"{os.fspath(tmp_path / 'test_simple.py')}::test_simple"
+    ]
+
+
+def test_pytest_collect_fingerprint(tmp_path):
+    """Test that fingerprinted discovery replays the previous payload if no test input changed.
+
+    A replayed discovery does not import the test file, which writes a marker file when imported.
+    """
+    marker = tmp_path / "imported.txt"
+    test_file = tmp_path / "test_simple.py"
+    test_file.write_text(
+        f"open({os.fspath(marker)!r}, 'w').close()\n\n\ndef test_simple():\n    pass\n"
+    )
+    args = [os.fspath(tmp_path), "--collect-only"]
+    env = {"DISCOVERY_FINGERPRINT_ENABLED": "True"}
+    first = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert first
+    assert first[-1].get("status") == "success"
+    assert marker.exists()
+
+    # Saving a file which is not a test file, conftest or config file replays the payload.
+    marker.unlink()
+    (tmp_path / "helper.py").write_text("VALUE = 1\n")
+    replayed = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert replayed
+    assert replayed[-1] == first[-1]
+    assert not marker.exists()
+
+    # Touching a test file without changing its content replays the payload too.
+    stat = test_file.stat()
+    os.utime(test_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    replayed = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert replayed
+    assert replayed[-1] == first[-1]
+    assert not marker.exists()
+
+    test_file.write_text(
+        f"open({os.fspath(marker)!r}, 'w').close()\n\n\ndef test_changed():\n    pass\n"
+    )
+    actual = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert actual
+    assert get_test_ids(actual[-1]["tests"]) == [f"{os.fspath(test_file)}::test_changed"]
+    assert marker.exists()
+
+
+@pytest.mark.parametrize(
+    ("file", "expected_const"),
+    [
+        (
+            "unittest_folder",
+            expected_discovery_test_output.unittest_folder_discovery_expected_output,
+        ),
+        (
+            "dual_level_nested_folder",
+            expected_discovery_test_output.dual_level_nested_folder_expected_output,
+        ),
+        (
+            "folder_a",
+            expected_discovery_test_output.double_nested_folder_expected_output,
+        ),
+        (
+            "parametrize_tests.py",
+            expected_discovery_test_output.parametrize_tests_expected_output,
+        ),
+    ],
+)
+def test_pytest_collect_parallel(file, expected_const):
+    """Test that parallel discovery sends the same tree as a regular discovery."""
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(helpers.TEST_DATA_PATH / file), "--collect-only"],
+        helpers.TEST_DATA_PATH,
+        {"TEST_DISCOVERY_WORKERS": "3"},
+    )
+
+    assert actual
+    actual_item = actual[-1]
+    assert actual_item.get("status") == "success", actual_item.get("error")
+    assert actual_item.get("cwd") == os.fspath(helpers.TEST_DATA_PATH)
+    assert is_same_tree(
+        actual_item.get("tests"),
+        expected_const,
+        ["id_", "lineno", "name", "runID"],
+    ), (
+        f"Tests tree does not match expected value. \n Expected: {json.dumps(expected_const, indent=4)}. \n Actual: {json.dumps(actual_item.get('tests'), indent=4)}"
+    )
+
+
+def test_pytest_collect_parallel_error(tmp_path):
+    """Test that the collection errors of the discovery workers are reported."""
+    (tmp_path / "test_valid.py").write_text("def test_valid():\n    pass\n")
+    (tmp_path / "test_invalid.py").write_text("def test_invalid(:\n    pass\n")
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(tmp_path), "--collect-only"], tmp_path, {"TEST_DISCOVERY_WORKERS": "2"}
+    )
+
+    assert actual
+    actual_item = actual[-1]
+    assert actual_item.get("status") == "error"
+    assert any("SyntaxError" in error for error in actual_item["error"])
+    assert get_test_ids(actual_item["tests"]) == [f"{tmp_path / 'test_valid.py'}::test_valid"]
+
+
+@pytest.mark.parametrize(
+    ("file", "expected_const"),
+    [
+        (
+            "unittest_folder",
+            expected_discovery_test_output.unittest_folder_discovery_expected_output,
+        ),
+        (
+            "parametrize_tests.py",
+            expected_discovery_test_output.parametrize_tests_expected_output,
+        ),
+    ],
+)
+def test_pytest_collect_compact_encoding(file, expected_const):
+    """Test that the compact encoding decodes to the tree of a regular discovery."""
+    args = [os.fspath(helpers.TEST_DATA_PATH / file), "--collect-only"]
+    regular = helpers.runner_with_cwd_env(args, helpers.TEST_DATA_PATH, {})
+    compact = helpers.runner_with_cwd_env(
+        args, helpers.TEST_DATA_PATH, {"DISCOVERY_ENCODING": "v2"}
+    )
+
+    assert regular
+    assert compact
+    actual_item = compact[-1]
+    assert actual_item.get("status") == "success", actual_item.get("error")
+    assert actual_item.get("encoding") == "v2"
+    assert len(actual_item["paths"]) == len(set(actual_item["paths"]))
+    assert len(json.dumps(actual_item)) < len(json.dumps(regular[-1]))
+    decoded = decode_tree(actual_item["tests"], actual_item["paths"])
+    assert decoded == regular[-1]["tests"]
+    assert is_same_tree(decoded, expected_const, ["id_", "lineno", "name", "runID"]), (
+        f"Tests tree does not match expected value. \n Expected: {json.dumps(expected_const, indent=4)}. \n Actual: {json.dumps(decoded, indent=4)}"
+    )
+
+
+def test_pytest_collect_lazy_parametrize(tmp_path):
+    """Test that the cases of functions above the threshold are sent as pages."""
+    test_file = tmp_path / "parametrize_tests.py"
+    test_file.write_text((helpers.TEST_DATA_PATH / "parametrize_tests.py").read_text())
+    args = [os.fspath(test_file), "--collect-only"]
+    regular = helpers.runner_with_cwd_env(args, tmp_path, {})
+    paged = helpers.runner_with_cwd_env(
+        args, tmp_path, {"DISCOVERY_LAZY_PARAMETRIZE_THRESHOLD": "2"}
+    )
+
+    assert regular
+    assert paged
+    actual_item = paged[-1]
+    assert actual_item.get("status") == "success", actual_item.get("error")
+    file_node = actual_item["tests"]["children"][0]
+    class_node, string_node = file_node["children"]
+    adding_node = class_node["children"][0]
+    # test_string has two cases and is sent as usual.
+    assert len(string_node["children"]) == 2
+    assert "cursor" not in string_node
+    assert adding_node["children"] == []
+    assert adding_node["count"] == 3
+
+    cases, cursor = [], adding_node.pop("cursor")
+    while cursor:
+        page = json.loads(pathlib.Path(cursor).read_text())
+        assert len(page["children"]) <= 2
+        cases.extend(page["children"])
+        cursor = page["next"]
+    adding_node["children"] = cases
+    del adding_node["count"]
+    assert actual_item["tests"] == regular[-1]["tests"]
+
+
+def test_pytest_collect_trace(tmp_path):
+    """Test that the phases of the discovery are written to a trace in pytest's cache."""
+    test_file = tmp_path / "parametrize_tests.py"
+    test_file.write_text((helpers.TEST_DATA_PATH / "parametrize_tests.py").read_text())
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(test_file), "--collect-only"], tmp_path, {"TEST_TRACE_ENABLED": "True"}
+    )
+
+    assert actual
+    assert actual[-1].get("status") == "success", actual[-1].get("error")
+    trace_path = tmp_path / ".pytest_cache" / "d" / "vscode-trace" / "trace.json"
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    names = {event["name"] for event in events}
+    assert {"startup", "collection", "build_test_tree", "encode", "pipe write"} <= names
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    encode_event = next(event for event in events if event["name"] == "encode")
+    assert encode_event["args"]["bytes"] > 0
+
+
+def test_pytest_collect_timing_report(tmp_path):
+    """Test that the slowest test modules and conftests are sent with the discovery payload."""
+    (tmp_path / "conftest.py").write_text("import time\ntime.sleep(0.2)\n")
+    (tmp_path / "test_slow.py").write_text(
+        "import time\ntime.sleep(0.3)\n\n\nclass TestSlow:\n    def test_a(self):\n        pass\n"
+    )
+    (tmp_path / "test_fast.py").write_text("def test_b():\n    pass\n")
+    actual = helpers.runner_with_cwd_env(
+        [os.fspath(tmp_path), "--collect-only"],
+        tmp_path,
+        {"DISCOVERY_TIMING_REPORT_ENABLED": "True"},
+    )
+
+    assert actual
+    timing = actual[-1]["timing"]
+    modules = [module["path"] for module in timing["modules"]]
+    assert modules == [os.fspath(tmp_path / "test_slow.py"), os.fspath(tmp_path / "test_fast.py")]
+    assert timing["modules"][0]["duration"] >= 0.3
+    assert timing["conftests"][0]["path"] == os.fspath(tmp_path / "conftest.py")
+    assert timing["conftests"][0]["duration"] >= 0.2
+    assert timing["total"] >= 0.5
+
+
+def test_pytest_collect_fingerprint_replay_skips_timing_and_pages(tmp_path):
+    """Test that the timing report is not replayed and payloads with pages are not saved."""
+    test_file = tmp_path / "parametrize_tests.py"
+    test_file.write_text((helpers.TEST_DATA_PATH / "parametrize_tests.py").read_text())
+    args = [os.fspath(test_file), "--collect-only"]
+    env = {"DISCOVERY_FINGERPRINT_ENABLED": "True", "DISCOVERY_TIMING_REPORT_ENABLED": "True"}
+    first = helpers.runner_with_cwd_env(args, tmp_path, env)
+    replayed = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert first
+    assert replayed
+    assert "timing" in first[-1]
+    assert "timing" not in replayed[-1]
+    assert replayed[-1]["tests"] == first[-1]["tests"]
+
+    env["DISCOVERY_LAZY_PARAMETRIZE_THRESHOLD"] = "2"
+    test_file.write_text(test_file.read_text() + "\n")
+    paged = helpers.runner_with_cwd_env(args, tmp_path, env)
+    collected = helpers.runner_with_cwd_env(args, tmp_path, env)
+
+    assert paged
+    assert collected
+    # The second discovery collected the tests again, so it timed them.
+    assert "timing" in collected[-1]
+
+
 @pytest.mark.parametrize(
     ("file", "expected_const", "extra_arg"),
     [
@@ -4,6 +4,8 @@ import json
 import os
 import pathlib
 import sys
+import textwrap
+import time
 from typing import Any, Dict, List
 
 import pytest
@@ -12,13 +14,16 @@ script_dir = pathlib.Path(__file__).parent.parent
 sys.path.append(os.fspath(script_dir))
 
 from tests.pytestadapter import expected_execution_test_output  # noqa: E402
+from vscode_pytest import _fork_server, duration_history  # noqa: E402
 
 from .helpers import (  # noqa: E402
     TEST_DATA_PATH,
     create_symlink,
     get_absolute_test_id,
+    pop_durations,
     runner,
     runner_with_cwd,
+    runner_with_cwd_env,
 )
 
 
@@ -42,6 +47,7 @@ def test_config_file():
             assert actual_item.get("status") == "success"
             assert actual_item.get("cwd") == os.fspath(new_cwd)
             actual_result_dict.update(actual_item["result"])
+        pop_durations(actual_result_dict)
         assert actual_result_dict == expected_const
 
 
@@ -62,6 +68,7 @@ def test_rootdir_specified():
             assert actual_item.get("status") == "success"
             assert actual_item.get("cwd") == os.fspath(new_cwd)
             actual_result_dict.update(actual_item["result"])
+        pop_durations(actual_result_dict)
         assert actual_result_dict == expected_const
 
 
@@ -229,9 +236,77 @@ def test_pytest_execution(test_ids, expected_const):
             actual_result_dict[key]["message"] = "ERROR MESSAGE"
         if actual_result_dict[key]["traceback"] is not None:
             actual_result_dict[key]["traceback"] = "TRACEBACK"
+    pop_durations(actual_result_dict)
     assert actual_result_dict == expected_const
 
 
+@pytest.mark.parametrize(
+    ("env_add", "expected_message_count"),
+    [
+        pytest.param({"TEST_RESULT_BATCH_MAX_DELAY_MS": "60000"}, 1, id="single_batch"),
+        pytest.param(
+            {"TEST_RESULT_BATCH_MAX_BYTES": "1", "TEST_RESULT_BATCH_MAX_DELAY_MS": "60000"},
+            4,
+            id="batch_per_result",
+        ),
+    ],
+)
+def test_pytest_execution_batched(env_add, expected_message_count):
+    """Test that batched execution coalesces the results of several tests into each message.
+
+    Keyword arguments:
+    env_add -- the batching settings, the results are sent when the session finishes at the latest.
+    expected_message_count -- the number of execution messages expected.
+    """
+    args = [
+        "unittest_folder/test_add.py::TestAddFunction::test_add_positive_numbers",
+        "unittest_folder/test_add.py::TestAddFunction::test_add_negative_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_positive_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+    ]
+    actual = runner_with_cwd_env(
+        args, TEST_DATA_PATH, {"TEST_RESULT_BATCHING_ENABLED": "True", **env_add}
+    )
+    assert actual
+    actual_list: List[Dict[str, Dict[str, Any]]] = actual
+    assert len(actual_list) == expected_message_count
+    actual_result_dict = {}
+    for actual_item in actual_list:
+        assert actual_item.get("status") == "success"
+        assert actual_item.get("cwd") == os.fspath(TEST_DATA_PATH)
+        actual_result_dict.update(actual_item["result"])
+    for result in actual_result_dict.values():
+        if result["outcome"] == "failure":
+            result["message"] = "ERROR MESSAGE"
+    pop_durations(actual_result_dict)
+    assert actual_result_dict == expected_execution_test_output.uf_execution_expected_output
+
+
+@pytest.mark.parametrize("policy", ["block", "coalesce"])
+def test_pytest_execution_writer_thread(policy):
+    """Test that all results are received when messages are written from a background thread."""
+    args = [
+        "unittest_folder/test_add.py::TestAddFunction::test_add_positive_numbers",
+        "unittest_folder/test_add.py::TestAddFunction::test_add_negative_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_positive_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+    ]
+    actual = runner_with_cwd_env(
+        args, TEST_DATA_PATH, {"TEST_RUN_PIPE_WRITER": policy, "TEST_RUN_PIPE_QUEUE_SIZE": "1"}
+    )
+    assert actual
+    actual_list: List[Dict[str, Dict[str, Any]]] = actual
+    assert len(actual_list) == 4
+    actual_result_dict = {}
+    for actual_item in actual_list:
+        actual_result_dict.update(actual_item["result"])
+    for result in actual_result_dict.values():
+        if result["outcome"] == "failure":
+            result["message"] = "ERROR MESSAGE"
+    pop_durations(actual_result_dict)
+    assert actual_result_dict == expected_execution_test_output.uf_execution_expected_output
+
+
 def test_symlink_run():
     """Test to test pytest discovery with the command line arg --rootdir specified as a symlink path.
 
@@ -267,8 +342,265 @@ def test_symlink_run():
                 )
                 actual_result_dict = {}
                 actual_result_dict.update(actual_item["result"])
+                pop_durations(actual_result_dict)
                 assert actual_result_dict == expected_const
             except AssertionError as e:
                 # Print the actual_item in JSON format if an assertion fails
                 print(json.dumps(actual_item, indent=4))
                 pytest.fail(str(e))
+
+
+def test_pytest_execution_duration_history(tmp_path):
+    """Test that each run adds the durations and outcomes of its tests to the duration history."""
+    args = [
+        "-o",
+        f"cache_dir={os.fspath(tmp_path)}",
+        "unittest_folder/test_add.py::TestAddFunction::test_add_positive_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+    ]
+    for _ in range(2):
+        actual = runner_with_cwd_env(
+            args, TEST_DATA_PATH, {"TEST_DURATION_HISTORY_ENABLED": "True"}
+        )
+        assert actual
+        for actual_item in actual:
+            for result in actual_item["result"].values():
+                assert result["duration"] >= 0
+
+    history_path = duration_history.get_history_path(tmp_path)
+    records_by_test = duration_history.get_records_by_test(
+        duration_history.read_history(history_path)
+    )
+    test_path = TEST_DATA_PATH / "unittest_folder"
+    assert records_by_test.keys() == {
+        get_absolute_test_id(
+            "test_add.py::TestAddFunction::test_add_positive_numbers", test_path / "test_add.py"
+        ),
+        get_absolute_test_id(
+            "test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+            test_path / "test_subtract.py",
+        ),
+    }
+    outcomes = {
+        test_id: [record["outcome"] for record in records]
+        for test_id, records in records_by_test.items()
+    }
+    assert sorted(outcomes.values()) == [["failed", "failed"], ["passed", "passed"]]
+
+    slowest = duration_history.get_slowest_tests(records_by_test, 1)
+    assert len(slowest) == 1
+    assert slowest[0][0] in records_by_test
+
+
+def test_pytest_execution_order_by_history(tmp_path):
+    """Test that the tests which failed in the previous run are run first."""
+    args = [
+        "-o",
+        f"cache_dir={os.fspath(tmp_path)}",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_positive_numbers",
+        "unittest_folder/test_add.py::TestAddFunction::test_add_positive_numbers",
+        "unittest_folder/test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+        "unittest_folder/test_add.py::TestAddFunction::test_add_negative_numbers",
+    ]
+    env_add = {"TEST_DURATION_HISTORY_ENABLED": "True", "TEST_ORDER_BY_HISTORY": "True"}
+    failed_test_id = get_absolute_test_id(
+        "test_subtract.py::TestSubtractFunction::test_subtract_negative_numbers",
+        TEST_DATA_PATH / "unittest_folder" / "test_subtract.py",
+    )
+
+    # Without history the tests run in collection order.
+    actual = runner_with_cwd_env(args, TEST_DATA_PATH, env_add)
+    assert actual
+    run_order = [test_id for actual_item in actual for test_id in actual_item["result"]]
+    assert len(run_order) == 4
+    assert run_order[0] != failed_test_id
+
+    actual = runner_with_cwd_env(args, TEST_DATA_PATH, env_add)
+    assert actual
+    run_order = [test_id for actual_item in actual for test_id in actual_item["result"]]
+    assert len(run_order) == 4
+    assert run_order[0] == failed_test_id
+
+
+def run_test_ids(test_ids: List[str], tmp_path: pathlib.Path, env_add: Dict[str, str]):
+    """Run test ids through run_pytest_script.py, like the execution adapter does."""
+    ids_path = tmp_path / "test_ids.txt"
+    ids_path.write_text("\n".join(test_ids), encoding="utf-8")
+    return runner_with_cwd_env(
+        [f"--rootdir={os.fspath(TEST_DATA_PATH)}"],
+        TEST_DATA_PATH,
+        {"RUN_TEST_IDS_PIPE": os.fspath(ids_path), **env_add},
+    )
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="Shards communicate through FIFOs")
+def test_pytest_execution_sharded(tmp_path):
+    """Test that the results of all shards are received, each message intact."""
+    unittest_folder = TEST_DATA_PATH / "unittest_folder"
+    test_ids = [
+        f"{unittest_folder / 'test_add.py'}::TestAddFunction::test_add_positive_numbers",
+        f"{unittest_folder / 'test_add.py'}::TestAddFunction::test_add_negative_numbers",
+        f"{unittest_folder / 'test_subtract.py'}::TestSubtractFunction::test_subtract_positive_numbers",
+        f"{unittest_folder / 'test_subtract.py'}::TestSubtractFunction::test_subtract_negative_numbers",
+    ]
+    actual = run_test_ids(test_ids, tmp_path, {"TEST_RUN_SHARDS": "2"})
+    assert actual
+    actual_result_dict = {}
+    for actual_item in actual:
+        assert actual_item.get("status") == "success"
+        actual_result_dict.update(actual_item["result"])
+    for result in actual_result_dict.values():
+        if result["outcome"] == "failure":
+            result["message"] = "ERROR MESSAGE"
+    pop_durations(actual_result_dict)
+    assert actual_result_dict == expected_execution_test_output.uf_execution_expected_output
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="Shards communicate through FIFOs")
+def test_pytest_execution_sharded_crash(tmp_path):
+    """Test that the tests of a crashed shard are reported as errors, other shards still run."""
+    crash_file = TEST_DATA_PATH / "shard_crash" / "test_crash.py"
+    passing_id = (
+        f"{TEST_DATA_PATH / 'unittest_folder' / 'test_add.py'}"
+        "::TestAddFunction::test_add_positive_numbers"
+    )
+    crashed_ids = [f"{crash_file}::test_crash", f"{crash_file}::test_after_crash"]
+    actual = run_test_ids([*crashed_ids, passing_id], tmp_path, {"TEST_RUN_SHARDS": "2"})
+    assert actual
+    actual_result_dict = {}
+    errors = []
+    for actual_item in actual:
+        actual_result_dict.update(actual_item["result"] or {})
+        errors.extend(actual_item.get("error") or [])
+    assert actual_result_dict[passing_id]["outcome"] == "success"
+    for test_id in crashed_ids:
+        assert actual_result_dict[test_id]["outcome"] == "error"
+    assert len(errors) == 1
+    assert "exited with code" in errors[0]
+
+
+def test_pytest_execution_select_by_file(tmp_path):
+    """Test that selecting by file runs only the requested tests and reports unknown ids."""
+    param_file = TEST_DATA_PATH / "parametrize_tests.py"
+    add_file = TEST_DATA_PATH / "unittest_folder" / "test_add.py"
+    test_ids = [
+        f"{param_file}::TestClass::test_adding[3+5-8]",
+        # A function id selects all of its parametrized tests.
+        f"{param_file}::test_string",
+        f"{add_file}::TestAddFunction::test_add_negative_numbers",
+    ]
+    unknown_ids = [
+        f"{add_file}::TestAddFunction::test_removed",
+        f"{TEST_DATA_PATH / 'removed_file.py'}::test_removed",
+    ]
+    actual = run_test_ids([*test_ids, *unknown_ids], tmp_path, {"TEST_RUN_SELECT_BY_FILE": "True"})
+    assert actual
+    actual_result_dict = {}
+    not_found = []
+    for actual_item in actual:
+        actual_result_dict.update(actual_item["result"] or {})
+        # Only the message reporting the unknown ids has the key.
+        if "not_found" in actual_item:
+            assert actual_item["result"] is None
+            not_found.extend(actual_item["not_found"])
+    assert {test_id: result["outcome"] for test_id, result in actual_result_dict.items()} == {
+        f"{param_file}::TestClass::test_adding[3+5-8]": "success",
+        f"{param_file}::test_string[hello]": "success",
+        f"{param_file}::test_string[complicated split [] ()]": "failure",
+        f"{add_file}::TestAddFunction::test_add_negative_numbers": "success",
+    }
+    assert not_found == unknown_ids
+
+
+def test_pytest_execution_fixture_profile(tmp_path):
+    """Test that the setups and teardowns of each fixture are sent when the run finishes."""
+    (tmp_path / "conftest.py").write_text(
+        textwrap.dedent(
+            """
+            import time
+
+            import pytest
+
+
+            @pytest.fixture(scope="session")
+            def database():
+                time.sleep(0.2)
+                yield
+                time.sleep(0.1)
+
+
+            @pytest.fixture
+            def row(database):
+                yield
+                time.sleep(0.02)
+            """
+        )
+    )
+    (tmp_path / "test_rows.py").write_text(
+        "def test_a(row):\n    pass\n\n\ndef test_b(row):\n    pass\n"
+    )
+    actual = runner_with_cwd_env(
+        [os.fspath(tmp_path), "-p", "no:cacheprovider"],
+        tmp_path,
+        {"TEST_FIXTURE_PROFILE_ENABLED": "True"},
+    )
+
+    assert actual
+    profile = actual[-1]["fixture_profile"]
+    fixtures = {fixture["name"]: fixture for fixture in profile["fixtures"]}
+    assert profile["fixtures"][0]["name"] == "database"
+    assert fixtures["database"]["scope"] == "session"
+    assert fixtures["database"]["count"] == 1
+    # The setup of the session fixture is not counted again in the setup of `row`.
+    assert fixtures["database"]["setup"] >= 0.2
+    assert fixtures["row"]["setup"] < 0.2
+    assert fixtures["database"]["teardown"] >= 0.1
+    assert fixtures["row"]["count"] == 2
+    assert fixtures["row"]["teardown"] >= 0.04
+    assert profile["scopes"]["function"]["count"] == 2
+    assert profile["scopes"]["session"]["count"] == 1
+
+
+def wait_for_fork_server(socket_path: pathlib.Path):
+    deadline = time.monotonic() + 30
+    while not socket_path.exists():
+        assert time.monotonic() < deadline, "The fork server did not start"
+        time.sleep(0.1)
+
+
+@pytest.mark.skipif(not _fork_server.is_supported(), reason="Requires os.fork and Unix sockets")
+def test_pytest_execution_fork_server(tmp_path):
+    """Test that runs use a fork of the warm server, which exits once a preloaded module changes."""
+    fork_server_path = TEST_DATA_PATH / "fork_server"
+    socket_path = tmp_path / "fork-server.sock"
+    test_id = f"{fork_server_path / 'test_fork_server.py'}::test_preloaded"
+    ids_path = tmp_path / "test_ids.txt"
+    env_add = {
+        "RUN_TEST_IDS_PIPE": os.fspath(ids_path),
+        "TEST_FORK_SERVER_ENABLED": "True",
+        "TEST_FORK_SERVER_SOCKET": os.fspath(socket_path),
+        "TEST_FORK_SERVER_PRELOAD": "fork_marker",
+    }
+
+    def run_test():
+        ids_path.write_text(test_id, encoding="utf-8")
+        actual = runner_with_cwd_env(["-p", "no:cacheprovider"], fork_server_path, env_add)
+        assert actual
+        return actual[0]["result"][test_id]["outcome"]
+
+    try:
+        # No server is running yet, the test runs in a new process and starts one.
+        assert run_test() == "failure"
+        wait_for_fork_server(socket_path)
+        assert run_test() == "success"
+        assert run_test() == "success"
+
+        # The server is stale once the preloaded module changes, a new one is started.
+        marker_path = fork_server_path / "fork_marker.py"
+        stat = marker_path.stat()
+        os.utime(marker_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert run_test() == "failure"
+        wait_for_fork_server(socket_path)
+        assert run_test() == "success"
+    finally:
+        _fork_server.stop_server(socket_path)
@@ -1,10 +1,17 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import inspect
+import json
 import os
 import pathlib
 import sys
 import tempfile
+import threading
+import types
+from typing import cast
+
+import pytest
 
 from .helpers import (
     TEST_DATA_PATH,
@@ -12,7 +19,33 @@ from .helpers import (
 
 script_dir = pathlib.Path(__file__).parent.parent.parent
 sys.path.append(os.fspath(script_dir))
-from vscode_pytest import has_symlink_parent  # noqa: E402
+import vscode_pytest  # noqa: E402
+from vscode_pytest import (  # noqa: E402
+    HasPathOrFspath,
+    NodePathResolver,
+    TestItem,
+    TestNode,
+    _fork_server,
+    _pytest_compat,
+    add_child_node,
+    duration_history,
+    has_symlink_parent,
+)
+from vscode_pytest._compact_encoding import decode_tree, encode_tree  # noqa: E402
+from vscode_pytest._selection import get_selection_keys  # noqa: E402
+from vscode_pytest._sharding import iter_messages, merge_exit_codes, split_into_shards  # noqa: E402
+from vscode_pytest._xdist_scheduling import (  # noqa: E402
+    get_absolute_node_id,
+    is_supported_scheduler,
+    make_scheduler,
+    sort_work_units,
+)
+from vscode_pytest.duration_history import (  # noqa: E402
+    TestRunRecord,
+    append_history,
+    get_history_order,
+    read_history,
+)
 
 
 def test_has_symlink_parent_with_symlink():
@@ -33,3 +66,344 @@ def test_has_symlink_parent_without_symlink():
     folder_path = TEST_DATA_PATH / "unittest_folder" / "test_add.py"
     # Check that has_symlink_parent correctly identifies that there are no symbolic links
     assert not has_symlink_parent(folder_path)
+
+
+def test_add_child_node_skips_existing_ids():
+    file_path = pathlib.Path("test_file.py")
+    parent = TestNode(name="test_file.py", path=file_path, type_="file", id_="file", children=[])
+    child_ids_by_node = {}
+    first = TestItem(
+        name="test_a", path=file_path, type_="test", id_="file::test_a", lineno="1", runID="a"
+    )
+    second = TestItem(
+        name="test_b", path=file_path, type_="test", id_="file::test_b", lineno="2", runID="b"
+    )
+
+    add_child_node(parent, first, child_ids_by_node)
+    add_child_node(parent, second, child_ids_by_node)
+    add_child_node(parent, TestItem(**first), child_ids_by_node)
+
+    assert parent["children"] == [first, second]
+
+
+def create_history_record(test_id, outcome, duration):
+    return TestRunRecord(
+        test=test_id, outcome=outcome, setup=0.0, call=duration, teardown=0.0, time=0.0
+    )
+
+
+@pytest.mark.parametrize(
+    ("longest_first", "expected_order"),
+    [
+        # Failed tests go first, the others keep their order.
+        (False, ["failed_fast", "failed_slow", "new", "passed_fast", "passed_slow"]),
+        # Tests without history are expected to take the median duration, 2 seconds.
+        (True, ["failed_slow", "failed_fast", "passed_slow", "new", "passed_fast"]),
+    ],
+)
+def test_get_history_order(longest_first, expected_order):
+    records_by_test = {
+        "passed_fast": [create_history_record("passed_fast", "passed", 0.5)],
+        "failed_fast": [
+            create_history_record("failed_fast", "passed", 2.0),
+            create_history_record("failed_fast", "failed", 2.0),
+        ],
+        "passed_slow": [create_history_record("passed_slow", "passed", 5.0)],
+        "failed_slow": [create_history_record("failed_slow", "failed", 3.0)],
+    }
+    test_ids = ["failed_fast", "new", "passed_fast", "passed_slow", "failed_slow"]
+
+    order = get_history_order(test_ids, records_by_test, longest_first=longest_first)
+
+    assert [test_ids[index] for index in order] == expected_order
+
+
+def test_append_history_concurrently(tmp_path, monkeypatch):
+    # Every append compacts the history, records of concurrent appends must not be lost.
+    monkeypatch.setattr(duration_history, "MAX_HISTORY_BYTES", 1)
+    history_path = tmp_path / "durations.jsonl"
+
+    def append(shard):
+        for i in range(20):
+            append_history(history_path, [create_history_record(f"{shard}::{i}", "passed", 1.0)])
+
+    threads = [threading.Thread(target=append, args=(shard,)) for shard in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(list(read_history(history_path))) == 80
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+
+
+def test_get_cache_dir_without_mkdir(tmp_path):
+    # pytest < 7 only has `Cache.makedir`, which returns a `py.path.local`.
+    class LegacyPath:
+        def __init__(self, path):
+            self.path = path
+
+        def __str__(self):
+            return os.fspath(self.path)
+
+    class LegacyCache:
+        def makedir(self, name):
+            path = tmp_path / "d" / name
+            path.mkdir(parents=True, exist_ok=True)
+            return LegacyPath(path)
+
+    cache_dir = _pytest_compat.get_cache_dir(LegacyCache(), "history")
+
+    assert cache_dir == tmp_path / "d" / "history"
+    assert cache_dir.is_dir()
+
+
+def test_legacy_path_hook(monkeypatch):
+    # pytest < 7 passes the hook a `py.path.local` named `path`.
+    monkeypatch.setattr(_pytest_compat, "HAS_COLLECTION_PATH", False)
+
+    class Plugin:
+        @pytest.hookimpl(tryfirst=True)
+        @_pytest_compat.legacy_path_hook
+        def pytest_ignore_collect(self, collection_path):
+            return collection_path
+
+    plugin = Plugin()
+    assert list(inspect.signature(plugin.pytest_ignore_collect).parameters) == ["path"]
+    assert plugin.pytest_ignore_collect("/a/test_a.py") == pathlib.Path("/a/test_a.py")
+    hookimpl_opts = pytest.PytestPluginManager().parse_hookimpl_opts(
+        plugin, "pytest_ignore_collect"
+    )
+    assert hookimpl_opts is not None
+    assert hookimpl_opts["tryfirst"]
+
+
+def test_sort_work_units_longest_first():
+    durations = {"a.py::test_1": 1.0, "a.py::test_2": 1.0, "b.py::test_1": 5.0}
+    work_units = {
+        "a.py": {"a.py::test_1": False, "a.py::test_2": False},
+        "b.py": {"b.py::test_1": False},
+        # Tests without history are expected to take the default duration.
+        "c.py": {"c.py::test_1": False, "c.py::test_2": False, "c.py::test_3": False},
+        "d.py": {"d.py::test_1": False},
+    }
+
+    sorted_units = sort_work_units(work_units, durations.get, 2.0)
+
+    assert list(sorted_units) == ["c.py", "b.py", "a.py", "d.py"]
+    assert sorted_units["c.py"] is work_units["c.py"]
+
+
+def test_is_supported_scheduler():
+    class Supported:
+        def _assign_work_unit(self, node):
+            pass
+
+        def remove_node(self, node):
+            pass
+
+    class Renamed:
+        def _assign_work_units(self, node):
+            pass
+
+        def remove_node(self, node):
+            pass
+
+    class ChangedSignature:
+        def _assign_work_unit(self, node, count):
+            pass
+
+        def remove_node(self, node):
+            pass
+
+    assert is_supported_scheduler(Supported)
+    assert not is_supported_scheduler(Renamed)
+    assert not is_supported_scheduler(ChangedSignature)
+
+
+def test_make_scheduler_falls_back_to_xdist(monkeypatch, capsys):
+    xdist_scheduler = pytest.importorskip("xdist.scheduler")
+    monkeypatch.delattr(xdist_scheduler.LoadScopeScheduling, "_assign_work_unit")
+    config = types.SimpleNamespace(getvalue=lambda name: "loadscope")  # noqa: ARG005
+
+    assert make_scheduler(config, None, lambda nodeid: None, 1.0) is None  # noqa: ARG005
+    assert "not supported" in capsys.readouterr().out
+
+
+def test_get_absolute_node_id():
+    rootpath = pathlib.Path("/workspace")
+    assert get_absolute_node_id(rootpath, "tests/test_a.py::TestA::test_b[1]") == (
+        os.fspath(rootpath / "tests" / "test_a.py") + "::TestA::test_b[1]"
+    )
+    assert get_absolute_node_id(rootpath, "tests/test_a.py") == os.fspath(
+        rootpath / "tests" / "test_a.py"
+    )
+
+
+def test_split_into_shards_keeps_files_together():
+    test_ids = [
+        "a.py::test_1",
+        "b.py::test_1",
+        "a.py::test_2",
+        "c.py::test_1",
+        "a.py::test_3",
+        "b.py::test_2",
+    ]
+
+    shards = split_into_shards(test_ids, 2)
+
+    assert shards == [
+        ["a.py::test_1", "a.py::test_2", "a.py::test_3"],
+        ["b.py::test_1", "b.py::test_2", "c.py::test_1"],
+    ]
+    # There are never more shards than files.
+    assert len(split_into_shards(test_ids, 8)) == 3
+    assert split_into_shards(test_ids, 1) == [test_ids]
+
+
+@pytest.mark.parametrize(
+    ("exit_codes", "expected"),
+    [
+        ([0, 0], 0),
+        ([0, 1], 1),
+        ([5, 0], 0),
+        ([5, 5], 5),
+        ([1, 2], 2),
+        ([1, 4, 2], 4),
+        # A crashed process is an internal error.
+        ([0, -9], 3),
+    ],
+)
+def test_merge_exit_codes(exit_codes, expected):
+    assert merge_exit_codes(exit_codes) == expected
+
+
+def test_iter_messages_splits_complete_messages():
+    first = b"content-length: 2\r\ncontent-type: application/json\r\n\r\n{}"
+    second = b'content-length: 8\r\ncontent-type: application/json\r\n\r\n{"a": 1}'
+    buffer = bytearray(first + second[:-3])
+
+    assert list(iter_messages(buffer)) == [first]
+    assert buffer == second[:-3]
+
+    buffer.extend(second[-3:])
+    assert list(iter_messages(buffer)) == [second]
+    assert not buffer
+
+
+@pytest.mark.skipif(not _fork_server.is_supported(), reason="Requires os.fork and Unix sockets")
+def test_fork_server_socket_path_requires_private_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", os.fspath(tmp_path))
+    folder = tmp_path / f"vscode-pytest-{os.getuid()}"
+
+    socket_path = _fork_server.get_socket_path({}, "key")
+
+    assert socket_path is not None
+    assert socket_path.parent == folder
+
+    # A folder others can use, as if another user had created it first, is not used.
+    folder.chmod(0o777)
+    assert _fork_server.get_socket_path({}, "key") is None
+    folder.rmdir()
+    folder.symlink_to(tmp_path)
+    assert _fork_server.get_socket_path({}, "key") is None
+
+    # The same applies to a socket set in the environment.
+    env_folder = tmp_path / "env"
+    env_folder.mkdir(mode=0o700)
+    env = {"TEST_FORK_SERVER_SOCKET": os.fspath(env_folder / "fork-server.sock")}
+    assert _fork_server.get_socket_path(env, "key") == env_folder / "fork-server.sock"
+    env_folder.chmod(0o777)
+    assert _fork_server.get_socket_path(env, "key") is None
+
+
+def test_fork_server_key_includes_python_path():
+    key = _fork_server.get_server_key("/workspace", [], {})
+    assert key == _fork_server.get_server_key("/workspace", [], {"OTHER": "value"})
+    assert key != _fork_server.get_server_key("/workspace", [], {"PYTHONPATH": "/other"})
+
+
+def test_fork_server_is_stale_once_a_conftest_is_added(tmp_path):
+    mtimes = _fork_server.get_config_mtimes(tmp_path)
+    assert not _fork_server.is_stale(mtimes)
+
+    (tmp_path / "conftest.py").write_text("", encoding="utf-8")
+    assert _fork_server.is_stale(mtimes)
+
+
+def test_get_selection_keys():
+    folder = os.fspath(pathlib.Path("/", "tests"))
+    file_path = os.path.join(folder, "test_a.py")  # noqa: PTH118
+    keys = get_selection_keys(f"{file_path}::TestA::test_b[x::y]")
+    assert keys[:4] == [
+        f"{file_path}::TestA::test_b[x::y]",
+        f"{file_path}::TestA::test_b",
+        f"{file_path}::TestA",
+        file_path,
+    ]
+    assert folder in keys
+
+
+def test_compact_encoding_round_trip():
+    folder = pathlib.Path("/", "tests")
+    file_path = folder / "test_a.py"
+    test_id = f"{file_path}::test_b"
+    tree = {
+        "name": "tests",
+        "path": folder,
+        "type_": "folder",
+        "id_": os.fspath(folder),
+        "children": [
+            {
+                "name": "test_a.py",
+                "path": file_path,
+                "type_": "file",
+                "id_": os.fspath(file_path),
+                "children": [
+                    {
+                        "name": "test_b",
+                        "path": file_path,
+                        "type_": "test",
+                        "id_": test_id,
+                        "runID": test_id,
+                        "lineno": "1",
+                    },
+                    {"name": "", "path": file_path, "type_": "error", "id_": "", "children": []},
+                ],
+            }
+        ],
+    }
+    path_indexes: dict[str, int] = {}
+    encoded = encode_tree(tree, path_indexes)
+    assert list(path_indexes) == [os.fspath(folder), os.fspath(file_path)]
+    test_node = encoded["children"][0]["children"][0]
+    assert test_node == {
+        "name": "test_b",
+        "path": 1,
+        "type_": "test",
+        "rid": "::test_b",
+        "lineno": "1",
+    }
+    assert encoded["children"][0]["children"][1]["id_"] == ""
+    assert decode_tree(encoded, list(path_indexes)) == json.loads(
+        json.dumps(tree, default=os.fspath)
+    )
+
+
+def test_node_path_resolver_symlink(tmp_path, monkeypatch):
+    real_root = tmp_path / "real"
+    (real_root / "sub").mkdir(parents=True)
+    symlink_root = tmp_path / "link"
+    monkeypatch.setattr(vscode_pytest, "SYMLINK_PATH", symlink_root)
+    monkeypatch.chdir(real_root)
+    resolver = NodePathResolver()
+    node = cast("HasPathOrFspath", types.SimpleNamespace(path=real_root / "sub" / "test_a.py"))
+
+    node_path = resolver.get_node_path(node)
+    assert node_path == symlink_root / "sub" / "test_a.py"
+    assert resolver.get_node_path(node) is node_path
+    # The paths are relative to the working directory, they are resolved again when it changes.
+    monkeypatch.chdir(real_root / "sub")
+    assert resolver.get_node_path(node) == symlink_root / "test_a.py"
+    monkeypatch.setattr(vscode_pytest, "SYMLINK_PATH", None)
+    assert resolver.get_node_path(node) == real_root / "sub" / "test_a.py"
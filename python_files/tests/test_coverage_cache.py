@@ -0,0 +1,147 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import runpy
+import textwrap
+
+import pytest
+
+coverage = pytest.importorskip("coverage")
+
+import vscode_coverage_cache  # noqa: E402
+
+SOURCE = textwrap.dedent(
+    """
+    import contextlib
+
+
+    def branches(value):
+        if value > 1:
+            value = (
+                value
+                - 1
+            )
+        elif value < -1:  # pragma: no branch
+            value += 1
+        while value > 5:
+            value -= 1
+        for item in []:
+            value += item
+        with contextlib.suppress(ValueError):
+            with contextlib.suppress(KeyError):
+                value += 1
+        if value == 1000:  # pragma: no cover
+            value = 0
+        return value if value else None
+
+
+    def never_called():
+        return [
+            1,
+            2,
+        ]
+
+
+    branches(3)
+    branches(8)
+    """
+)
+
+
+def run_module(tmp_path, source, *, branch=True):
+    """Runs a module with coverage and returns the coverage object its data is loaded in."""
+    module = tmp_path / "module.py"
+    module.write_text(source, encoding="utf-8")
+    cov = coverage.Coverage(data_file=os.fspath(tmp_path / ".coverage"), branch=branch)
+    cov.start()
+    try:
+        runpy.run_path(os.fspath(module))
+    finally:
+        cov.stop()
+    cov.save()
+    cov = coverage.Coverage(data_file=os.fspath(tmp_path / ".coverage"), branch=branch)
+    cov.load()
+    return cov, os.fspath(module)
+
+
+class TestCoverageCache:
+    """Unit tests for the cached analysis of measured files."""
+
+    @pytest.mark.parametrize("branch", [True, False])
+    def test_matches_analysis2(self, tmp_path, branch):
+        cov, module = run_module(tmp_path, SOURCE, branch=branch)
+        cache = vscode_coverage_cache.AnalysisCache(cov)
+        expected = vscode_coverage_cache.analyze_with_coverage(cov, module, include_branches=True)
+        assert cache.analyze(cov, module, include_branches=True) == expected
+        assert module in cache.analyzed
+        # The second analysis reuses the cached one.
+        assert cache.analyze(cov, module, include_branches=True) == expected
+
+    def test_cache_is_reused_from_disk(self, tmp_path, monkeypatch):
+        cov, module = run_module(tmp_path, SOURCE)
+        cache_path = tmp_path / "cache" / "analysis.json"
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        expected = cache.analyze(cov, module, include_branches=True)
+        cache.save()
+
+        def fail_analysis(*_args, **_kwargs):
+            raise AssertionError("An unchanged file was analyzed again.")
+
+        monkeypatch.setattr(vscode_coverage_cache, "analyze_with_coverage", fail_analysis)
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        assert cache.analyze(cov, module, include_branches=True) == expected
+        assert not cache.analyzed
+
+    def test_changed_source_is_analyzed_again(self, tmp_path):
+        cov, module = run_module(tmp_path, SOURCE)
+        cache_path = tmp_path / "analysis.json"
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        cache.analyze(cov, module, include_branches=True)
+        cache.save()
+
+        cov, module = run_module(tmp_path, SOURCE.replace("branches(8)", "branches(-8)"))
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        assert module in cache.files
+        expected = vscode_coverage_cache.analyze_with_coverage(cov, module, include_branches=True)
+        assert cache.analyze(cov, module, include_branches=True) == expected
+        assert module in cache.analyzed
+
+    def test_changed_hits_are_analyzed_again(self, tmp_path, monkeypatch):
+        source = (
+            SOURCE + "if __import__('os').environ.get('CALL_NEVER_CALLED'):\n    never_called()\n"
+        )
+        cov, module = run_module(tmp_path, source)
+        cache_path = tmp_path / "analysis.json"
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        cache.analyze(cov, module, include_branches=True)
+        cache.save()
+
+        # The source is the same, but the run hits other lines of it.
+        monkeypatch.setenv("CALL_NEVER_CALLED", "1")
+        cov, module = run_module(tmp_path, source)
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        expected = vscode_coverage_cache.analyze_with_coverage(cov, module, include_branches=True)
+        assert cache.analyze(cov, module, include_branches=True) == expected
+        assert module in cache.analyzed
+
+    def test_other_settings_discard_the_cache(self, tmp_path):
+        cov, module = run_module(tmp_path, SOURCE)
+        cache_path = tmp_path / "analysis.json"
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        cache.analyze(cov, module, include_branches=True)
+        cache.save()
+
+        cov.config.exclude_list.append("return value")
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        assert not cache.files
+
+    def test_unreadable_cache_is_ignored(self, tmp_path):
+        cov, module = run_module(tmp_path, SOURCE)
+        cache_path = tmp_path / "analysis.json"
+        cache_path.write_text("{not json", encoding="utf-8")
+        cache = vscode_coverage_cache.AnalysisCache(cov, cache_path)
+        expected = vscode_coverage_cache.analyze_with_coverage(cov, module, include_branches=True)
+        assert cache.analyze(cov, module, include_branches=True) == expected
+        cache.save()
+        assert vscode_coverage_cache.AnalysisCache(cov, cache_path).files.keys() == {module}
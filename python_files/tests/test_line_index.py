@@ -0,0 +1,101 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import textwrap
+
+import vscode_line_index
+
+SOURCE = textwrap.dedent(
+    """
+    import sys
+
+
+    def decorator(func):
+        return func
+
+
+    @decorator
+    class TestDecorated:
+        @decorator
+        @decorator
+        def test_method(self):
+            pass
+
+        class TestNested:
+            def test_nested(self):
+                def helper():
+                    pass
+
+                return helper
+
+
+    if sys.version_info >= (3, 8):
+
+        def test_conditional():
+            pass
+
+    else:
+
+        def test_conditional():
+            pass
+
+
+    try:
+        import missing
+    except ImportError:
+
+        class TestFallback:
+            pass
+
+
+    def test_redefined():
+        pass
+
+
+    def test_redefined():
+        pass
+    """
+)
+
+
+class TestLineIndex:
+    """Unit tests for the line index of test modules."""
+
+    def test_decorated_definitions(self):
+        index = vscode_line_index.build_index(SOURCE)
+        assert index["TestDecorated"] == (10, 9)
+        assert index["TestDecorated.test_method"] == (13, 11)
+
+    def test_nested_definitions(self):
+        index = vscode_line_index.build_index(SOURCE)
+        assert index["TestDecorated.TestNested"] == (16, 16)
+        assert index["TestDecorated.TestNested.test_nested"] == (17, 17)
+        assert index["TestDecorated.TestNested.test_nested.<locals>.helper"] == (18, 18)
+
+    def test_definitions_in_blocks(self):
+        index = vscode_line_index.build_index(SOURCE)
+        assert index["test_conditional"] == (31, 31)
+        assert index["TestFallback"] == (39, 39)
+
+    def test_redefinition_keeps_last(self):
+        index = vscode_line_index.build_index(SOURCE)
+        assert index["test_redefined"] == (47, 47)
+
+    def test_definition_lines_of_objects(self):
+        vscode_line_index.clear()
+
+        class TestLocal:
+            def test_method(self):
+                pass
+
+        lines = vscode_line_index.get_definition_lines(TestLocal.test_method)
+        assert lines is not None
+        assert lines[0] == TestLocal.test_method.__code__.co_firstlineno
+        assert vscode_line_index.get_definition_lines(TestLocal().test_method) == lines
+        # Classes are looked up in the file of their module, which is this one.
+        assert vscode_line_index.get_definition_lines(TestLocal) is not None
+
+    def test_dynamic_definitions_are_not_indexed(self):
+        generated = type("TestGenerated", (), {})
+        assert vscode_line_index.get_definition_lines(generated) is None
+        assert vscode_line_index.get_definition_lines(eval("lambda: None")) is None
@@ -0,0 +1,85 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import io
+import threading
+
+import pytest
+
+from vscode_pipe_writer import PipeWriterThread
+
+
+class GatedWriter(io.BytesIO):
+    """An in-memory pipe whose writes wait until the gate is opened."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def write(self, data):
+        self.gate.wait()
+        return super().write(data)
+
+
+@pytest.mark.parametrize("policy", ["block", "coalesce"])
+def test_pipe_writer_thread_writes_messages_in_order(policy):
+    writer = GatedWriter()
+    writer.gate.set()
+    writer_thread = PipeWriterThread(writer, 2, policy, "test")
+    for i in range(100):
+        writer_thread.send(f"message {i};".encode())
+    writer_thread.close()
+
+    assert writer.getvalue() == "".join(f"message {i};" for i in range(100)).encode()
+
+
+def test_pipe_writer_thread_coalesces_when_full():
+    writer = GatedWriter()
+    writer_thread = PipeWriterThread(writer, 1, "coalesce", "test")
+    # The writer is blocked, so the queue is full after the first messages.
+    for i in range(10):
+        writer_thread.send(f"message {i};".encode())
+    assert len(writer_thread.queue) <= 1
+
+    writer.gate.set()
+    writer_thread.close()
+
+    assert writer.getvalue() == "".join(f"message {i};" for i in range(10)).encode()
+
+
+def test_pipe_writer_thread_limits_coalesced_size():
+    writer = GatedWriter()
+    writer_thread = PipeWriterThread(writer, 1, "coalesce", "test", max_coalesced_bytes=20)
+    sender = threading.Thread(
+        target=lambda: [writer_thread.send(f"message {i};".encode()) for i in range(10)]
+    )
+    sender.start()
+    # The sender waits for room once the queued message would grow beyond 20 bytes.
+    sender.join(timeout=0.5)
+    assert sender.is_alive()
+    assert all(len(message) <= 20 for message in writer_thread.queue)
+
+    writer.gate.set()
+    sender.join()
+    writer_thread.close()
+
+    assert writer.getvalue() == "".join(f"message {i};" for i in range(10)).encode()
+
+
+def test_pipe_writer_thread_sends_after_queued_messages_once_closed():
+    writer = GatedWriter()
+    writer_thread = PipeWriterThread(writer, 10, "block", "test")
+    for i in range(5):
+        writer_thread.send(f"message {i};".encode())
+    closer = threading.Thread(target=writer_thread.close)
+    closer.start()
+    while not writer_thread.closed:
+        pass
+    sender = threading.Thread(target=writer_thread.send, args=(b"last;",))
+    sender.start()
+
+    writer.gate.set()
+    closer.join()
+    sender.join()
+
+    assert writer.getvalue() == b"".join(f"message {i};".encode() for i in range(5)) + b"last;"
@@ -0,0 +1,139 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import pathlib
+import tempfile
+
+import pytest
+
+from unittestadapter.execution import select_affected_tests
+from unittestadapter.import_graph import ImportGraph, parse_imports
+
+PROJECT_FILES = {
+    "pkg/__init__.py": "",
+    "pkg/core.py": "def add(a, b):\n    return a + b\n",
+    "pkg/util.py": "from .core import add\n\n\ndef double(a):\n    return add(a, a)\n",
+    "pkg/other.py": "VALUE = 1\n",
+    "tests/__init__.py": "",
+    "tests/helpers.py": "import json\n",
+    "tests/test_util.py": "import unittest\n\nfrom pkg import util\n",
+    "tests/test_other.py": "import unittest\n\nimport pkg.other\n",
+    "tests/test_lazy.py": "def test_add():\n    from pkg.core import add\n",
+    "tests/test_helpers.py": "import helpers\n",
+    ".venv/lib/pkg/core.py": "",
+    "README.md": "",
+}
+
+TEST_IDS = [
+    "tests.test_util.TestUtil.test_double",
+    "tests.test_other.TestOther.test_value",
+    "tests.test_lazy.TestLazy.test_add",
+    "tests.test_helpers.TestHelpers.test_helpers",
+    "unittest.loader._FailedTest.tests.test_broken",
+]
+
+
+@pytest.fixture
+def project(tmp_path: pathlib.Path) -> pathlib.Path:
+    for name, content in PROJECT_FILES.items():
+        path = tmp_path / "project" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+    return tmp_path / "project"
+
+
+def get_graph(project: pathlib.Path, cache_path=None) -> ImportGraph:
+    graph = ImportGraph([os.fspath(project), os.fspath(project / "tests")], cache_path)
+    graph.update()
+    return graph
+
+
+def test_parse_imports():
+    source = b"import a.b, c\nfrom . import d\nfrom ..e import *\n\ndef g():\n    from h import i\n"
+    assert parse_imports(source, "module.py") == [
+        ("a.b", 0, []),
+        ("c", 0, []),
+        ("", 1, ["d"]),
+        ("e", 2, []),
+        ("h", 0, ["i"]),
+    ]
+    assert parse_imports(b"import (", "module.py") == []
+
+
+@pytest.mark.parametrize(
+    ("changed_file", "expected_tests"),
+    [
+        (
+            "pkg/core.py",
+            ["tests.test_util.TestUtil.test_double", "tests.test_lazy.TestLazy.test_add"],
+        ),
+        ("pkg/other.py", ["tests.test_other.TestOther.test_value"]),
+        (
+            "pkg/__init__.py",
+            [
+                "tests.test_util.TestUtil.test_double",
+                "tests.test_other.TestOther.test_value",
+                "tests.test_lazy.TestLazy.test_add",
+            ],
+        ),
+        ("tests/helpers.py", ["tests.test_helpers.TestHelpers.test_helpers"]),
+    ],
+)
+def test_select_tests(project, changed_file, expected_tests):
+    graph = get_graph(project)
+    selected, unknown_files = graph.select_tests(TEST_IDS, [os.fspath(project / changed_file)])
+    # The tests of modules outside of the graph always run.
+    assert selected == [*expected_tests, "unittest.loader._FailedTest.tests.test_broken"]
+    assert unknown_files == []
+
+
+def test_unknown_files(project):
+    graph = get_graph(project)
+    assert os.fspath(project / ".venv" / "lib" / "pkg" / "core.py") not in graph.files
+    changed_files = [os.fspath(project / "README.md"), os.fspath(project / "pkg" / "core.py")]
+    _, unknown_files = graph.select_tests(TEST_IDS, changed_files)
+    assert unknown_files == [os.fspath(project / "README.md")]
+
+
+def test_incremental_update(project, tmp_path):
+    cache_path = tmp_path / "graph.json"
+    graph = get_graph(project, cache_path)
+    assert len(graph.parsed) == len(graph.files) == 10
+    graph.save()
+
+    # Unchanged files are not parsed again, nor are touched files with the same content.
+    os.utime(project / "pkg" / "other.py", ns=(0, 0))
+    graph = get_graph(project, cache_path)
+    assert graph.parsed == set()
+    graph.save()
+
+    (project / "pkg" / "other.py").write_text("from pkg.core import add\n", encoding="utf-8")
+    graph = get_graph(project, cache_path)
+    assert graph.parsed == {os.fspath(project / "pkg" / "other.py")}
+    selected, _ = graph.select_tests(TEST_IDS, [os.fspath(project / "pkg" / "core.py")])
+    assert "tests.test_other.TestOther.test_value" in selected
+    graph.save()
+
+    # An added module is resolved by the files that already imported its name.
+    (project / "tests" / "helpers.py").unlink()
+    (project / "tests" / "helpers").mkdir()
+    (project / "tests" / "helpers" / "__init__.py").write_text("", encoding="utf-8")
+    graph = get_graph(project, cache_path)
+    assert graph.parsed == {os.fspath(project / "tests" / "helpers" / "__init__.py")}
+    changed_file = os.fspath(project / "tests" / "helpers" / "__init__.py")
+    selected, _ = graph.select_tests(TEST_IDS, [changed_file])
+    assert "tests.test_helpers.TestHelpers.test_helpers" in selected
+
+
+def test_select_affected_tests(project, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", os.fspath(tmp_path / "temp"))
+    monkeypatch.chdir(project)
+    args = (TEST_IDS, ["pkg/other.py"], "tests", os.fspath(project))
+    assert select_affected_tests(*args) == [
+        "tests.test_other.TestOther.test_value",
+        "unittest.loader._FailedTest.tests.test_broken",
+    ]
+    assert len(list((tmp_path / "temp").glob("*/import-graph-*.json"))) == 1
+    # A change the graph does not know about runs all the tests.
+    assert select_affected_tests(TEST_IDS, ["README.md"], "tests", os.fspath(project)) == TEST_IDS
@@ -23,6 +23,11 @@ sys.path.append(os.fspath(script_dir))
 
 from django_handler import django_execution_runner  # noqa: E402
 
+from unittestadapter.import_graph import (  # noqa: E402
+    CHANGED_FILES_ENV,
+    ImportGraph,
+    get_graph_cache_path,
+)
 from unittestadapter.pvsc_utils import (  # noqa: E402
     CoveragePayloadDict,
     ExecutionPayloadDict,
@@ -32,6 +37,7 @@ from unittestadapter.pvsc_utils import (  # noqa: E402
     parse_unittest_args,
     send_post_request,
 )
+from vscode_coverage_cache import AnalysisCache, get_temp_cache_path  # noqa: E402
 
 ErrorType = Union[Tuple[Type[BaseException], BaseException, TracebackType], Tuple[None, None, None]]
 test_run_pipe = ""
@@ -253,6 +259,37 @@ def run_tests(
     return payload
 
 
+def select_affected_tests(
+    test_ids: List[str],
+    changed_files: List[str],
+    start_dir: str,
+    top_level_dir: Optional[str],
+) -> List[str]:
+    """Return the test ids whose module imports one of the changed files, directly or not.
+
+    All the test ids are returned when a changed file is not a Python file of the project,
+    since the tests it affects are not known.
+    """
+    start_dir = os.path.abspath(start_dir)  # noqa: PTH100
+    if start_dir.endswith(".py"):
+        start_dir = os.path.dirname(start_dir)  # noqa: PTH120
+    top_level_dir = os.path.abspath(top_level_dir) if top_level_dir else start_dir  # noqa: PTH100
+    search_roots = [top_level_dir] if start_dir == top_level_dir else [top_level_dir, start_dir]
+    graph = ImportGraph(search_roots, get_graph_cache_path(top_level_dir))
+    graph.update()
+    graph.save()
+    changed_files = [os.path.abspath(file) for file in changed_files]  # noqa: PTH100
+    selected, unknown_files = graph.select_tests(test_ids, changed_files)
+    if unknown_files:
+        print(f"Running all tests, the tests affected by {', '.join(unknown_files)} are not known.")
+        return test_ids
+    print(
+        f"Running {len(selected)} of {len(test_ids)} tests affected by {len(changed_files)} "
+        f"changed files, {len(graph.parsed)} files parsed."
+    )
+    return selected
+
+
 __socket = None
 atexit.register(lambda: __socket.close() if __socket else None)
 
@@ -312,6 +349,20 @@ if __name__ == "__main__":
         }
         send_post_request(payload, test_run_pipe)
 
+    # Only the tests affected by the changed files run, selected with the import graph.
+    if changed_files_path := os.environ.get(CHANGED_FILES_ENV):
+        try:
+            changed_files_text = pathlib.Path(changed_files_path).read_text(encoding="utf-8")
+        except OSError as e:
+            print(
+                f"Error[vscode-unittest]: unable to read the changed files, running all tests: {e}"
+            )
+        else:
+            changed_files = [
+                line.strip() for line in changed_files_text.splitlines() if line.strip()
+            ]
+            test_ids = select_affected_tests(test_ids, changed_files, start_dir, top_level_dir)
+
     workspace_root = os.environ.get("COVERAGE_ENABLED")
     # For unittest COVERAGE_ENABLED is to the root of the workspace so correct data is collected
     cov = None
@@ -375,26 +426,18 @@ if __name__ == "__main__":
         cov.load()
         file_set: Set[str] = cov.get_data().measured_files()
         file_coverage_map: Dict[str, FileCoverageInfo] = {}
+        # Only the files that changed, or whose hits changed, since the last run are analyzed.
+        cache = AnalysisCache(cov, get_temp_cache_path(os.fspath(cwd)))
         for file in file_set:
-            analysis = cov.analysis2(file)
-            taken_file_branches = 0
-            total_file_branches = -1
-
-            if include_branches:
-                branch_stats: dict[int, tuple[int, int]] = cov.branch_stats(file)
-                total_file_branches = sum([total_exits for total_exits, _ in branch_stats.values()])
-                taken_file_branches = sum([taken_exits for _, taken_exits in branch_stats.values()])
-
-            lines_executable = {int(line_no) for line_no in analysis[1]}
-            lines_missed = {int(line_no) for line_no in analysis[3]}
-            lines_covered = lines_executable - lines_missed
+            file_coverage = cache.analyze(cov, file, include_branches=include_branches)
             file_info: FileCoverageInfo = {
-                "lines_covered": list(lines_covered),  # list of int
-                "lines_missed": list(lines_missed),  # list of int
-                "executed_branches": taken_file_branches,
-                "total_branches": total_file_branches,
+                "lines_covered": list(file_coverage.lines_covered),  # list of int
+                "lines_missed": list(file_coverage.lines_missed),  # list of int
+                "executed_branches": file_coverage.executed_branches,
+                "total_branches": file_coverage.total_branches,
             }
             file_coverage_map[file] = file_info
+        cache.save()
 
         payload_cov: CoveragePayloadDict = CoveragePayloadDict(
             coverage=True,
@@ -0,0 +1,265 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Static import graph of a project, to run only the tests affected by changed files.
+
+The imports of the Python files under the top-level directory are parsed with `ast`, without
+running them, and each file depends on the project files it imports, and on the `__init__.py`
+of their packages. The tests affected by a set of changed files are the ones whose module
+reaches one of them through the graph. Imports made at run time, with `importlib` or
+`__import__`, are not seen.
+
+The imports of each file are cached on disk keyed by the hash of its source, and the hash is
+only computed again for files whose size or modification time changed. Updating the graph
+after an edit then reads and parses only the edited files, and resolves their imports again
+unless files were added or removed.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypedDict
+
+# The file the changed files are read from, one path per line, when only the affected tests run.
+CHANGED_FILES_ENV = "AFFECTED_TESTS_CHANGED_FILES"
+GRAPH_VERSION = 1
+TEMP_CACHE_DIR = "vscode-unittest"
+# Folders that never hold project modules, along with hidden folders and virtual environments.
+SKIPPED_DIRS = frozenset({"__pycache__", "node_modules", "site-packages"})
+
+# The imported module, the number of leading dots of a relative import, and the imported names.
+ImportRecord = Tuple[str, int, List[str]]
+
+
+class FileEntryDict(TypedDict):
+    mtime_ns: int
+    size: int
+    hash: str
+    imports: List[ImportRecord]
+    # The project files the file imports.
+    dependencies: List[str]
+
+
+def get_graph_cache_path(root: str) -> pathlib.Path:
+    """Returns the cache file of the import graph of a directory in the temporary directory."""
+    root_hash = hashlib.sha256(os.fsencode(root)).hexdigest()[:16]
+    return pathlib.Path(tempfile.gettempdir()) / TEMP_CACHE_DIR / f"import-graph-{root_hash}.json"
+
+
+def iter_python_files(root: str) -> Iterator[str]:
+    """Yields the Python files under a directory, outside of hidden and environment folders."""
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [
+            name
+            for name in dir_names
+            if not name.startswith(".")
+            and name not in SKIPPED_DIRS
+            and not pathlib.Path(dir_path, name, "pyvenv.cfg").exists()
+        ]
+        for name in file_names:
+            if name.endswith(".py"):
+                yield os.fspath(pathlib.Path(dir_path, name))
+
+
+def get_module_name(file: str, root: str) -> Optional[str]:
+    """Returns the name a file is imported with from a directory, None if it cannot be."""
+    try:
+        parts = pathlib.PurePath(file).relative_to(root).with_suffix("").parts
+    except ValueError:
+        return None
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    if not parts or not all(part.isidentifier() for part in parts):
+        return None
+    return ".".join(parts)
+
+
+def parse_imports(source: bytes, file: str) -> List[ImportRecord]:
+    """Returns the imports anywhere in a module, an empty list if it cannot be parsed."""
+    try:
+        tree = ast.parse(source, filename=file)
+    except (SyntaxError, ValueError):
+        return []
+    imports: List[ImportRecord] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, 0, []) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names = [alias.name for alias in node.names if alias.name != "*"]
+            imports.append((node.module or "", node.level, names))
+    return imports
+
+
+class ImportGraph:
+    """The project files each Python file under the top-level directory imports.
+
+    Keyword arguments:
+    search_roots -- the directories modules are imported from, in the order of `sys.path`, the
+        top-level directory first. The files under the top-level directory are in the graph.
+    path -- the file the graph is read from and saved to, None for a graph kept in memory.
+    """
+
+    def __init__(self, search_roots: List[str], path: Optional[pathlib.Path] = None) -> None:
+        self.root = search_roots[0]
+        self.search_roots = search_roots
+        self.path = path
+        self.files: Dict[str, FileEntryDict] = {}
+        # The files parsed by the last update.
+        self.parsed: Set[str] = set()
+        # The file of each module name, which is imported first when several roots have it.
+        self.modules: Dict[str, str] = {}
+        self.changed = False
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: pathlib.Path) -> None:
+        try:
+            with path.open(encoding="utf-8") as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            isinstance(content, dict)
+            and content.get("version") == GRAPH_VERSION
+            and content.get("roots") == self.search_roots
+        ):
+            self.files = content.get("files", {})
+
+    def save(self) -> None:
+        """Writes the graph, if it changed since it was loaded."""
+        if self.path is None or not self.changed:
+            return
+        content = {"version": GRAPH_VERSION, "roots": self.search_roots, "files": self.files}
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with temp_path.open("w", encoding="utf-8") as f:
+                json.dump(content, f, separators=(",", ":"))
+            # Replaced at once, so a concurrent run reads either graph but never half of one.
+            temp_path.replace(self.path)
+        except OSError as e:
+            print(f"Warning: unable to save the import graph to {self.path}: {e}")
+
+    def update(self) -> None:
+        """Parses the imports of the files added or changed since the graph was saved."""
+        self.parsed = set()
+        files: Dict[str, FileEntryDict] = {}
+        for file in iter_python_files(self.root):
+            try:
+                stat = pathlib.Path(file).stat()
+            except OSError:
+                continue
+            entry = self.files.get(file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if entry is None or (entry["mtime_ns"], entry["size"]) != signature:
+                entry = self.read_entry(file, stat, entry)
+                if entry is None:
+                    continue
+            files[file] = entry
+        # The imports of every file can resolve to other files once files are added or removed.
+        resolve_all = files.keys() != self.files.keys()
+        self.changed = self.changed or resolve_all
+        self.files = files
+        self.modules = {}
+        for search_root in reversed(self.search_roots):
+            for file in files:
+                name = get_module_name(file, search_root)
+                if name is not None:
+                    self.modules[name] = file
+        for file, entry in files.items():
+            if resolve_all or file in self.parsed:
+                entry["dependencies"] = sorted(self.resolve(file, entry["imports"]))
+
+    def read_entry(
+        self, file: str, stat: os.stat_result, entry: Optional[FileEntryDict]
+    ) -> Optional[FileEntryDict]:
+        """Returns the entry of a file whose size or modification time changed."""
+        try:
+            source = pathlib.Path(file).read_bytes()
+        except OSError:
+            return None
+        self.changed = True
+        source_hash = hashlib.sha256(source).hexdigest()
+        if entry is not None and entry["hash"] == source_hash:
+            return {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        self.parsed.add(file)
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": source_hash,
+            "imports": parse_imports(source, file),
+            "dependencies": [],
+        }
+
+    def resolve(self, file: str, imports: Iterable[ImportRecord]) -> Set[str]:
+        """Returns the project files a file imports, with the packages they are in."""
+        name = get_module_name(file, self.root)
+        package = name.split(".") if name else []
+        if pathlib.PurePath(file).name != "__init__.py":
+            package = package[:-1]
+        dependencies: Set[str] = set()
+        for module, level, names in imports:
+            parts = module.split(".") if module else []
+            if level:
+                if level - 1 > len(package):
+                    continue
+                parts = package[: len(package) - level + 1] + parts
+            # `from package import name` imports the submodule `name` when there is one.
+            for imported in [parts] + [[*parts, name] for name in names]:
+                for index in range(1, len(imported) + 1):
+                    dependency = self.modules.get(".".join(imported[:index]))
+                    if dependency is not None and dependency != file:
+                        dependencies.add(dependency)
+        return dependencies
+
+    def affected_files(self, changed_files: Iterable[str]) -> Tuple[Set[str], List[str]]:
+        """Returns the files that import one of the changed files, directly or not.
+
+        The changed files are included, and the ones that are not in the graph are returned
+        separately, since what depends on them is not known.
+        """
+        dependents: Dict[str, Set[str]] = {}
+        for file, entry in self.files.items():
+            for dependency in entry["dependencies"]:
+                dependents.setdefault(dependency, set()).add(file)
+        affected: Set[str] = set()
+        unknown_files: List[str] = []
+        pending: List[str] = []
+        for file in changed_files:
+            if file in self.files:
+                pending.append(file)
+            else:
+                unknown_files.append(file)
+        while pending:
+            file = pending.pop()
+            if file not in affected:
+                affected.add(file)
+                pending.extend(dependents.get(file, ()))
+        return affected, unknown_files
+
+    def get_test_file(self, test_id: str) -> Optional[str]:
+        """Returns the file of the module of a test id, the longest dotted prefix in the graph."""
+        parts = test_id.split(".")
+        for index in range(len(parts), 0, -1):
+            file = self.modules.get(".".join(parts[:index]))
+            if file is not None:
+                return file
+        return None
+
+    def select_tests(
+        self, test_ids: List[str], changed_files: Iterable[str]
+    ) -> Tuple[List[str], List[str]]:
+        """Returns the test ids affected by the changed files, and the files not in the graph.
+
+        Tests whose module is not in the graph, like the errors of modules that failed to
+        import, are always selected.
+        """
+        affected, unknown_files = self.affected_files(changed_files)
+        selected = [
+            test_id
+            for test_id in test_ids
+            if (file := self.get_test_file(test_id)) is None or file in affected
+        ]
+        return selected, unknown_files
@@ -19,6 +19,9 @@ sys.path.append(os.fspath(script_dir / "lib" / "python"))
 
 from typing_extensions import NotRequired  # noqa: E402
 
+from vscode_line_index import get_definition_lines  # noqa: E402
+from vscode_pipe_writer import PipeWriterThread, write_message  # noqa: E402
+
 # Types
 
 
@@ -104,8 +107,11 @@ def get_test_case(suite):
 
 def get_class_line(test_case: unittest.TestCase) -> Optional[str]:
     """Get the line number where a test class is defined."""
+    test_class = test_case.__class__
+    lines = get_definition_lines(test_class)
+    if lines is not None:
+        return str(lines[1])
     try:
-        test_class = test_case.__class__
         _sourcelines, lineno = inspect.getsourcelines(test_class)
         return str(lineno)
     except Exception:
@@ -114,6 +120,10 @@ def get_class_line(test_case: unittest.TestCase) -> Optional[str]:
 
 def get_source_line(obj) -> str:
     """Get the line number of a test case start line."""
+    lines = get_definition_lines(obj)
+    if lines is not None:
+        return str(lines[0])
+    # Tests generated at runtime are not in the index of their module.
     try:
         sourcelines, lineno = inspect.getsourcelines(obj)
     except Exception:
@@ -325,8 +335,23 @@ def parse_unittest_args(
     )
 
 
+# Messages are written from a background thread when the policy is "block" or "coalesce".
+TEST_RUN_PIPE_WRITER = os.getenv("TEST_RUN_PIPE_WRITER")
+TEST_RUN_PIPE_QUEUE_SIZE = os.getenv("TEST_RUN_PIPE_QUEUE_SIZE", "1024")
+
 __writer = None
-atexit.register(lambda: __writer.close() if __writer else None)
+__writer_thread: Optional[PipeWriterThread] = None
+
+
+def close_writer() -> None:
+    """Sends the queued messages and closes the connection to the extension."""
+    if __writer_thread is not None:
+        __writer_thread.close()
+    if __writer:
+        __writer.close()
+
+
+atexit.register(close_writer)
 
 
 def send_post_request(
@@ -350,7 +375,7 @@ def send_post_request(
         print(error_msg, file=sys.stderr)
         raise VSCodeUnittestError(error_msg)
 
-    global __writer
+    global __writer, __writer_thread
 
     if __writer is None:
         try:
@@ -360,6 +385,16 @@ def send_post_request(
             print(error_msg, file=sys.stderr)
             __writer = None
             raise VSCodeUnittestError(error_msg) from error
+        if TEST_RUN_PIPE_WRITER in ("block", "coalesce"):
+            queue_size = (
+                int(TEST_RUN_PIPE_QUEUE_SIZE) if TEST_RUN_PIPE_QUEUE_SIZE.isdigit() else 1024
+            )
+            __writer_thread = PipeWriterThread(
+                __writer,
+                queue_size,
+                TEST_RUN_PIPE_WRITER,  # type: ignore
+                "vscode-unittest",
+            )
 
     rpc = {
         "jsonrpc": "2.0",
@@ -371,13 +406,11 @@ def send_post_request(
             request = (
                 f"""content-length: {len(data)}\r\ncontent-type: application/json\r\n\r\n{data}"""
             )
-            size = 4096
             encoded = request.encode("utf-8")
-            bytes_written = 0
-            while bytes_written < len(encoded):
-                segment = encoded[bytes_written : bytes_written + size]
-                bytes_written += __writer.write(segment)
-                __writer.flush()
+            if __writer_thread is not None:
+                __writer_thread.send(encoded)
+            else:
+                write_message(__writer, encoded)
         else:
             print(
                 f"Connection error[vscode-unittest], writer is None \n[vscode-unittest] data: \n{data} \n",
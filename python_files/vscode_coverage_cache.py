@@ -0,0 +1,204 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Incremental analysis of the measured files of a coverage run, shared by the test adapters.
+
+`Coverage.analysis2` parses the source of a file to find its statements and the arcs between
+them on every run, which is most of the time it takes, even when only one test was rerun and
+the file did not change. Instead the analysis of each file is cached on disk, keyed by the hash
+of its source and the hash of the lines and arcs the run measured in it, and discarded when the
+version of coverage.py or the exclusion settings change. A file is only analyzed again when it
+changed or the run hit other lines of it.
+
+Files are analyzed with the public `analysis2` and `branch_stats` APIs, so the reported lines
+are always the ones coverage.py reports. Files measured by a coverage plugin, and files whose
+source cannot be read, are not cached.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import TYPE_CHECKING, NamedTuple, TypedDict
+
+if TYPE_CHECKING:
+    import coverage
+
+CACHE_VERSION = 2
+# The folder of the temporary directory caches without a better place are kept in.
+TEMP_CACHE_DIR = "vscode-coverage"
+
+
+class FileAnalysisDict(TypedDict):
+    hash: str  # The hash of the source of the file.
+    hits: str  # The hash of the lines and arcs the run measured in the file.
+    lines_covered: list[int]
+    lines_missed: list[int]
+    executed_branches: int
+    total_branches: int
+
+
+class FileCoverage(NamedTuple):
+    lines_covered: set[int]
+    lines_missed: set[int]
+    executed_branches: int
+    total_branches: int
+
+
+def get_source_hash(file: str) -> str | None:
+    """Returns the hash of the content of a file, None if it cannot be read."""
+    try:
+        return hashlib.sha256(pathlib.Path(file).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def get_hits_hash(cov: coverage.Coverage, file: str, *, include_branches: bool) -> str:
+    """Returns the hash of the lines and arcs the run measured in a file."""
+    data = cov.get_data()
+    hits: list = [include_branches, sorted(data.lines(file) or [])]
+    if include_branches and data.has_arcs():
+        hits.append(sorted(data.arcs(file) or []))
+    return hashlib.sha256(json.dumps(hits).encode()).hexdigest()
+
+
+def get_temp_cache_path(root: str) -> pathlib.Path:
+    """Returns the cache file of a workspace in the temporary directory."""
+    root_hash = hashlib.sha256(os.fsencode(root)).hexdigest()[:16]
+    return pathlib.Path(tempfile.gettempdir()) / TEMP_CACHE_DIR / f"analysis-{root_hash}.json"
+
+
+def get_settings_key(cov: coverage.Coverage) -> str:
+    """Returns the key of the settings the analysis of the files depends on."""
+    import coverage
+
+    config = cov.config
+    return json.dumps(
+        [
+            CACHE_VERSION,
+            coverage.__version__,
+            config.exclude_list,
+            config.partial_list,
+            config.partial_always_list,
+        ]
+    )
+
+
+def analyze_with_coverage(
+    cov: coverage.Coverage, file: str, *, include_branches: bool
+) -> FileCoverage:
+    """Returns the coverage of a file analyzed by `analysis2`, without the cache."""
+    analysis = cov.analysis2(file)
+    executed_branches = 0
+    total_branches = -1
+    if include_branches:
+        branch_stats: dict[int, tuple[int, int]] = cov.branch_stats(file)
+        total_branches = sum([total_exits for total_exits, _ in branch_stats.values()])
+        executed_branches = sum([taken_exits for _, taken_exits in branch_stats.values()])
+    lines_executable = {int(line_no) for line_no in analysis[1]}
+    lines_missed = {int(line_no) for line_no in analysis[3]}
+    return FileCoverage(
+        lines_executable - lines_missed, lines_missed, executed_branches, total_branches
+    )
+
+
+class AnalysisCache:
+    """The analysis of the measured files, keyed by their path.
+
+    Keyword arguments:
+    cov -- the coverage object the data of the run was loaded in.
+    path -- the file the cache is read from and saved to, None for a cache kept in memory.
+    """
+
+    def __init__(self, cov: coverage.Coverage, path: pathlib.Path | None = None) -> None:
+        self.path = path
+        self.settings_key = get_settings_key(cov)
+        self.files: dict[str, FileAnalysisDict] = {}
+        # The files analyzed since the cache was loaded, to save or to send back.
+        self.analyzed: dict[str, FileAnalysisDict] = {}
+        self.hashes: dict[str, str | None] = {}
+        self.hits: dict[str, str] = {}
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: pathlib.Path) -> None:
+        try:
+            with path.open(encoding="utf-8") as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(content, dict) and content.get("settings") == self.settings_key:
+            self.files = content.get("files", {})
+
+    def save(self) -> None:
+        """Writes the cache, if files were analyzed since it was loaded."""
+        if self.path is None or not self.analyzed:
+            return
+        content = {"settings": self.settings_key, "files": self.files}
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with temp_path.open("w", encoding="utf-8") as f:
+                json.dump(content, f, separators=(",", ":"))
+            # Replaced at once, so a concurrent run reads either cache but never half of one.
+            temp_path.replace(self.path)
+        except OSError as e:
+            print(f"Warning: unable to save the coverage analysis cache to {self.path}: {e}")
+
+    def get_hash(self, file: str) -> str | None:
+        if file not in self.hashes:
+            self.hashes[file] = get_source_hash(file)
+        return self.hashes[file]
+
+    def get_hits(self, cov: coverage.Coverage, file: str, *, include_branches: bool) -> str:
+        if file not in self.hits:
+            self.hits[file] = get_hits_hash(cov, file, include_branches=include_branches)
+        return self.hits[file]
+
+    def get_cached(
+        self, cov: coverage.Coverage, file: str, *, include_branches: bool
+    ) -> FileAnalysisDict | None:
+        """Returns the cached analysis of a file, None if it or the lines the run hit changed."""
+        analysis = self.files.get(file)
+        if (
+            analysis is None
+            or analysis["hash"] != self.get_hash(file)
+            or analysis["hits"] != self.get_hits(cov, file, include_branches=include_branches)
+        ):
+            return None
+        return analysis
+
+    def add(self, file: str, analysis: FileAnalysisDict) -> None:
+        self.files[file] = self.analyzed[file] = analysis
+
+    def analyze(self, cov: coverage.Coverage, file: str, *, include_branches: bool) -> FileCoverage:
+        """Returns the coverage of a measured file, analyzing it only if it is not cached.
+
+        Raises what `analysis2` raises for files that cannot be analyzed.
+        """
+        source_hash = self.get_hash(file)
+        if cov.get_data().file_tracer(file) or source_hash is None:
+            return analyze_with_coverage(cov, file, include_branches=include_branches)
+        analysis = self.get_cached(cov, file, include_branches=include_branches)
+        if analysis is not None:
+            return FileCoverage(
+                set(analysis["lines_covered"]),
+                set(analysis["lines_missed"]),
+                analysis["executed_branches"],
+                analysis["total_branches"],
+            )
+        file_coverage = analyze_with_coverage(cov, file, include_branches=include_branches)
+        self.add(
+            file,
+            {
+                "hash": source_hash,
+                "hits": self.get_hits(cov, file, include_branches=include_branches),
+                "lines_covered": sorted(file_coverage.lines_covered),
+                "lines_missed": sorted(file_coverage.lines_missed),
+                "executed_branches": file_coverage.executed_branches,
+                "total_branches": file_coverage.total_branches,
+            },
+        )
+        return file_coverage
@@ -0,0 +1,96 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Line numbers of the classes and functions of test modules, shared by the test adapters.
+
+`inspect.getsourcelines` reads and tokenizes the source block of each object it is called on,
+which makes the discovery of large test classes slow. Instead each file is parsed once into an
+index of the definitions it contains, keyed by their qualified name, so the line of a class or
+function is a dictionary lookup.
+
+Objects that are not in the index, like tests generated at runtime, return None so the caller
+can fall back to `inspect`.
+"""
+
+from __future__ import annotations
+
+import ast
+import inspect
+import sys
+import tokenize
+from typing import Tuple
+
+# The line of the `def` or `class` statement and the line the definition starts on, which is the
+# line of its first decorator if it has any.
+DefinitionLines = Tuple[int, int]
+
+_indexes: dict[str, dict[str, DefinitionLines]] = {}
+
+
+def clear() -> None:
+    """Drops the indexes, for files that may have changed since they were parsed."""
+    _indexes.clear()
+
+
+def build_index(source: str) -> dict[str, DefinitionLines]:
+    """Returns the lines of each class and function in the source, keyed by qualified name.
+
+    The qualified names match `__qualname__`, including the `<locals>` part of definitions
+    nested in functions. A name that is defined more than once keeps its last definition,
+    which is the one that exists at runtime.
+    """
+    index: dict[str, DefinitionLines] = {}
+    nodes: list[tuple[str, ast.AST]] = [("", node) for node in ast.parse(source).body]
+    while nodes:
+        prefix, node = nodes.pop()
+        if not isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            # Definitions in `if` and `try` blocks, like version checks, are still indexed.
+            nodes.extend(
+                (prefix, child)
+                for child in ast.iter_child_nodes(node)
+                if isinstance(child, (ast.stmt, ast.excepthandler))
+            )
+            continue
+        qualname = prefix + node.name
+        start_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        previous = index.get(qualname)
+        if previous is None or previous[0] < node.lineno:
+            index[qualname] = (node.lineno, start_line)
+        child_prefix = qualname + ("." if isinstance(node, ast.ClassDef) else ".<locals>.")
+        nodes.extend((child_prefix, child) for child in node.body)
+    return index
+
+
+def get_index(filename: str) -> dict[str, DefinitionLines]:
+    """Returns the index of a file, parsing it the first time. Unreadable files have no entries."""
+    index = _indexes.get(filename)
+    if index is None:
+        try:
+            with tokenize.open(filename) as f:
+                index = build_index(f.read())
+        except (OSError, SyntaxError, ValueError):
+            index = {}
+        _indexes[filename] = index
+    return index
+
+
+def get_definition_lines(obj) -> DefinitionLines | None:
+    """Returns the lines of the definition of a class or function, None if it is not indexed.
+
+    Keyword arguments:
+    obj -- a class, a function or a bound method.
+    """
+    obj = getattr(obj, "__func__", obj)
+    try:
+        obj = inspect.unwrap(obj)
+    except ValueError:
+        return None
+    if isinstance(obj, type):
+        module = sys.modules.get(obj.__module__)
+        filename = getattr(module, "__file__", None)
+    else:
+        code = getattr(obj, "__code__", None)
+        filename = getattr(code, "co_filename", None)
+    qualname = getattr(obj, "__qualname__", None)
+    if not filename or not isinstance(qualname, str):
+        return None
+    return get_index(filename).get(qualname)
@@ -0,0 +1,115 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Writes messages to the extension's named pipe, shared by the test adapters.
+
+Messages can be written from a background thread, so tests do not wait for the extension to read
+the results of the previous ones.
+"""
+
+from __future__ import annotations
+
+import collections
+import sys
+import threading
+from typing import BinaryIO, Literal
+
+WRITE_SIZE = 4096
+# The largest size of a queued message that the "coalesce" policy appends other messages to.
+MAX_COALESCED_BYTES = 1024 * 1024
+
+
+def write_message(writer: BinaryIO, encoded: bytes | bytearray) -> None:
+    """Writes an encoded message to the pipe, in segments of at most WRITE_SIZE bytes."""
+    bytes_written = 0
+    while bytes_written < len(encoded):
+        segment = encoded[bytes_written : bytes_written + WRITE_SIZE]
+        bytes_written += writer.write(segment)
+        writer.flush()
+
+
+class PipeWriterThread:
+    """Writes messages to the pipe from a dedicated thread, so tests do not wait for the reader.
+
+    At most `max_queued` messages wait to be written. When the queue is full the "block" policy
+    waits for the writer thread to catch up, while the "coalesce" policy appends the message to
+    the last queued one so both are written together, as long as it stays under
+    `max_coalesced_bytes`. Beyond that the "coalesce" policy waits too.
+
+    Keyword arguments:
+    writer -- the pipe to write the messages to.
+    max_queued -- the largest number of messages waiting to be written.
+    policy -- what to do when the queue is full, "block" or "coalesce".
+    name -- the name of the adapter, for the thread name and error messages.
+    max_coalesced_bytes -- the largest size of a coalesced message.
+    """
+
+    def __init__(
+        self,
+        writer: BinaryIO,
+        max_queued: int,
+        policy: Literal["block", "coalesce"],
+        name: str,
+        max_coalesced_bytes: int = MAX_COALESCED_BYTES,
+    ):
+        self.writer = writer
+        self.max_queued = max(max_queued, 1)
+        self.policy = policy
+        self.name = name
+        self.max_coalesced_bytes = max_coalesced_bytes
+        self.queue: collections.deque[bytearray] = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self.thread.start()
+
+    def send(self, encoded: bytes) -> None:
+        """Queues an encoded message.
+
+        Once the thread is closed, the message is written directly after the queued ones.
+        """
+        with self.condition:
+            if not self.closed:
+                self._enqueue(encoded)
+                return
+        # Wait for the thread to write the queued messages, so this one is not written before them
+        # or in the middle of one of them.
+        self.thread.join()
+        with self.condition:
+            write_message(self.writer, encoded)
+
+    def close(self) -> None:
+        """Waits for all of the queued messages to be written and stops the thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _enqueue(self, encoded: bytes) -> None:
+        """Adds a message to the queue, the condition must be held."""
+        while len(self.queue) >= self.max_queued and self.thread.is_alive():
+            if (
+                self.policy == "coalesce"
+                and len(self.queue[-1]) + len(encoded) <= self.max_coalesced_bytes
+            ):
+                self.queue[-1].extend(encoded)
+                return
+            self.condition.wait()
+        self.queue.append(bytearray(encoded))
+        self.condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                encoded = self.queue.popleft()
+                self.condition.notify_all()
+            try:
+                write_message(self.writer, encoded)
+            except Exception as error:
+                print(
+                    f"Exception thrown while attempting to send data[{self.name}]: {error}",
+                    file=sys.stderr,
+                )
@@ -9,6 +9,8 @@ import json
 import os
 import pathlib
 import sys
+import threading
+import time
 import traceback
 from typing import (
     TYPE_CHECKING,
@@ -24,6 +26,60 @@ from typing import (
 import pytest
 from typing_extensions import NotRequired
 
+import vscode_line_index
+from vscode_pipe_writer import PipeWriterThread, write_message
+
+from ._collection_timing import TIMING_ENV, CollectionTimingDict, CollectionTimingPlugin
+from ._compact_encoding import ENCODING_ENV, ENCODING_V2, encode_payload
+from ._coverage_analysis import CACHE_DIR, FileCoverageInfo, iter_coverage
+from ._coverage_encoding import (
+    COVERAGE_ENCODING_ENV,
+    ENCODING_RANGES,
+    RangesFileCoverageDict,
+    iter_encoded_chunks,
+)
+from ._discovery_cache import (
+    CachedFileDict,
+    DiscoveryCachePlugin,
+    FileFingerprinter,
+    get_session_key,
+    load_discovery_cache,
+    load_discovery_payload,
+    new_cache_id,
+    save_discovery_cache,
+    save_discovery_payload,
+)
+from ._discovery_pages import get_threshold, new_pages_dir, page_large_functions
+from ._fixture_profiling import FIXTURE_PROFILE_ENV, FixtureProfileDict, FixtureProfilerPlugin
+from ._parallel_discovery import (
+    EXPORT_ENV,
+    PARTITION_ENV,
+    PartitionPlugin,
+    WorkerExportDict,
+    count_tests,
+    merge_file_nodes,
+    parse_partition,
+    run_workers,
+    write_export,
+)
+from ._pytest_compat import get_cache_dir, get_fs_path
+from ._selection import SelectionPlugin
+from ._sharding import get_shard_count
+from ._test_impact import IMPACT_ENV, ImpactContextPlugin, update_index
+from ._tracing import TRACE_ENV, Tracer, TracingPlugin
+from ._xdist_scheduling import get_absolute_node_id, make_scheduler
+from .duration_history import (
+    HISTORY_DIR,
+    HISTORY_FILE,
+    TestRunRecord,
+    append_history,
+    get_expected_duration,
+    get_history_order,
+    get_records_by_test,
+    percentile,
+    read_history,
+)
+
 if TYPE_CHECKING:
     from pluggy import Result
 
@@ -75,10 +131,59 @@ class VSCodePytestError(Exception):
 ERRORS = []
 IS_DISCOVERY = False
 map_id_to_path = {}
-collected_tests_so_far = []
+# The ids of the tests whose result was sent, each test is reported once.
+collected_tests_so_far: set[str] = set()
 TEST_RUN_PIPE = os.getenv("TEST_RUN_PIPE")
+# Messages are written from a background thread when the policy is "block" or "coalesce".
+TEST_RUN_PIPE_WRITER = os.getenv("TEST_RUN_PIPE_WRITER")
+TEST_RUN_PIPE_QUEUE_SIZE = os.getenv("TEST_RUN_PIPE_QUEUE_SIZE", "1024")
 SYMLINK_PATH = None
 INCLUDE_BRANCHES = False
+# Streaming discovery sends each test file's subtree as soon as the file is collected.
+STREAM_DISCOVERY = False
+streamed_items_by_file: dict[str, list[pytest.Item]] = {}
+deselected_test_ids: list[str] = []
+# Cached discovery only sends the files that changed since the discovery the extension has.
+CACHE_DISCOVERY = False
+discovery_cache_plugin: DiscoveryCachePlugin | None = None
+# Execution results are coalesced into batches unless they are sent one test at a time.
+RESULT_BATCH_MAX_BYTES = 256 * 1024
+RESULT_BATCH_MAX_DELAY = 0.05
+result_batcher: ExecutionResultBatcher | None = None
+# The durations and outcomes of the tests that ran are added to the workspace's duration history,
+# when the user enables it.
+RECORD_DURATION_HISTORY = os.getenv("TEST_DURATION_HISTORY_ENABLED") == "True"
+# Previously failed tests run first, and the longest tests first on pytest-xdist workers.
+ORDER_BY_HISTORY = os.getenv("TEST_ORDER_BY_HISTORY") == "True"
+# With pytest-xdist's loadscope or loadfile distribution, the longest work units are sent first.
+BALANCE_BY_HISTORY = os.getenv("TEST_BALANCE_BY_HISTORY") == "True"
+# Each file of the requested tests is collected once and the tests that were not requested are
+# deselected, instead of pytest resolving each test id argument.
+SELECT_BY_FILE = os.getenv("TEST_RUN_SELECT_BY_FILE") == "True"
+selection_plugin: SelectionPlugin | None = None
+running_test_records: dict[str, TestRunRecord] = {}
+duration_history_records: list[TestRunRecord] = []
+# Fingerprinted discovery replays the previous payload if no test file, conftest or config changed.
+discovery_fingerprint: str | None = None
+discovery_file_hashes: dict[str, list[Any]] = {}
+replayed_discovery_payload: dict[str, Any] | None = None
+# Parallel discovery collects the test files in worker processes, which export their subtrees.
+DISCOVERY_WORKERS = get_shard_count(os.getenv("TEST_DISCOVERY_WORKERS"))
+DISCOVERY_EXPORT_PATH = os.getenv(EXPORT_ENV)
+parallel_discovery_file_nodes: dict[str, TestNode] | None = None
+# Discovery trees are sent with a table of their paths when the extension can decode it.
+COMPACT_DISCOVERY = os.getenv(ENCODING_ENV) == ENCODING_V2
+# Parametrized functions with more cases than the threshold are sent without their cases, which
+# the extension loads from pages in pytest's cache when the function is expanded.
+LAZY_PARAMETRIZE_THRESHOLD = get_threshold(os.getenv("DISCOVERY_LAZY_PARAMETRIZE_THRESHOLD"))
+# The time spent in each phase and on each message is recorded and written as a trace.
+tracer = Tracer() if os.getenv(TRACE_ENV) == "True" else None
+# The slowest test modules and conftests of a discovery are sent with its payload.
+collection_timing_plugin: CollectionTimingPlugin | None = None
+# The setups and teardowns of the fixtures of a run are profiled and sent when it finishes.
+fixture_profiler: FixtureProfilerPlugin | None = None
+# The coverage of each test is recorded in the test impact index when the run finishes.
+impact_context_plugin: ImpactContextPlugin | None = None
 
 
 def pytest_load_initial_conftests(early_config, parser, args):  # noqa: ARG001
@@ -102,9 +207,66 @@ def pytest_load_initial_conftests(early_config, parser, args):  # noqa: ARG001
     )
     if not TEST_RUN_PIPE:
         print(error_string, file=sys.stderr)
+    if tracer is not None:
+        early_config.pluginmanager.register(TracingPlugin(tracer), name="vscode_tracing")
     if "--collect-only" in args:
         global IS_DISCOVERY
         IS_DISCOVERY = True
+        if os.environ.get(TIMING_ENV) == "True":
+            global collection_timing_plugin
+            collection_timing_plugin = CollectionTimingPlugin()
+            early_config.pluginmanager.register(
+                collection_timing_plugin, name="vscode_collection_timing"
+            )
+        partition = parse_partition(os.environ.get(PARTITION_ENV))
+        if partition is not None:
+            early_config.pluginmanager.register(
+                PartitionPlugin(*partition), name="vscode_discovery_partition"
+            )
+        if os.environ.get("DISCOVERY_STREAMING_ENABLED") == "True":
+            global STREAM_DISCOVERY
+            STREAM_DISCOVERY = True
+        elif os.environ.get("DISCOVERY_CACHE_ENABLED") == "True":
+            global CACHE_DISCOVERY
+            CACHE_DISCOVERY = True
+        elif os.environ.get("DISCOVERY_FINGERPRINT_ENABLED") == "True":
+            global discovery_fingerprint, discovery_file_hashes, replayed_discovery_payload
+            discovery_fingerprint, discovery_file_hashes, replayed_discovery_payload = (
+                load_discovery_payload(early_config, args)
+            )
+            if replayed_discovery_payload is not None:
+                # Nothing is collected, so conftest files do not need to be imported either.
+                early_config.known_args_namespace.noconftest = True
+    elif os.environ.get("TEST_RESULT_BATCHING_ENABLED") == "True":
+        global result_batcher
+        max_bytes, max_delay = RESULT_BATCH_MAX_BYTES, RESULT_BATCH_MAX_DELAY
+        try:
+            max_bytes = int(os.environ.get("TEST_RESULT_BATCH_MAX_BYTES", max_bytes))
+            max_delay = float(os.environ.get("TEST_RESULT_BATCH_MAX_DELAY_MS", max_delay * 1000))
+            max_delay /= 1000
+        except ValueError as e:
+            print(f"Plugin warning[vscode-pytest]: Invalid result batch setting, ignoring it: {e}")
+        result_batcher = ExecutionResultBatcher(max_bytes, max_delay)
+    if not IS_DISCOVERY and os.environ.get(FIXTURE_PROFILE_ENV) == "True":
+        global fixture_profiler
+        fixture_profiler = FixtureProfilerPlugin()
+        early_config.pluginmanager.register(fixture_profiler, name="vscode_fixture_profiler")
+    if (
+        not IS_DISCOVERY
+        and os.environ.get(IMPACT_ENV) == "True"
+        and os.environ.get("COVERAGE_ENABLED") == "True"
+    ):
+        if any(arg.startswith("--cov-context") for arg in args):
+            print(
+                "Plugin warning[vscode-pytest]: The test impact index is not recorded with "
+                "--cov-context, which sets the coverage contexts of the tests itself."
+            )
+        else:
+            global impact_context_plugin
+            impact_context_plugin = ImpactContextPlugin(
+                lambda item: get_absolute_test_id(item.nodeid, get_node_path(item))
+            )
+            early_config.pluginmanager.register(impact_context_plugin, name="vscode_test_impact")
 
     # check if --rootdir is in the args
     for arg in args:
@@ -170,21 +332,15 @@ def pytest_exception_interact(node, call, report):
             report_value = "failure"
         node_id = get_absolute_test_id(node.nodeid, get_node_path(node))
         if node_id not in collected_tests_so_far:
-            collected_tests_so_far.append(node_id)
+            collected_tests_so_far.add(node_id)
             item_result = create_test_outcome(
                 node_id,
                 report_value,
                 "Test failed with exception",
                 report.longreprtext,
             )
-            collected_test = TestRunResultDict()
-            collected_test[node_id] = item_result
-            cwd = pathlib.Path.cwd()
-            send_execution_message(
-                os.fsdecode(cwd),
-                "success",
-                collected_test if collected_test else None,
-            )
+            cwd = node_path_resolver.get_cwd()
+            send_test_result(os.fsdecode(cwd), node_id, item_result)
 
 
 def has_symlink_parent(current_path):
@@ -226,6 +382,143 @@ def pytest_keyboard_interrupt(excinfo):
     """
     # The function execonly() returns the exception as a string.
     ERRORS.append(excinfo.exconly() + "\n Check Python Logs for more details.")
+    if result_batcher is not None:
+        result_batcher.flush()
+
+
+def pytest_sessionstart(session):
+    """A pytest hook that is called after the session is created and before collection starts.
+
+    During cached discovery, if the extension has the tree of the cached discovery, the files
+    that have not changed since are not collected again. When selecting by file during
+    execution, the requested test ids are read from the RUN_TEST_IDS_PIPE file.
+
+    Keyword arguments:
+    session -- the pytest session object.
+    """
+    node_path_resolver.clear()
+    vscode_line_index.clear()
+    if SELECT_BY_FILE and not IS_DISCOVERY:
+        register_selection_plugin(session.config)
+    if not CACHE_DISCOVERY:
+        return
+    cwd = SYMLINK_PATH if SYMLINK_PATH else pathlib.Path.cwd()
+    cache = load_discovery_cache(session.config, get_session_key(session.config, cwd))
+    if cache is not None and cache["cache_id"] == os.environ.get("DISCOVERY_CACHE_ID"):
+        global discovery_cache_plugin
+        discovery_cache_plugin = DiscoveryCachePlugin(
+            cache["files"], FileFingerprinter(session.config.rootpath)
+        )
+        session.config.pluginmanager.register(discovery_cache_plugin, name="vscode_discovery_cache")
+
+
+def register_selection_plugin(config: pytest.Config) -> None:
+    """Registers the plugin that deselects the tests that were not requested."""
+    ids_path = os.environ.get("RUN_TEST_IDS_PIPE")
+    if not ids_path:
+        return
+    try:
+        test_ids = pathlib.Path(ids_path).read_text(encoding="utf-8").splitlines()
+    except OSError as e:
+        print(f"Plugin warning[vscode-pytest]: Unable to read the requested test ids: {e}")
+        return
+    global selection_plugin
+    selection_plugin = SelectionPlugin(
+        [test_id for test_id in test_ids if test_id],
+        lambda item: get_absolute_test_id(item.nodeid, get_node_path(item)),
+    )
+    config.pluginmanager.register(selection_plugin, name="vscode_selection")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection(session):
+    """A pytest hook that performs the collection of the session.
+
+    Collection is skipped when the previous discovery payload is replayed. During parallel
+    discovery the worker processes collect the tests instead.
+
+    Keyword arguments:
+    session -- the pytest session object.
+    """
+    if replayed_discovery_payload is not None:
+        return True
+    if (
+        IS_DISCOVERY
+        and DISCOVERY_WORKERS > 1
+        and not (STREAM_DISCOVERY or CACHE_DISCOVERY or DISCOVERY_EXPORT_PATH)
+    ):
+        collect_in_workers(session)
+        return True
+    return None
+
+
+def collect_in_workers(session: pytest.Session) -> None:
+    """Collects the tests of the session in worker processes and merges their file subtrees.
+
+    Like a regular collection, the session is interrupted if a worker had collection errors.
+
+    Keyword arguments:
+    session -- the pytest session object.
+    """
+    global parallel_discovery_file_nodes
+    config = session.config
+    exports = run_workers(
+        list(config.invocation_params.args), config.invocation_params.dir, DISCOVERY_WORKERS
+    )
+    for export in exports:
+        ERRORS.extend(export["errors"])
+    parallel_discovery_file_nodes = merge_file_nodes(exports)
+    session.testscollected = sum(
+        count_tests(file_node) for file_node in parallel_discovery_file_nodes.values()
+    )
+    failed_workers = [export for export in exports if export["exitstatus"] not in (0, 5)]
+    if failed_workers and not config.option.continue_on_collection_errors:
+        raise session.Interrupted(
+            f"{len(failed_workers)} of {len(exports)} discovery workers failed to collect tests"
+        )
+
+
+def pytest_itemcollected(item):
+    """A pytest hook that is called when a test item is collected.
+
+    During streaming discovery the item is held, grouped by its file, until the file has
+    finished collecting.
+
+    Keyword arguments:
+    item -- the pytest item object.
+    """
+    if STREAM_DISCOVERY:
+        file_node = item.getparent(pytest.File)
+        file_node_id = file_node.nodeid if file_node is not None else ""
+        streamed_items_by_file.setdefault(file_node_id, []).append(item)
+
+
+def pytest_collectreport(report):
+    """A pytest hook that is called when a collector has finished collecting.
+
+    Pytest reports a file only after all of its items have been collected, so during
+    streaming discovery this is where the file's subtree is sent to the extension.
+
+    Keyword arguments:
+    report -- the collect report of type CollectReport.
+    """
+    if STREAM_DISCOVERY and report.nodeid in streamed_items_by_file:
+        send_discovery_stream_message(streamed_items_by_file.pop(report.nodeid))
+
+
+def pytest_deselected(items):
+    """A pytest hook that is called when test items are deselected, for example by `-k`.
+
+    Streaming discovery has already sent these items, so they are recorded and sent with the
+    final message for the extension to remove.
+
+    Keyword arguments:
+    items -- the list of deselected pytest items.
+    """
+    if STREAM_DISCOVERY:
+        deselected_test_ids.extend(
+            get_absolute_test_id(item.nodeid, get_node_path(item)) for item in items
+        )
 
 
 class TestOutcome(Dict):
@@ -239,6 +532,7 @@ class TestOutcome(Dict):
     message: str | None
     traceback: str | None
     subtest: str | None
+    duration: float | None  # In seconds, only set when known.
 
 
 def create_test_outcome(
@@ -247,15 +541,19 @@ def create_test_outcome(
     message: str | None,
     traceback: str | None,
     subtype: str | None = None,  # noqa: ARG001
+    duration: float | None = None,
 ) -> TestOutcome:
     """A function that creates a TestOutcome object."""
-    return TestOutcome(
+    test_outcome = TestOutcome(
         test=testid,
         outcome=outcome,
         message=message,
         traceback=traceback,  # TODO: traceback
         subtest=None,
     )
+    if duration is not None:
+        test_outcome["duration"] = duration
+    return test_outcome
 
 
 class TestRunResultDict(Dict[str, Dict[str, TestOutcome]]):
@@ -275,9 +573,7 @@ def pytest_report_teststatus(report, config):  # noqa: ARG001
     report -- the report on the test setup, call, and teardown.
     config -- configuration object.
     """
-    cwd = pathlib.Path.cwd()
-    if SYMLINK_PATH:
-        cwd = SYMLINK_PATH
+    cwd = SYMLINK_PATH or node_path_resolver.get_cwd()
 
     if report.when == "call" or (report.when == "setup" and report.skipped):
         traceback = None
@@ -295,23 +591,89 @@ def pytest_report_teststatus(report, config):  # noqa: ARG001
         # Calculate the absolute test id and use this as the ID moving forward.
         absolute_node_id = get_absolute_test_id(report.nodeid, node_path)
         if absolute_node_id not in collected_tests_so_far:
-            collected_tests_so_far.append(absolute_node_id)
+            collected_tests_so_far.add(absolute_node_id)
+            # The duration of the test includes its setup, its teardown has not run yet.
+            duration = report.duration
+            if report.when == "call" and report.nodeid in running_test_records:
+                duration += running_test_records[report.nodeid]["setup"]
             item_result = create_test_outcome(
                 absolute_node_id,
                 report_value,
                 message,
                 traceback,
+                duration=duration,
             )
-            collected_test = TestRunResultDict()
-            collected_test[absolute_node_id] = item_result
-            send_execution_message(
-                os.fsdecode(cwd),
-                "success",
-                collected_test if collected_test else None,
-            )
+            send_test_result(os.fsdecode(cwd), absolute_node_id, item_result)
     yield
 
 
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):  # noqa: ARG001
+    """A pytest hook that is called after the tests to run are selected.
+
+    When ordering by history, the tests are reordered using the outcomes and durations of their
+    previous runs. Each pytest-xdist worker collects and reorders the same tests, from the same
+    history, so the order is consistent across workers.
+
+    Keyword arguments:
+    session -- the pytest session object.
+    config -- the pytest config object.
+    items -- the selected test items, reordered in place.
+    """
+    if IS_DISCOVERY or not ORDER_BY_HISTORY or not items:
+        return
+    # pytest's own --failed-first and --new-first options take precedence.
+    if any(config.getoption(name, default=False) for name in ("failedfirst", "newfirst")):
+        return
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return
+    history_path = get_cache_dir(cache, HISTORY_DIR) / HISTORY_FILE
+    records_by_test = get_records_by_test(read_history(history_path))
+    if not records_by_test:
+        return
+    test_ids = [get_absolute_test_id(item.nodeid, get_node_path(item)) for item in items]
+    order = get_history_order(
+        test_ids, records_by_test, longest_first=hasattr(config, "workerinput")
+    )
+    items[:] = [items[index] for index in order]
+
+
+def pytest_runtest_logreport(report):
+    """A pytest hook that is called with the setup, call and teardown reports of each test.
+
+    The durations of the phases are recorded, the test is added to the records of the duration
+    history once its teardown finishes.
+
+    Keyword arguments:
+    report -- the report on the test setup, call, or teardown.
+    """
+    if IS_DISCOVERY:
+        return
+    record = running_test_records.get(report.nodeid)
+    if record is None:
+        cwd = SYMLINK_PATH or node_path_resolver.get_cwd()
+        node_path = map_id_to_path.get(report.nodeid, cwd)
+        record = TestRunRecord(
+            test=get_absolute_test_id(report.nodeid, node_path),
+            outcome="passed",
+            setup=0.0,
+            call=0.0,
+            teardown=0.0,
+            time=0.0,
+        )
+        running_test_records[report.nodeid] = record
+    if report.when in ("setup", "call", "teardown"):
+        record[report.when] = report.duration
+    if report.failed:
+        record["outcome"] = "failed"
+    elif report.skipped and record["outcome"] == "passed":
+        record["outcome"] = "skipped"
+    if report.when == "teardown":
+        record["time"] = time.time()
+        duration_history_records.append(running_test_records.pop(report.nodeid))
+
+
 ERROR_MESSAGE_CONST = {
     2: "Pytest was unable to start or run any tests due to issues with test discovery or test collection.",
     3: "Pytest was interrupted by the user, for example by pressing Ctrl+C during test execution.",
@@ -322,27 +684,21 @@ ERROR_MESSAGE_CONST = {
 
 @pytest.hookimpl(hookwrapper=True, trylast=True)
 def pytest_runtest_protocol(item, nextitem):  # noqa: ARG001
-    map_id_to_path[item.nodeid] = get_node_path(item)
+    node_path = map_id_to_path[item.nodeid] = get_node_path(item)
     skipped = check_skipped_wrapper(item)
     if skipped:
-        absolute_node_id = get_absolute_test_id(item.nodeid, get_node_path(item))
+        absolute_node_id = get_absolute_test_id(item.nodeid, node_path)
         report_value = "skipped"
-        cwd = pathlib.Path.cwd()
+        cwd = node_path_resolver.get_cwd()
         if absolute_node_id not in collected_tests_so_far:
-            collected_tests_so_far.append(absolute_node_id)
+            collected_tests_so_far.add(absolute_node_id)
             item_result = create_test_outcome(
                 absolute_node_id,
                 report_value,
                 None,
                 None,
             )
-            collected_test = TestRunResultDict()
-            collected_test[absolute_node_id] = item_result
-            send_execution_message(
-                os.fsdecode(cwd),
-                "success",
-                collected_test if collected_test else None,
-            )
+            send_test_result(os.fsdecode(cwd), absolute_node_id, item_result)
     yield
 
 
@@ -381,13 +737,6 @@ def check_skipped_condition(item):
     return False
 
 
-class FileCoverageInfo(TypedDict):
-    lines_covered: list[int]
-    lines_missed: list[int]
-    executed_branches: int
-    total_branches: int
-
-
 def pytest_sessionfinish(session, exitstatus):
     """A pytest hook that is called after pytest has fulled finished.
 
@@ -402,12 +751,33 @@ def pytest_sessionfinish(session, exitstatus):
     Exit code 4: pytest command line usage error
     Exit code 5: No tests were collected
     """
+    if IS_DISCOVERY and DISCOVERY_EXPORT_PATH:
+        # A parallel discovery worker exports its tests to the coordinator, which sends them.
+        export: WorkerExportDict = {
+            "files": list(build_file_nodes(session.items).values()),
+            "errors": ERRORS,
+            "exitstatus": int(exitstatus),
+        }
+        write_export(DISCOVERY_EXPORT_PATH, export, PathEncoder)
+        return
     cwd = pathlib.Path.cwd()
     if SYMLINK_PATH:
         print("Plugin warning[vscode-pytest]: SYMLINK set, adjusting cwd.")
         cwd = pathlib.Path(SYMLINK_PATH)
 
-    if IS_DISCOVERY:
+    if IS_DISCOVERY and replayed_discovery_payload is not None:
+        send_discovery_payload(cast("DiscoveryPayloadDict", replayed_discovery_payload))
+    elif IS_DISCOVERY and STREAM_DISCOVERY:
+        # Send any items that were not reported as part of a collected file.
+        for items in list(streamed_items_by_file.values()):
+            send_discovery_stream_message(items)
+        streamed_items_by_file.clear()
+        if not (exitstatus == 0 or exitstatus == 1 or exitstatus == 5):
+            ERRORS.append(
+                f"Pytest exited with error status: {exitstatus}, {ERROR_MESSAGE_CONST.get(exitstatus, '')}"
+            )
+        send_discovery_complete_message(os.fsdecode(cwd))
+    elif IS_DISCOVERY:
         if not (exitstatus == 0 or exitstatus == 1 or exitstatus == 5):
             error_node: TestNode = {
                 "name": "",
@@ -418,13 +788,39 @@ def pytest_sessionfinish(session, exitstatus):
             }
             send_discovery_message(os.fsdecode(cwd), error_node)
         try:
-            session_node: TestNode | None = build_test_tree(session)
+            with trace_span("build_test_tree"):
+                if parallel_discovery_file_nodes is not None:
+                    session_node = build_session_tree(session, parallel_discovery_file_nodes)
+                else:
+                    session_node = build_test_tree(session)
             if not session_node:
                 raise VSCodePytestError(
                     "Something went wrong following pytest finish, \
                         no session node was created"
                 )
-            send_discovery_message(os.fsdecode(cwd), session_node)
+            if CACHE_DISCOVERY and exitstatus in (0, 1, 5):
+                send_cached_discovery_message(session, cwd, session_node)
+            else:
+                paged = 0
+                if LAZY_PARAMETRIZE_THRESHOLD:
+                    with trace_span("write_pages"):
+                        paged = send_large_functions_as_pages(session.config, session_node)
+                discovery_payload = send_discovery_message(os.fsdecode(cwd), session_node)
+                # Payloads with errors are not replayed, the fix may be in a file that is not
+                # part of the fingerprint. Neither are payloads with pages, which the next
+                # discovery removes.
+                if (
+                    discovery_fingerprint is not None
+                    and not ERRORS
+                    and exitstatus in (0, 5)
+                    and not paged
+                ):
+                    save_discovery_payload(
+                        session.config,
+                        discovery_fingerprint,
+                        discovery_file_hashes,
+                        json.loads(json.dumps(discovery_payload, cls=PathEncoder)),
+                    )
         except Exception as e:
             ERRORS.append(
                 f"Error Occurred, traceback: {(traceback.format_exc() if e.__traceback__ else '')}"
@@ -438,6 +834,29 @@ def pytest_sessionfinish(session, exitstatus):
             }
             send_discovery_message(os.fsdecode(cwd), error_node)
     else:
+        if result_batcher is not None:
+            result_batcher.flush()
+        # Workers of pytest-xdist report their tests to the main process, which records them.
+        cache = getattr(session.config, "cache", None)
+        is_worker = hasattr(session.config, "workerinput")
+        if RECORD_DURATION_HISTORY and cache is not None and not is_worker:
+            try:
+                append_history(
+                    get_cache_dir(cache, HISTORY_DIR) / HISTORY_FILE, duration_history_records
+                )
+            except OSError as e:
+                print(f"Plugin warning[vscode-pytest]: Unable to save the duration history: {e}")
+        # Each pytest-xdist worker selects the same tests, only the first one reports the rest.
+        is_first_worker = not is_worker or session.config.workerinput.get("workerid") == "gw0"
+        if selection_plugin is not None and selection_plugin.not_found and is_first_worker:
+            send_execution_message(
+                os.fsdecode(cwd), "success", None, not_found=selection_plugin.not_found
+            )
+        # With pytest-xdist the fixtures are set up in the workers, which each send a profile.
+        if fixture_profiler is not None and fixture_profiler.stats:
+            send_execution_message(
+                os.fsdecode(cwd), "success", None, fixture_profile=fixture_profiler.get_profile()
+            )
         if exitstatus == 0 or exitstatus == 1:
             exitstatus_bool = "success"
         else:
@@ -475,16 +894,10 @@ def pytest_sessionfinish(session, exitstatus):
             )
             INCLUDE_BRANCHES = False
 
-        try:
-            from coverage.exceptions import NoSource
-        except ImportError:
-            from coverage.misc import NoSource
-
         cov = coverage.Coverage()
         cov.load()
 
         file_set: set[str] = cov.get_data().measured_files()
-        file_coverage_map: dict[str, FileCoverageInfo] = {}
 
         # remove files omitted per coverage report config if any
         omit_files: list[str] | None = cov.config.report_omit
@@ -494,56 +907,44 @@ def pytest_sessionfinish(session, exitstatus):
                     if pathlib.Path(file).match(pattern):
                         file_set.remove(file)
 
-        for file in file_set:
-            try:
-                analysis = cov.analysis2(file)
-                taken_file_branches = 0
-                total_file_branches = -1
-
-                if INCLUDE_BRANCHES:
-                    branch_stats: dict[int, tuple[int, int]] = cov.branch_stats(file)
-                    total_file_branches = sum(
-                        [total_exits for total_exits, _ in branch_stats.values()]
-                    )
-                    taken_file_branches = sum(
-                        [taken_exits for _, taken_exits in branch_stats.values()]
-                    )
+        # Without the cache provider plugin every file is analyzed again.
+        cache = getattr(session.config, "cache", None)
+        cache_path = (
+            get_cache_dir(cache, CACHE_DIR) / "analysis.json" if cache is not None else None
+        )
+        files_coverage = iter_coverage(
+            cov, list(file_set), include_branches=INCLUDE_BRANCHES, cache_path=cache_path
+        )
 
-            except NoSource:
-                # as per issue 24308 this best way to handle this edge case
-                continue
-            except Exception as e:
-                print(
-                    f"Plugin error[vscode-pytest]: Skipping analysis of file: {file} due to error: {e}"
+        if os.environ.get(COVERAGE_ENCODING_ENV) == ENCODING_RANGES:
+            for chunk in iter_encoded_chunks(files_coverage):
+                send_message(
+                    CoveragePayloadDict(
+                        coverage=True,
+                        cwd=os.fspath(cwd),
+                        result=chunk,
+                        error=None,
+                        encoding=ENCODING_RANGES,
+                    )
                 )
-                continue
-            lines_executable = {int(line_no) for line_no in analysis[1]}
-            lines_missed = {int(line_no) for line_no in analysis[3]}
-            lines_covered = lines_executable - lines_missed
-            file_info: FileCoverageInfo = {
-                "lines_covered": list(lines_covered),  # list of int
-                "lines_missed": list(lines_missed),  # list of int
-                "executed_branches": taken_file_branches,
-                "total_branches": total_file_branches,
-            }
-            # convert relative path to absolute path
-            if not pathlib.Path(file).is_absolute():
-                file = str(pathlib.Path(file).resolve())
-            file_coverage_map[file] = file_info
-
-        payload: CoveragePayloadDict = CoveragePayloadDict(
-            coverage=True,
-            cwd=os.fspath(cwd),
-            result=file_coverage_map,
-            error=None,
-        )
-        send_message(payload)
+        else:
+            payload: CoveragePayloadDict = CoveragePayloadDict(
+                coverage=True,
+                cwd=os.fspath(cwd),
+                result=dict(files_coverage),
+                error=None,
+            )
+            send_message(payload)
+
+        if impact_context_plugin is not None:
+            update_index(session.config, cov)
 
 
 def construct_nested_folders(
     file_nodes_dict: dict[str, TestNode],
     session_node: TestNode,
     session_children_dict: dict[str, TestNode],
+    child_ids_by_node: dict[int, set[str]],
 ) -> dict[str, TestNode]:
     """Iterate through all files and construct them into nested folders.
 
@@ -551,6 +952,7 @@ def construct_nested_folders(
     file_nodes_dict -- Dictionary of all file nodes
     session_node -- The session node that will be parent to the folder structure
     session_children_dict -- Dictionary of session's children nodes indexed by ID
+    child_ids_by_node -- Index of the ids of each node's children, see add_child_node
 
     Returns:
     dict[str, TestNode] -- Updated session_children_dict with folder nodes added
@@ -561,7 +963,7 @@ def construct_nested_folders(
         root_folder_node: TestNode
         try:
             root_folder_node: TestNode = build_nested_folders(
-                file_node, created_files_folders_dict, session_node
+                file_node, created_files_folders_dict, session_node, child_ids_by_node
             )
         except ValueError:
             # This exception is raised when the session node is not a parent of the file node.
@@ -577,7 +979,7 @@ def construct_nested_folders(
             session_node["id_"] = common_parent  # str
             session_node["name"] = common_parent_path.name  # str
             root_folder_node = build_nested_folders(
-                file_node, created_files_folders_dict, session_node
+                file_node, created_files_folders_dict, session_node, child_ids_by_node
             )
         # The final folder we get to is the highest folder in the path
         # and therefore we add this as a child to the session.
@@ -593,6 +995,7 @@ def process_parameterized_test(
     test_node: TestItem,
     function_nodes_dict: dict[str, TestNode],
     file_nodes_dict: dict[str, TestNode],
+    child_ids_by_node: dict[int, set[str]],
 ) -> TestNode:
     """Process a parameterized test case and create appropriate function nodes.
 
@@ -601,6 +1004,7 @@ def process_parameterized_test(
     test_node -- the test node created from the test case
     function_nodes_dict -- dictionary of function nodes indexed by ID
     file_nodes_dict -- dictionary of file nodes indexed by path
+    child_ids_by_node -- index of the ids of each node's children, see add_child_node
 
     Returns:
     TestNode -- the node to use for further processing (function node or original test node)
@@ -619,7 +1023,8 @@ def process_parameterized_test(
 
     class_and_method = second_split[1] + "::"  # This has "::" separator at both ends
     # construct the parent id, so it is absolute path :: any class and method :: parent_part
-    parent_id = os.fspath(get_node_path(test_case)) + class_and_method + parent_part
+    test_path = test_node["path"]
+    parent_id = os.fspath(test_path) + class_and_method + parent_part
 
     try:
         function_name = test_case.originalname  # type: ignore
@@ -633,12 +1038,11 @@ def process_parameterized_test(
         ) from None
     except KeyError:
         function_test_node: TestNode = create_parameterized_function_node(
-            function_name, get_node_path(test_case), parent_id
+            function_name, test_path, parent_id
         )
         function_nodes_dict[parent_id] = function_test_node
 
-    if test_node not in function_test_node["children"]:
-        function_test_node["children"].append(test_node)
+    add_child_node(function_test_node, test_node, child_ids_by_node)
 
     # Check if the parent node of the function is file, if so create/add to this file node.
     if isinstance(test_case.parent, pytest.File):
@@ -649,39 +1053,68 @@ def process_parameterized_test(
         except KeyError:
             parent_test_case = create_file_node(parent_path)
             file_nodes_dict[os.fspath(parent_path)] = parent_test_case
-        if function_test_node not in parent_test_case["children"]:
-            parent_test_case["children"].append(function_test_node)
+        add_child_node(parent_test_case, function_test_node, child_ids_by_node)
 
     # Return the function node as the test node to handle subsequent nesting
     return function_test_node
 
 
-def build_test_tree(session: pytest.Session) -> TestNode:
+def build_test_tree(session: pytest.Session, items: list[pytest.Item] | None = None) -> TestNode:
     """Builds a tree made up of testing nodes from the pytest session.
 
     Keyword arguments:
     session -- the pytest session object that contains test items.
+    items -- the test items to build the tree from, defaults to all of the session's items.
 
     Returns:
     TestNode -- The root node of the constructed test tree.
     """
-    session_node = create_session_node(session)
-    session_children_dict: dict[str, TestNode] = {}
-    file_nodes_dict: dict[str, TestNode] = {}
-    class_nodes_dict: dict[str, TestNode] = {}
-    function_nodes_dict: dict[str, TestNode] = {}
+    file_nodes_dict = build_file_nodes(session.items if items is None else items)
+    return build_session_tree(session, file_nodes_dict)
+
+
+def build_session_tree(session: pytest.Session, file_nodes_dict: dict[str, TestNode]) -> TestNode:
+    """Nests the subtrees of the test files in folders under the session node.
+
+    Keyword arguments:
+    session -- the pytest session object.
+    file_nodes_dict -- the subtree of each test file, keyed by the path of the file.
 
+    Returns:
+    TestNode -- The root node of the constructed test tree.
+    """
+    session_node = create_session_node(session)
     # Check to see if the global variable for symlink path is set
     if SYMLINK_PATH:
         session_node["path"] = SYMLINK_PATH
         session_node["id_"] = os.fspath(SYMLINK_PATH)
 
-    for test_case in session.items:
+    # Process all files and construct them into nested folders
+    session_children_dict = construct_nested_folders(file_nodes_dict, session_node, {}, {})
+    session_node["children"] = list(session_children_dict.values())
+    return session_node
+
+
+def build_file_nodes(items: list[pytest.Item]) -> dict[str, TestNode]:
+    """Builds the subtree of each test file from the test items.
+
+    Keyword arguments:
+    items -- the test items to build the subtrees from.
+
+    Returns:
+    dict[str, TestNode] -- The node of each test file, keyed by the path of the file.
+    """
+    file_nodes_dict: dict[str, TestNode] = {}
+    class_nodes_dict: dict[str, TestNode] = {}
+    function_nodes_dict: dict[str, TestNode] = {}
+    child_ids_by_node: dict[int, set[str]] = {}
+
+    for test_case in items:
         test_node = create_test_node(test_case)
         if hasattr(test_case, "callspec"):  # This means it is a parameterized test.
             # Process parameterized test and get the function node to use for further processing
             test_node = process_parameterized_test(
-                test_case, test_node, function_nodes_dict, file_nodes_dict
+                test_case, test_node, function_nodes_dict, file_nodes_dict, child_ids_by_node
             )
         if isinstance(test_case.parent, pytest.Class) or (
             USES_PYTEST_DESCRIBE and isinstance(test_case.parent, DescribeBlock)
@@ -698,9 +1131,8 @@ def build_test_tree(session: pytest.Session) -> TestNode:
                 except KeyError:
                     test_class_node = create_class_node(case_iter)
                     class_nodes_dict[case_iter.nodeid] = test_class_node
-                # Check if the class already has the child node. This will occur if the test is parameterized.
-                if node_child_iter not in test_class_node["children"]:
-                    test_class_node["children"].append(node_child_iter)
+                # The class may already have the child node. This will occur if the test is parameterized.
+                add_child_node(test_class_node, node_child_iter, child_ids_by_node)
                 # Iterate up.
                 node_child_iter = test_class_node
                 case_iter = case_iter.parent
@@ -717,9 +1149,9 @@ def build_test_tree(session: pytest.Session) -> TestNode:
             except KeyError:
                 test_file_node = create_file_node(parent_path)
                 file_nodes_dict[os.fspath(parent_path)] = test_file_node
-            # Check if the class is already a child of the file node.
-            if test_class_node is not None and test_class_node not in test_file_node["children"]:
-                test_file_node["children"].append(test_class_node)
+            # The class may already be a child of the file node.
+            if test_class_node is not None:
+                add_child_node(test_file_node, test_class_node, child_ids_by_node)
         elif not hasattr(test_case, "callspec"):
             # This includes test cases that are pytest functions or a doctests.
             if test_case.parent is None:
@@ -737,18 +1169,14 @@ def build_test_tree(session: pytest.Session) -> TestNode:
                 parent_test_case = create_file_node(parent_path)
                 file_nodes_dict[os.fspath(parent_path)] = parent_test_case
             parent_test_case["children"].append(test_node)
-    # Process all files and construct them into nested folders
-    session_children_dict = construct_nested_folders(
-        file_nodes_dict, session_node, session_children_dict
-    )
-    session_node["children"] = list(session_children_dict.values())
-    return session_node
+    return file_nodes_dict
 
 
 def build_nested_folders(
     file_node: TestNode,
     created_files_folders_dict: dict[str, TestNode],
     session_node: TestNode,
+    child_ids_by_node: dict[int, set[str]],
 ) -> TestNode:
     """Takes a file or folder and builds the nested folder structure for it.
 
@@ -757,6 +1185,7 @@ def build_nested_folders(
     file_node -- the file node that we are building the nested folders for.
     created_files_folders_dict -- Dictionary of all the folders and files that have been created where the key is the path.
     session -- the pytest session object.
+    child_ids_by_node -- index of the ids of each node's children, see add_child_node.
     """
     # check if session node is a parent of the file node, throw error if not.
     session_node_path = session_node["path"]
@@ -781,8 +1210,7 @@ def build_nested_folders(
         except KeyError:
             curr_folder_node: TestNode = create_folder_node(curr_folder_name, iterator_path)
             created_files_folders_dict[os.fspath(iterator_path)] = curr_folder_node
-        if prev_folder_node not in curr_folder_node["children"]:
-            curr_folder_node["children"].append(prev_folder_node)
+        add_child_node(curr_folder_node, prev_folder_node, child_ids_by_node)
         iterator_path = iterator_path.parent
         prev_folder_node = curr_folder_node
         # Handles error where infinite loop occurs.
@@ -797,6 +1225,28 @@ def build_nested_folders(
     return prev_folder_node
 
 
+def add_child_node(
+    parent_node: TestNode,
+    child_node: TestNode | TestItem,
+    child_ids_by_node: dict[int, set[str]],
+) -> None:
+    """Adds a child to a node unless the node already has a child with the same id.
+
+    The ids of each node's children are kept in an index next to the tree, keyed by the id() of
+    the node, so checking for an existing child does not require scanning the children list.
+    The index is only used while the tree is being built and is never sent to the extension.
+
+    Keyword arguments:
+    parent_node -- the node to add the child to.
+    child_node -- the child node to add.
+    child_ids_by_node -- the index of child ids for each node.
+    """
+    child_ids = child_ids_by_node.setdefault(id(parent_node), set())
+    if child_node["id_"] not in child_ids:
+        child_ids.add(child_node["id_"])
+        parent_node["children"].append(child_node)
+
+
 def create_test_node(
     test_case: pytest.Item,
 ) -> TestItem:
@@ -808,10 +1258,11 @@ def create_test_node(
     test_case_loc: str = (
         str(test_case.location[1] + 1) if (test_case.location[1] is not None) else ""
     )
-    absolute_test_id = get_absolute_test_id(test_case.nodeid, get_node_path(test_case))
+    node_path = get_node_path(test_case)
+    absolute_test_id = get_absolute_test_id(test_case.nodeid, node_path)
     return {
         "name": test_case.name,
-        "path": get_node_path(test_case),
+        "path": node_path,
         "lineno": test_case_loc,
         "type_": "test",
         "id_": absolute_test_id,
@@ -843,22 +1294,32 @@ def create_class_node(class_module: pytest.Class | DescribeBlock) -> TestNode:
     """
     # Get line number for the class definition
     class_line = ""
-    try:
-        if hasattr(class_module, "obj"):
-            import inspect
+    lines = (
+        vscode_line_index.get_definition_lines(class_module.obj)
+        if hasattr(class_module, "obj")
+        else None
+    )
+    if lines is not None:
+        class_line = str(lines[1])
+    else:
+        # Classes created at runtime are not in the index of their module.
+        try:
+            if hasattr(class_module, "obj"):
+                import inspect
 
-            _, lineno = inspect.getsourcelines(class_module.obj)
-            class_line = str(lineno)
-    except (OSError, TypeError):
-        # If we can't get the source lines, leave lineno empty
-        pass
+                _, lineno = inspect.getsourcelines(class_module.obj)
+                class_line = str(lineno)
+        except (OSError, TypeError):
+            # If we can't get the source lines, leave lineno empty
+            pass
 
+    node_path = get_node_path(class_module)
     return {
         "name": class_module.name,
-        "path": get_node_path(class_module),
+        "path": node_path,
         "type_": "class",
         "children": [],
-        "id_": get_absolute_test_id(class_module.nodeid, get_node_path(class_module)),
+        "id_": get_absolute_test_id(class_module.nodeid, node_path),
         "lineno": class_line,
     }
 
@@ -921,6 +1382,21 @@ class DiscoveryPayloadDict(TypedDict):
     status: Literal["success", "error"]
     tests: TestNode | None
     error: list[str] | None
+    stream: NotRequired[Literal["partial", "complete"]]  # Only set for streaming discovery
+    deselected: NotRequired[list[str]]
+    cache_id: NotRequired[str]  # Only set for cached discovery
+    delta: NotRequired[DiscoveryDeltaDict]
+    encoding: NotRequired[Literal["v2"]]  # Only set for the compact format
+    paths: NotRequired[list[str]]  # The path table of the compact format
+    timing: NotRequired[CollectionTimingDict]  # Only set when the timing report is enabled
+
+
+class DiscoveryDeltaDict(TypedDict):
+    """The changes to the test tree since the cached discovery the extension has."""
+
+    added: list[TestNode]  # Subtrees of the added files, rooted at the session node.
+    updated: list[TestNode]  # Subtrees of the changed files, rooted at the session node.
+    removed: list[str]  # Ids of the file nodes which no longer have tests.
 
 
 class ExecutionPayloadDict(Dict):
@@ -929,7 +1405,8 @@ class ExecutionPayloadDict(Dict):
     cwd: str
     status: Literal["success", "error"]
     result: TestRunResultDict | None
-    not_found: list[str] | None  # Currently unused need to check
+    not_found: list[str] | None  # Only set when some requested test ids match no collected test.
+    fixture_profile: FixtureProfileDict | None  # Only set when fixtures are profiled.
     error: str | None  # Currently unused need to check
 
 
@@ -938,8 +1415,100 @@ class CoveragePayloadDict(Dict):
 
     coverage: bool
     cwd: str
-    result: dict[str, FileCoverageInfo] | None
+    result: dict[str, FileCoverageInfo] | dict[str, RangesFileCoverageDict] | None
     error: str | None  # Currently unused need to check
+    encoding: Literal["ranges"] | None  # Only set when the lines are encoded as ranges
+
+
+class NodePathResolver:
+    """Memoizes the symlink equivalent of the node paths during a session.
+
+    Node paths only need to be resolved when SYMLINK_PATH is set, they are then memoized by the
+    node's path string. The memoized paths are relative to the working directory and are dropped
+    when it or SYMLINK_PATH changes.
+    """
+
+    def __init__(self) -> None:
+        self.cwd_str = ""
+        self.cwd = pathlib.Path()
+        self.symlink_path: pathlib.Path | None = None
+        self.node_paths: dict[str, pathlib.Path] = {}
+
+    def clear(self) -> None:
+        """Drops the memoized paths, at the start of a session."""
+        self.cwd_str = ""
+        self.node_paths.clear()
+
+    def get_cwd(self) -> pathlib.Path:
+        """Returns the working directory, dropping the memoized paths if it changed."""
+        cwd_str = os.getcwd()  # noqa: PTH109
+        if cwd_str != self.cwd_str or SYMLINK_PATH is not self.symlink_path:
+            self.cwd_str = cwd_str
+            self.cwd = pathlib.Path(cwd_str)
+            self.symlink_path = SYMLINK_PATH
+            self.node_paths.clear()
+        return self.cwd
+
+    def get_node_path(
+        self,
+        node: pytest.Session
+        | pytest.Item
+        | pytest.File
+        | pytest.Class
+        | pytest.Module
+        | HasPathOrFspath,
+    ) -> pathlib.Path:
+        """Returns the path of a node, its symlink equivalent if SYMLINK_PATH is set."""
+        node_path = getattr(node, "path", None)
+        if node_path is None:
+            fspath = getattr(node, "fspath", None)
+            node_path = pathlib.Path(fspath) if fspath is not None else None
+
+        if not node_path:
+            raise VSCodePytestError(
+                f"Unable to find path for node: {node}, node.path: {node.path}, node.fspath: {node.fspath}"
+            )
+
+        # Check for the session node since it has the symlink already.
+        if not SYMLINK_PATH or isinstance(node, pytest.Session):
+            return node_path
+        cwd = self.get_cwd()
+        node_path_str = os.fspath(node_path)
+        symlink_node_path = self.node_paths.get(node_path_str)
+        if symlink_node_path is None:
+            symlink_node_path = get_symlink_node_path(node_path, SYMLINK_PATH, cwd)
+            self.node_paths[node_path_str] = symlink_node_path
+        return symlink_node_path
+
+
+def get_symlink_node_path(
+    node_path: pathlib.Path, symlink_path: pathlib.Path, cwd: pathlib.Path
+) -> pathlib.Path:
+    """Returns the equivalent of a node path under the symlink root."""
+    # Get relative between the cwd (resolved path) and the node path.
+    try:
+        # Check to see if the node path contains the symlink root already
+        # Convert Path objects to strings for os.path.commonpath
+        symlink_str: str = str(symlink_path)
+        node_path_str: str = str(node_path)
+        common_path = os.path.commonpath([symlink_str, node_path_str])
+        if common_path == os.fsdecode(symlink_path):
+            # The node path is already relative to the SYMLINK_PATH root therefore return
+            return node_path
+        else:
+            # If the node path is not a symlink, then we need to calculate the equivalent symlink path
+            # get the relative path between the cwd and the node path (as the node path is not a symlink).
+            rel_path = node_path.relative_to(cwd)
+            # combine the difference between the cwd and the node path with the symlink path
+            return pathlib.Path(symlink_path, rel_path)
+    except Exception as e:
+        raise VSCodePytestError(
+            f"Error occurred while calculating symlink equivalent from node path: {e}"
+            f"\n SYMLINK_PATH: {symlink_path}, \n node path: {node_path}, \n cwd: {cwd}"
+        ) from e
+
+
+node_path_resolver = NodePathResolver()
 
 
 def get_node_path(
@@ -961,48 +1530,33 @@ def get_node_path(
     Returns:
         pathlib.Path: The resolved path for the node.
     """
-    node_path = getattr(node, "path", None)
-    if node_path is None:
-        fspath = getattr(node, "fspath", None)
-        node_path = pathlib.Path(fspath) if fspath is not None else None
+    return node_path_resolver.get_node_path(node)
 
-    if not node_path:
-        raise VSCodePytestError(
-            f"Unable to find path for node: {node}, node.path: {node.path}, node.fspath: {node.fspath}"
-        )
 
-    # Check for the session node since it has the symlink already.
-    if SYMLINK_PATH and not isinstance(node, pytest.Session):
-        # Get relative between the cwd (resolved path) and the node path.
-        try:
-            # Check to see if the node path contains the symlink root already
-            # Convert Path objects to strings for os.path.commonpath
-            symlink_str: str = str(SYMLINK_PATH)
-            node_path_str: str = str(node_path)
-            common_path = os.path.commonpath([symlink_str, node_path_str])
-            if common_path == os.fsdecode(SYMLINK_PATH):
-                # The node path is already relative to the SYMLINK_PATH root therefore return
-                return node_path
-            else:
-                # If the node path is not a symlink, then we need to calculate the equivalent symlink path
-                # get the relative path between the cwd and the node path (as the node path is not a symlink).
-                rel_path = node_path.relative_to(pathlib.Path.cwd())
-                # combine the difference between the cwd and the node path with the symlink path
-                return pathlib.Path(SYMLINK_PATH, rel_path)
-        except Exception as e:
-            raise VSCodePytestError(
-                f"Error occurred while calculating symlink equivalent from node path: {e}"
-                f"\n SYMLINK_PATH: {SYMLINK_PATH}, \n node path: {node_path}, \n cwd: {pathlib.Path.cwd()}"
-            ) from e
-    return node_path
+__writer = None
+__writer_lock = threading.Lock()
+__writer_thread: PipeWriterThread | None = None
 
 
-__writer = None
-atexit.register(lambda: __writer.close() if __writer else None)
+def close_writer() -> None:
+    """Sends the pending messages and closes the connection to the extension."""
+    if result_batcher is not None:
+        result_batcher.flush()
+    if __writer_thread is not None:
+        __writer_thread.close()
+    if __writer:
+        __writer.close()
+
+
+atexit.register(close_writer)
 
 
 def send_execution_message(
-    cwd: str, status: Literal["success", "error"], tests: TestRunResultDict | None
+    cwd: str,
+    status: Literal["success", "error"],
+    tests: TestRunResultDict | None,
+    not_found: list[str] | None = None,
+    fixture_profile: FixtureProfileDict | None = None,
 ):
     """Sends message execution payload details.
 
@@ -1010,22 +1564,102 @@ def send_execution_message(
         cwd (str): Current working directory.
         status (Literal["success", "error"]): Execution status indicating success or error.
         tests (Union[testRunResultDict, None]): Test run results, if available.
+        not_found (Union[list[str], None]): Requested test ids that match no collected test.
+        fixture_profile (Union[FixtureProfileDict, None]): The fixture setups and teardowns of the run.
     """
     payload: ExecutionPayloadDict = ExecutionPayloadDict(
-        cwd=cwd, status=status, result=tests, not_found=None, error=None
+        cwd=cwd, status=status, result=tests, error=None
     )
+    if not_found:
+        payload["not_found"] = not_found
+    if fixture_profile is not None:
+        payload["fixture_profile"] = fixture_profile
     if ERRORS:
         payload["error"] = ERRORS
     send_message(payload)
 
 
-def send_discovery_message(cwd: str, session_node: TestNode) -> None:
+def send_test_result(cwd: str, test_id: str, outcome: TestOutcome) -> None:
+    """Sends the result of a single test, as part of a batch when result batching is enabled.
+
+    Args:
+        cwd (str): Current working directory.
+        test_id (str): The absolute id of the test.
+        outcome (TestOutcome): The result of the test.
+    """
+    if result_batcher is not None:
+        result_batcher.add(cwd, test_id, outcome)
+        return
+    collected_test = TestRunResultDict()
+    collected_test[test_id] = outcome
+    send_execution_message(cwd, "success", collected_test)
+
+
+class ExecutionResultBatcher:
+    """Coalesces test results into one execution message per batch.
+
+    A batch is sent once its estimated size reaches `max_bytes` or `max_delay` seconds after its
+    first result, whichever comes first. The caller sends what is left with `flush`.
+    """
+
+    def __init__(self, max_bytes: int, max_delay: float):
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.cwd = ""
+        self.results = TestRunResultDict()
+        self.size = 0
+        self.timer: threading.Timer | None = None
+
+    def add(self, cwd: str, test_id: str, outcome: TestOutcome) -> None:
+        with self.lock:
+            if self.results and cwd != self.cwd:
+                self._send()
+            self.cwd = cwd
+            self.results[test_id] = outcome
+            # Estimate the size instead of serializing each result twice.
+            self.size += (
+                2 * len(test_id)
+                + len(outcome["message"] or "")
+                + len(outcome["traceback"] or "")
+                + 100
+            )
+            if self.size >= self.max_bytes:
+                self._send()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        """Sends the results of the current batch, if any."""
+        with self.lock:
+            self._send()
+
+    def _send(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.results:
+            results = self.results
+            self.results = TestRunResultDict()
+            self.size = 0
+            send_execution_message(self.cwd, "success", results)
+
+
+def send_discovery_message(
+    cwd: str, session_node: TestNode, cache_id: str | None = None
+) -> DiscoveryPayloadDict:
     """
     Sends a POST request with test session details in payload.
 
     Args:
         cwd (str): Current working directory.
         session_node (TestNode): Node information of the test session.
+        cache_id (str | None): Id of the discovery cache the tree was saved to, if any.
+
+    Returns:
+        DiscoveryPayloadDict: The payload that was sent.
     """
     payload: DiscoveryPayloadDict = {
         "cwd": cwd,
@@ -1035,7 +1669,175 @@ def send_discovery_message(cwd: str, session_node: TestNode) -> None:
     }
     if ERRORS is not None:
         payload["error"] = ERRORS
-    send_message(payload, cls_encoder=PathEncoder)
+    if cache_id is not None:
+        payload["cache_id"] = cache_id
+    add_collection_timing(payload)
+    send_discovery_payload(payload)
+    return payload
+
+
+def send_cached_discovery_message(
+    session: pytest.Session, cwd: pathlib.Path, session_node: TestNode
+) -> None:
+    """
+    Saves the subtree of each collected file to the discovery cache and sends the discovered tests.
+
+    If the extension has the tree of the cached discovery only the changes to it are sent,
+    otherwise the whole tree is sent.
+
+    Args:
+        session (pytest.Session): The pytest session object.
+        cwd (pathlib.Path): Current working directory.
+        session_node (TestNode): The tree of the collected tests.
+    """
+    items_by_file: dict[str, list[pytest.Item]] = {}
+    for item in session.items:
+        file_node = item.getparent(pytest.File)
+        if file_node is None:
+            # Items that are not part of a file cannot be cached.
+            send_discovery_message(os.fsdecode(cwd), session_node)
+            return
+        items_by_file.setdefault(os.fspath(get_fs_path(file_node)), []).append(item)
+
+    if discovery_cache_plugin is not None:
+        fingerprinter = discovery_cache_plugin.fingerprinter
+        cached_files = discovery_cache_plugin.cached_files
+    else:
+        fingerprinter = FileFingerprinter(session.config.rootpath)
+        cached_files = {}
+    files: dict[str, CachedFileDict] = {}
+    for path, items in items_by_file.items():
+        file_node = cast("pytest.File", items[0].getparent(pytest.File))
+        files[path] = {
+            "fingerprint": fingerprinter.get_fingerprint(pathlib.Path(path)),
+            "file_id": os.fspath(get_node_path(file_node)),
+            # Round trip through json so the subtree compares equal to the cached one.
+            "tests": json.loads(json.dumps(build_test_tree(session, items), cls=PathEncoder)),
+        }
+
+    cache_id = new_cache_id()
+    if discovery_cache_plugin is None:
+        save_discovery_cache(
+            session.config,
+            {"key": get_session_key(session.config, cwd), "cache_id": cache_id, "files": files},
+        )
+        send_discovery_message(os.fsdecode(cwd), session_node, cache_id)
+        return
+
+    delta: DiscoveryDeltaDict = {"added": [], "updated": [], "removed": []}
+    for path, cached_file in files.items():
+        previous_file = cached_files.get(path)
+        if previous_file is None:
+            delta["added"].append(cast("TestNode", cached_file["tests"]))
+        elif previous_file["tests"] != cached_file["tests"]:
+            delta["updated"].append(cast("TestNode", cached_file["tests"]))
+    for path, previous_file in cached_files.items():
+        if path in files:
+            continue
+        if path in discovery_cache_plugin.unchanged_paths:
+            files[path] = previous_file
+        else:
+            delta["removed"].append(previous_file["file_id"])
+    save_discovery_cache(
+        session.config,
+        {"key": get_session_key(session.config, cwd), "cache_id": cache_id, "files": files},
+    )
+    payload: DiscoveryPayloadDict = {
+        "cwd": os.fsdecode(cwd),
+        "status": "success" if not ERRORS else "error",
+        "tests": None,
+        "error": ERRORS,
+        "cache_id": cache_id,
+        "delta": delta,
+    }
+    add_collection_timing(payload)
+    send_message(payload)
+
+
+def send_discovery_stream_message(items: list[pytest.Item]) -> None:
+    """
+    Sends the subtree for a set of items collected from a single file during streaming discovery.
+
+    The subtree is rooted at the session node so the extension can merge it into its test tree.
+    Errors are not included, they are sent once with the final discovery message.
+
+    Args:
+        items (list[pytest.Item]): Test items collected from one file.
+    """
+    if not items:
+        return
+    with trace_span("build_test_tree", items=len(items)):
+        session_node = build_test_tree(items[0].session, items)
+    cwd = SYMLINK_PATH if SYMLINK_PATH else pathlib.Path.cwd()
+    payload: DiscoveryPayloadDict = {
+        "cwd": os.fsdecode(cwd),
+        "status": "success",
+        "tests": session_node,
+        "error": [],
+        "stream": "partial",
+    }
+    send_discovery_payload(payload)
+
+
+def send_discovery_complete_message(cwd: str) -> None:
+    """
+    Sends the message that marks the end of streaming discovery.
+
+    Args:
+        cwd (str): Current working directory.
+    """
+    payload: DiscoveryPayloadDict = {
+        "cwd": cwd,
+        "status": "success" if not ERRORS else "error",
+        "tests": None,
+        "error": ERRORS,
+        "stream": "complete",
+        "deselected": deselected_test_ids,
+    }
+    add_collection_timing(payload)
+    send_message(payload)
+
+
+def add_collection_timing(payload: DiscoveryPayloadDict) -> None:
+    """Adds the slowest test modules and conftests to the payload if they were timed."""
+    if collection_timing_plugin is not None:
+        payload["timing"] = collection_timing_plugin.get_report()
+
+
+def send_large_functions_as_pages(config: pytest.Config, session_node: TestNode) -> int:
+    """Moves the cases of the functions above LAZY_PARAMETRIZE_THRESHOLD to pages.
+
+    Returns the number of functions that were paged. The whole tree is sent if pytest's cache
+    provider is disabled.
+    """
+    pages_dir = new_pages_dir(config)
+    if pages_dir is None:
+        print(
+            "Plugin warning[vscode-pytest]: The cache provider is disabled, "
+            "sending all cases of parametrized functions."
+        )
+        return 0
+    return page_large_functions(
+        cast("dict[str, Any]", session_node),
+        LAZY_PARAMETRIZE_THRESHOLD,
+        pages_dir,
+        cls_encoder=PathEncoder,
+    )
+
+
+def send_discovery_payload(payload: DiscoveryPayloadDict) -> None:
+    """Sends a discovery payload, with its tree in the compact format if it was negotiated."""
+    if COMPACT_DISCOVERY:
+        with trace_span("encode_payload"):
+            encoded = encode_payload(cast("dict[str, Any]", payload))
+        send_message(cast("DiscoveryPayloadDict", encoded))
+    else:
+        send_message(payload, cls_encoder=PathEncoder)
+
+
+def trace_span(name: str, **args: Any) -> contextlib.AbstractContextManager[None]:
+    """Returns a span of the trace, or a context that does nothing when tracing is disabled."""
+    return tracer.span(name, **args) if tracer is not None else contextlib.nullcontext()
 
 
 class PathEncoder(json.JSONEncoder):
@@ -1068,7 +1870,7 @@ def send_message(
         print(error_msg, file=sys.stderr)
         raise VSCodePytestError(error_msg)
 
-    global __writer
+    global __writer, __writer_thread
 
     if __writer is None:
         try:
@@ -1084,24 +1886,42 @@ def send_message(
             )
             __writer = None
             raise VSCodePytestError(error_msg) from error
+        if TEST_RUN_PIPE_WRITER in ("block", "coalesce"):
+            queue_size = (
+                int(TEST_RUN_PIPE_QUEUE_SIZE) if TEST_RUN_PIPE_QUEUE_SIZE.isdigit() else 1024
+            )
+            __writer_thread = PipeWriterThread(
+                __writer,
+                queue_size,
+                cast("Literal['block', 'coalesce']", TEST_RUN_PIPE_WRITER),
+                "vscode-pytest",
+            )
 
     rpc = {
         "jsonrpc": "2.0",
         "params": payload,
     }
+    start = time.perf_counter() if tracer is not None else 0.0
     data = json.dumps(rpc, cls=cls_encoder)
     try:
         if __writer:
             request = (
                 f"""content-length: {len(data)}\r\ncontent-type: application/json\r\n\r\n{data}"""
             )
-            size = 4096
             encoded = request.encode("utf-8")
-            bytes_written = 0
-            while bytes_written < len(encoded):
-                segment = encoded[bytes_written : bytes_written + size]
-                bytes_written += __writer.write(segment)
-                __writer.flush()
+            encoded_time = 0.0
+            if tracer is not None:
+                encoded_time = time.perf_counter()
+                tracer.add("encode", "message", start, encoded_time, bytes=len(encoded))
+            if __writer_thread is not None:
+                __writer_thread.send(encoded)
+            else:
+                # Result batches can be sent from a timer thread, messages must not interleave.
+                with __writer_lock:
+                    write_message(__writer, encoded)
+            if tracer is not None:
+                # With a writer thread, this is the time spent waiting for room in its queue.
+                tracer.add("pipe write", "message", encoded_time, time.perf_counter())
         else:
             print(
                 f"Plugin error connection error[vscode-pytest], writer is None \n[vscode-pytest] data: \n{data} \n",
@@ -1126,6 +1946,33 @@ class DeferPlugin:
             result = 0
         outcome.force_result(result)
 
+    def pytest_xdist_make_scheduler(self, config: pytest.Config, log):
+        """Balance the work of the workers using the duration history, when enabled.
+
+        Returning None, like when there is no history, lets pytest-xdist use its own scheduler.
+        """
+        if not BALANCE_BY_HISTORY:
+            return None
+        cache = getattr(config, "cache", None)
+        if cache is None:
+            return None
+        history_path = get_cache_dir(cache, HISTORY_DIR) / HISTORY_FILE
+        records_by_test = get_records_by_test(read_history(history_path))
+        if not records_by_test:
+            return None
+        expected_durations = {
+            test_id: get_expected_duration(test_records)
+            for test_id, test_records in records_by_test.items()
+        }
+        default_duration = percentile(list(expected_durations.values()), 50)
+        rootpath = config.rootpath
+        return make_scheduler(
+            config,
+            log,
+            lambda nodeid: expected_durations.get(get_absolute_node_id(rootpath, nodeid)),
+            default_duration,
+        )
+
 
 def pytest_plugin_registered(plugin: object, manager: pytest.PytestPluginManager):
     plugin_name = "vscode_xdist"
@@ -0,0 +1,89 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Times the collection of each test module and the import of each conftest during discovery.
+
+The slowest modules and conftests are sent with the discovery payload, most of the time a slow
+discovery comes from one or two of them importing something heavy at module scope.
+
+A test module is imported when pytest collects it, so the time of a module is the time spent
+in `pytest_make_collect_report` for its file and its classes. pytest has no hook around the
+import of a conftest, its time is measured from the previous collection step or plugin
+registration, which are the last points before pytest imports it, to its registration.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import time
+import types
+from typing import Iterator, TypedDict
+
+import pytest
+
+from ._pytest_compat import get_fs_path
+
+TIMING_ENV = "DISCOVERY_TIMING_REPORT_ENABLED"
+# The number of modules and conftests that are reported.
+TOP_COUNT = 10
+
+
+class TimedPathDict(TypedDict):
+    path: str
+    duration: float
+
+
+class CollectionTimingDict(TypedDict):
+    total: float
+    modules: list[TimedPathDict]
+    conftests: list[TimedPathDict]
+
+
+def get_top(durations: dict[str, float]) -> list[TimedPathDict]:
+    """Returns the paths with the longest durations, longest first."""
+    top = sorted(durations.items(), key=lambda item: item[1], reverse=True)[:TOP_COUNT]
+    return [{"path": path, "duration": duration} for path, duration in top]
+
+
+class CollectionTimingPlugin:
+    """Records the collection time of each test file and the import time of each conftest."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.last_step = self.start
+        self.module_durations: dict[str, float] = {}
+        self.conftest_durations: dict[str, float] = {}
+
+    def pytest_plugin_registered(self, plugin: object) -> None:
+        now = time.perf_counter()
+        path = getattr(plugin, "__file__", None)
+        if (
+            isinstance(plugin, types.ModuleType)
+            and path
+            and pathlib.Path(path).name == "conftest.py"
+        ):
+            self.conftest_durations[path] = now - self.last_step
+        self.last_step = now
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_make_collect_report(self, collector: pytest.Collector) -> Iterator[None]:
+        start = self.last_step = time.perf_counter()
+        yield
+        end = self.last_step = time.perf_counter()
+        # Classes are collected after their module, their time is added to the module's.
+        if isinstance(collector, (pytest.File, pytest.Class)):
+            path = os.fspath(get_fs_path(collector))
+            self.module_durations[path] = self.module_durations.get(path, 0.0) + end - start
+
+    def pytest_collection_finish(self) -> None:
+        self.end = time.perf_counter()
+
+    def get_report(self) -> CollectionTimingDict:
+        """Returns the time from the start of the discovery and the slowest modules and conftests."""
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "total": end - self.start,
+            "modules": get_top(self.module_durations),
+            "conftests": get_top(self.conftest_durations),
+        }
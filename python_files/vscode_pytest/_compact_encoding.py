@@ -0,0 +1,86 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Encodes discovery trees in the compact `v2` wire format.
+
+The extension opts in with `DISCOVERY_ENCODING=v2`. Every node of a regular tree repeats the
+absolute path of its file up to three times, in `path`, `id_` and `runID`. In the compact format
+the payload has a `paths` table with each path once, and the nodes reference it:
+
+- `path` is the index of the node's path in the table.
+- `rid` replaces `id_` when the id starts with the node's path, it is the rest of the id. Ids
+  that do not start with the path, like the empty id of an error node, are kept in `id_`.
+- `runID` is left out of test nodes when it is the same as the id.
+
+All other keys, like `name`, `lineno` and `children`, are unchanged. Decoding is the reverse:
+`id_` is `paths[path] + rid` and the `runID` of a test node defaults to its id.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+ENCODING_ENV = "DISCOVERY_ENCODING"
+ENCODING_V2 = "v2"
+
+
+def encode_tree(node: dict[str, Any], path_indexes: dict[str, int]) -> dict[str, Any]:
+    """Returns the compact version of a tree, adding its paths to `path_indexes`.
+
+    Keyword arguments:
+    node -- the root of the tree, its paths can be `pathlib.Path` objects or strings.
+    path_indexes -- the index of each path in the table, new paths are appended.
+    """
+    path = os.fspath(node["path"])
+    index = path_indexes.get(path)
+    if index is None:
+        index = path_indexes[path] = len(path_indexes)
+    encoded: dict[str, Any] = {}
+    for key, value in node.items():
+        if key == "path":
+            encoded["path"] = index
+        elif key == "id_":
+            if value.startswith(path):
+                encoded["rid"] = value[len(path) :]
+            else:
+                encoded["id_"] = value
+        elif key == "runID":
+            if value != node["id_"] or node["type_"] != "test":
+                encoded["runID"] = value
+        elif key == "children":
+            encoded["children"] = [
+                encode_tree(child, path_indexes) for child in value if child is not None
+            ]
+        else:
+            encoded[key] = value
+    return encoded
+
+
+def decode_tree(node: dict[str, Any], paths: list[str]) -> dict[str, Any]:
+    """Returns the regular version of a compact tree, with string paths."""
+    path = paths[node["path"]]
+    decoded: dict[str, Any] = {}
+    for key, value in node.items():
+        if key == "path":
+            decoded["path"] = path
+        elif key == "rid":
+            decoded["id_"] = path + value
+        elif key == "children":
+            decoded["children"] = [decode_tree(child, paths) for child in value]
+        else:
+            decoded[key] = value
+    if decoded["type_"] == "test" and "runID" not in decoded:
+        decoded["runID"] = decoded["id_"]
+    return decoded
+
+
+def encode_payload(payload: dict[str, Any]) -> dict[str, Any]:
+    """Returns a copy of a discovery payload with its tree in the compact format.
+
+    Payloads without a tree, like the payload that completes a stream, are returned unchanged.
+    """
+    if payload.get("tests") is None:
+        return payload
+    path_indexes: dict[str, int] = {}
+    tests = encode_tree(payload["tests"], path_indexes)
+    return {**payload, "tests": tests, "encoding": ENCODING_V2, "paths": list(path_indexes)}
@@ -0,0 +1,195 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Analyzes the measured files of a coverage run, in worker processes when there are many.
+
+Analyzing a file parses its source to find its executable lines and branches, which for a run
+that measured thousands of files takes longer than the tests. The files are then split across a
+pool of processes that each load the coverage data file, read only, and analyze slices of them.
+Runs with fewer files than it takes to make up for starting the workers are analyzed serially.
+
+The analysis of the files that earlier runs analyzed is read from `vscode_coverage_cache`, so
+only the files that changed, or whose hits changed, are analyzed again, and only those count
+towards starting the workers.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import pathlib
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Iterator, TypedDict
+
+from vscode_coverage_cache import AnalysisCache, FileAnalysisDict
+
+from ._sharding import get_shard_count
+
+if TYPE_CHECKING:
+    import coverage
+
+# The number of analysis processes, "auto" for one per CPU.
+ANALYSIS_WORKERS_ENV = "COVERAGE_ANALYSIS_WORKERS"
+# Each worker gets at least this many files, fewer files are analyzed serially.
+MIN_FILES_PER_WORKER = 200
+# The files are split in more slices than workers, so a worker with slow files does not hold
+# up the others.
+SLICES_PER_WORKER = 4
+# The folder of the pytest cache the analysis of the measured files is cached in.
+CACHE_DIR = "vscode-coverage"
+
+
+class FileCoverageInfo(TypedDict):
+    lines_covered: list[int]
+    lines_missed: list[int]
+    executed_branches: int
+    total_branches: int
+
+
+# The coverage object of a worker process, with the data of the run loaded.
+_worker_coverage: coverage.Coverage | None = None
+
+
+def analyze_file(
+    cov: coverage.Coverage, file: str, cache: AnalysisCache, *, include_branches: bool
+) -> FileCoverageInfo | None:
+    """Returns the covered and missed lines and the branches of a file.
+
+    Files whose source cannot be found or analyzed are skipped with None.
+    """
+    try:
+        from coverage.exceptions import NoSource
+    except ImportError:
+        from coverage.misc import NoSource
+
+    try:
+        file_coverage = cache.analyze(cov, file, include_branches=include_branches)
+    except NoSource:
+        # as per issue 24308 this best way to handle this edge case
+        return None
+    except Exception as e:
+        print(f"Plugin error[vscode-pytest]: Skipping analysis of file: {file} due to error: {e}")
+        return None
+    return {
+        "lines_covered": list(file_coverage.lines_covered),  # list of int
+        "lines_missed": list(file_coverage.lines_missed),  # list of int
+        "executed_branches": file_coverage.executed_branches,
+        "total_branches": file_coverage.total_branches,
+    }
+
+
+def iter_files(
+    cov: coverage.Coverage, files: list[str], cache: AnalysisCache, *, include_branches: bool
+) -> Iterator[tuple[str, FileCoverageInfo]]:
+    """Yields the analysis of each file that could be analyzed, with its absolute path."""
+    for file in files:
+        file_info = analyze_file(cov, file, cache, include_branches=include_branches)
+        if file_info is None:
+            continue
+        # convert relative path to absolute path
+        if not pathlib.Path(file).is_absolute():
+            file = str(pathlib.Path(file).resolve())
+        yield file, file_info
+
+
+def analyze_files(
+    cov: coverage.Coverage, files: list[str], cache: AnalysisCache, *, include_branches: bool
+) -> dict[str, FileCoverageInfo]:
+    """Returns the analysis of each file that could be analyzed, keyed by its absolute path."""
+    return dict(iter_files(cov, files, cache, include_branches=include_branches))
+
+
+def init_worker(data_file: str, config_file: str | None) -> None:
+    """Loads the data of the run in a worker process, once for all of its slices."""
+    import coverage
+
+    global _worker_coverage
+    # Without a config file the worker looks for one like the main process did, and finds none.
+    _worker_coverage = coverage.Coverage(data_file=data_file, config_file=config_file or True)
+    _worker_coverage.load()
+
+
+def analyze_slice(
+    files: list[str], *, include_branches: bool
+) -> tuple[dict[str, FileCoverageInfo], dict[str, FileAnalysisDict]]:
+    """Returns the analysis of a slice of files, with the entries for the cache."""
+    assert _worker_coverage is not None
+    cache = AnalysisCache(_worker_coverage)
+    file_coverage_map = analyze_files(
+        _worker_coverage, files, cache, include_branches=include_branches
+    )
+    return file_coverage_map, cache.analyzed
+
+
+def get_worker_count(file_count: int) -> int:
+    """Returns the number of analysis processes for a number of files, 1 to analyze serially."""
+    worker_count = get_shard_count(os.environ.get(ANALYSIS_WORKERS_ENV, "auto"))
+    return max(min(worker_count, file_count // MIN_FILES_PER_WORKER), 1)
+
+
+def iter_coverage(
+    cov: coverage.Coverage,
+    files: list[str],
+    *,
+    include_branches: bool,
+    cache_path: pathlib.Path | None = None,
+) -> Iterator[tuple[str, FileCoverageInfo]]:
+    """Yields the analysis of the measured files, in worker processes if many changed.
+
+    Keyword arguments:
+    cov -- the coverage object the data of the run was loaded in.
+    files -- the measured files to analyze.
+    include_branches -- whether to count the executed and total branches of each file.
+    cache_path -- the file the analysis of the files is cached in, None to analyze them all.
+    """
+    cache = AnalysisCache(cov, cache_path)
+    changed_files = [
+        file
+        for file in files
+        if cache.get_cached(cov, file, include_branches=include_branches) is None
+    ]
+    worker_count = get_worker_count(len(changed_files))
+    if worker_count <= 1:
+        yield from iter_files(cov, files, cache, include_branches=include_branches)
+        cache.save()
+        return
+
+    changed_file_set = set(changed_files)
+    cached_files = [file for file in files if file not in changed_file_set]
+    yield from iter_files(cov, cached_files, cache, include_branches=include_branches)
+    slice_count = worker_count * SLICES_PER_WORKER
+    slices = [changed_files[index::slice_count] for index in range(slice_count)]
+    completed_slices = 0
+    try:
+        # Forking is not safe once the plugin has started threads, like the pipe writer.
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=worker_count,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(cov.get_data().data_filename(), cov.config.config_file),
+        ) as executor:
+            analyze = functools.partial(analyze_slice, include_branches=include_branches)
+            for slice_coverage_map, analyzed in executor.map(analyze, slices):
+                completed_slices += 1
+                for file, analysis in analyzed.items():
+                    cache.add(file, analysis)
+                yield from slice_coverage_map.items()
+    except (OSError, BrokenProcessPool) as e:
+        print(
+            f"Plugin warning[vscode-pytest]: Coverage analysis workers failed, analyzing serially: {e}"
+        )
+        remaining_files = [file for files in slices[completed_slices:] for file in files]
+        yield from iter_files(cov, remaining_files, cache, include_branches=include_branches)
+    cache.save()
+
+
+def analyze_coverage(
+    cov: coverage.Coverage,
+    files: list[str],
+    *,
+    include_branches: bool,
+    cache_path: pathlib.Path | None = None,
+) -> dict[str, FileCoverageInfo]:
+    """Returns the analysis of the measured files, keyed by their absolute path."""
+    return dict(iter_coverage(cov, files, include_branches=include_branches, cache_path=cache_path))
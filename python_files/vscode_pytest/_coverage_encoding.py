@@ -0,0 +1,95 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Sends coverage in chunks of files, with the line sets encoded as ranges.
+
+The extension opts in with `COVERAGE_ENCODING=ranges`. A regular coverage payload has the
+result of every file, with each covered and missed line as a number, and is built in memory
+before it is sent. With the `ranges` encoding the files are sent as they are analyzed, in
+payloads of up to `CHUNK_SIZE` files that have `"encoding": "ranges"` set, and the
+`lines_covered` and `lines_missed` of each file are flat lists of `gap, length` pairs:
+
+- Each pair is a range of consecutive lines, in increasing order.
+- `gap` is the distance from the end of the previous range, one past its last line, to the
+  first line of the range. The first range counts from line 0.
+- `length` is the number of lines in the range.
+
+For example the lines `[1, 2, 3, 7, 8, 10]` are encoded as `[1, 3, 3, 2, 1, 1]`. The branch
+counts are unchanged.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator, TypedDict
+
+if TYPE_CHECKING:
+    from ._coverage_analysis import FileCoverageInfo
+
+COVERAGE_ENCODING_ENV = "COVERAGE_ENCODING"
+ENCODING_RANGES = "ranges"
+# The number of files sent in each payload.
+CHUNK_SIZE = 500
+
+
+class RangesFileCoverageDict(TypedDict):
+    lines_covered: list[int]
+    lines_missed: list[int]
+    executed_branches: int
+    total_branches: int
+
+
+def encode_lines(lines: Iterable[int]) -> list[int]:
+    """Returns the `gap, length` pairs of the ranges of consecutive lines in a set of lines."""
+    encoded: list[int] = []
+    end = 0
+    length = 0
+    for line in sorted(set(lines)):
+        if length and line == end:
+            length += 1
+        else:
+            if length:
+                encoded.append(length)
+            encoded.append(line - end)
+            length = 1
+        end = line + 1
+    if length:
+        encoded.append(length)
+    return encoded
+
+
+def decode_lines(encoded: list[int]) -> list[int]:
+    """Returns the sorted lines of a list of `gap, length` pairs."""
+    lines: list[int] = []
+    end = 0
+    for index in range(0, len(encoded), 2):
+        start = end + encoded[index]
+        end = start + encoded[index + 1]
+        lines.extend(range(start, end))
+    return lines
+
+
+def encode_file_coverage(file_coverage: FileCoverageInfo) -> RangesFileCoverageDict:
+    return {
+        "lines_covered": encode_lines(file_coverage["lines_covered"]),
+        "lines_missed": encode_lines(file_coverage["lines_missed"]),
+        "executed_branches": file_coverage["executed_branches"],
+        "total_branches": file_coverage["total_branches"],
+    }
+
+
+def iter_encoded_chunks(
+    files_coverage: Iterable[tuple[str, FileCoverageInfo]], chunk_size: int = CHUNK_SIZE
+) -> Iterator[dict[str, RangesFileCoverageDict]]:
+    """Yields the encoded coverage of the files in chunks, as they are analyzed.
+
+    A run without files yields one empty chunk, so that its coverage is still sent.
+    """
+    chunk: dict[str, RangesFileCoverageDict] = {}
+    sent = False
+    for file, file_coverage in files_coverage:
+        chunk[file] = encode_file_coverage(file_coverage)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = {}
+            sent = True
+    if chunk or not sent:
+        yield chunk
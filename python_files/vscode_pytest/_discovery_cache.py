@@ -0,0 +1,284 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""On-disk caches of discovery results.
+
+The discovered subtree of each test file is reused while the file, the ``conftest.py`` files that
+apply to it and the session fingerprint (pytest version, config file, arguments and working
+directory) are unchanged.
+
+The last discovery payload is replayed, without collecting any test, while the discovery
+fingerprint of the content of the candidate test files, conftest files, config file and arguments
+is unchanged.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import uuid
+from typing import Any, Iterator, TypedDict, cast
+
+import pytest
+
+from ._pytest_compat import legacy_path_hook
+
+CACHE_KEY = "vscode/discovery_cache"
+PAYLOAD_CACHE_KEY = "vscode/discovery_payload"
+
+
+class CachedFileDict(TypedDict):
+    """The cached discovery result of a single test file."""
+
+    fingerprint: str
+    file_id: str  # The id of the file node in the extension's test tree.
+    tests: dict[str, Any]  # The subtree of the file, rooted at the session node.
+
+
+class DiscoveryCacheDict(TypedDict):
+    """The content of the discovery cache, keyed in pytest's cache by CACHE_KEY."""
+
+    key: str
+    cache_id: str
+    files: dict[str, CachedFileDict]
+
+
+def new_cache_id() -> str:
+    """Returns a new id for a version of the cache, sent to the extension with each payload."""
+    return uuid.uuid4().hex
+
+
+def hash_file(file_path: pathlib.Path) -> str:
+    """Returns the sha256 hash of the content of a file, or an empty string if it cannot be read."""
+    try:
+        return hashlib.sha256(file_path.read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+
+def get_session_key(config: pytest.Config, cwd: pathlib.Path) -> str:
+    """Returns the fingerprint of everything that applies to all of the files of a session.
+
+    Keyword arguments:
+    config -- the pytest config object.
+    cwd -- the directory the test ids are relative to.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(pytest.__version__.encode())
+    hasher.update(sys.version.encode())
+    hasher.update(os.fsencode(cwd))
+    hasher.update("\0".join(config.invocation_params.args).encode())
+    inipath = getattr(config, "inipath", None)
+    if inipath:
+        hasher.update(os.fsencode(inipath))
+        hasher.update(hash_file(pathlib.Path(inipath)).encode())
+    return hasher.hexdigest()
+
+
+class FileFingerprinter:
+    """Computes file fingerprints, hashing each `conftest.py` once per session."""
+
+    def __init__(self, rootdir: pathlib.Path):
+        self.rootdir = rootdir
+        self.conftest_hashes: dict[pathlib.Path, str] = {}
+
+    def get_conftest_hash(self, folder: pathlib.Path) -> str:
+        try:
+            return self.conftest_hashes[folder]
+        except KeyError:
+            conftest = folder / "conftest.py"
+            conftest_hash = hash_file(conftest) if conftest.is_file() else ""
+            self.conftest_hashes[folder] = conftest_hash
+            return conftest_hash
+
+    def get_fingerprint(self, file_path: pathlib.Path) -> str:
+        """Returns the fingerprint of a test file and of the `conftest.py` files that apply to it.
+
+        Keyword arguments:
+        file_path -- the absolute path of the test file.
+        """
+        hasher = hashlib.sha256(hash_file(file_path).encode())
+        for folder in file_path.parents:
+            hasher.update(self.get_conftest_hash(folder).encode())
+            if folder == self.rootdir:
+                break
+        return hasher.hexdigest()
+
+
+def load_discovery_cache(config: pytest.Config, key: str) -> DiscoveryCacheDict | None:
+    """Returns the discovery cache if it was written for the same session key, otherwise None."""
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return None
+    data = cache.get(CACHE_KEY, None)
+    if not isinstance(data, dict) or data.get("key") != key or "files" not in data:
+        return None
+    return cast("DiscoveryCacheDict", data)
+
+
+def save_discovery_cache(config: pytest.Config, data: DiscoveryCacheDict) -> None:
+    """Writes the discovery cache, doing nothing if pytest's cache provider is disabled."""
+    cache = getattr(config, "cache", None)
+    if cache is not None:
+        cache.set(CACHE_KEY, data)
+
+
+class DiscoveryCachePlugin:
+    """Skips collecting the files whose cached subtree can be reused.
+
+    This plugin is only registered when the extension already has the tree of the cached
+    discovery, so it only needs the files which changed.
+    """
+
+    def __init__(self, cached_files: dict[str, CachedFileDict], fingerprinter: FileFingerprinter):
+        self.cached_files = cached_files
+        self.fingerprinter = fingerprinter
+        # Paths of the cached files that are unchanged and were not collected.
+        self.unchanged_paths: set[str] = set()
+
+    @legacy_path_hook
+    def pytest_ignore_collect(self, collection_path: pathlib.Path) -> bool | None:
+        path = os.fspath(collection_path)
+        cached_file = self.cached_files.get(path)
+        if cached_file is None:
+            return None
+        if cached_file["fingerprint"] != self.fingerprinter.get_fingerprint(collection_path):
+            return None
+        self.unchanged_paths.add(path)
+        return True
+
+
+def iter_candidate_files(config: pytest.Config, args: list[str]) -> Iterator[pathlib.Path]:
+    """Yields the files that can change which tests are collected, without importing any of them.
+
+    These are the files matching the `python_files` patterns or the default doctest pattern and
+    the `conftest.py` files under the paths given in the arguments, or under the `testpaths` or
+    the invocation directory if no path is given.
+
+    Keyword arguments:
+    config -- the pytest config object, only the ini values need to be loaded.
+    args -- the command line arguments of the session.
+    """
+    invocation_dir = config.invocation_params.dir
+    paths = [invocation_dir / arg.split("::")[0] for arg in args if not arg.startswith("-")]
+    paths = [path for path in paths if path.exists()]
+    if not paths:
+        testpaths = config.getini("testpaths")
+        paths = [config.rootpath / testpath for testpath in testpaths] or [invocation_dir]
+    patterns = [*config.getini("python_files"), "test*.txt", "conftest.py"]
+    norecursedirs = config.getini("norecursedirs")
+    for path in paths:
+        if path.is_file():
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(
+                dirname
+                for dirname in dirnames
+                if not any(fnmatch.fnmatch(dirname, pattern) for pattern in norecursedirs)
+                and not pathlib.Path(dirpath, dirname, "pyvenv.cfg").exists()
+            )
+            for filename in sorted(filenames):
+                if any(fnmatch.fnmatch(filename, pattern) for pattern in patterns):
+                    yield pathlib.Path(dirpath, filename)
+
+
+def get_discovery_fingerprint(
+    config: pytest.Config, args: list[str], known_hashes: dict[str, list[Any]]
+) -> tuple[str, dict[str, list[Any]]]:
+    """Returns the fingerprint of the inputs of a discovery, computed before any test is collected.
+
+    Candidate files are fingerprinted by the hash of their content. The hashes of the previous
+    discovery are reused for the files whose size and modification time are unchanged, so only
+    the files that were saved since are read. Files that are not candidates, like modules imported
+    by the tests, are not part of the fingerprint.
+
+    Also returns the size, modification time and hash of each candidate file, for the next
+    discovery.
+
+    Keyword arguments:
+    config -- the pytest config object, only the ini values need to be loaded.
+    args -- the command line arguments of the session.
+    known_hashes -- the size, modification time and hash of the files of the previous discovery.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(pytest.__version__.encode())
+    hasher.update(sys.version.encode())
+    hasher.update(os.fsencode(config.invocation_params.dir))
+    hasher.update("\0".join(args).encode())
+    inipath = getattr(config, "inipath", None)
+    if inipath:
+        hasher.update(os.fsencode(inipath))
+        hasher.update(hash_file(pathlib.Path(inipath)).encode())
+    file_hashes: dict[str, list[Any]] = {}
+    for file_path in iter_candidate_files(config, args):
+        path = os.fspath(file_path)
+        try:
+            stat = file_path.stat()
+        except OSError:
+            continue
+        known = known_hashes.get(path)
+        if isinstance(known, list) and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            file_hashes[path] = known
+        else:
+            file_hashes[path] = [stat.st_size, stat.st_mtime_ns, hash_file(file_path)]
+        hasher.update(f"{path}\0{file_hashes[path][2]}\0".encode())
+    return hasher.hexdigest(), file_hashes
+
+
+def get_payload_cache_path(config: pytest.Config) -> pathlib.Path:
+    """Returns the path of the cached discovery payload, in pytest's cache directory.
+
+    It matches the path `config.cache` uses for PAYLOAD_CACHE_KEY, but is available before the
+    cache provider is configured.
+    """
+    cache_dir = pathlib.Path(os.path.expandvars(config.getini("cache_dir"))).expanduser()
+    return config.rootpath / cache_dir / "v" / PAYLOAD_CACHE_KEY
+
+
+def load_discovery_payload(
+    config: pytest.Config, args: list[str]
+) -> tuple[str, dict[str, list[Any]], dict[str, Any] | None]:
+    """Returns the discovery fingerprint, its file hashes and the payload saved with it, if any.
+
+    Keyword arguments:
+    config -- the pytest config object, only the ini values need to be loaded.
+    args -- the command line arguments of the session.
+    """
+    try:
+        with get_payload_cache_path(config).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    known_hashes = data.get("file_hashes")
+    fingerprint, file_hashes = get_discovery_fingerprint(
+        config, args, known_hashes if isinstance(known_hashes, dict) else {}
+    )
+    if data.get("fingerprint") != fingerprint:
+        return fingerprint, file_hashes, None
+    return fingerprint, file_hashes, data.get("payload")
+
+
+def save_discovery_payload(
+    config: pytest.Config,
+    fingerprint: str,
+    file_hashes: dict[str, list[Any]],
+    payload: dict[str, Any],
+) -> None:
+    """Saves the discovery payload, doing nothing if pytest's cache provider is disabled.
+
+    The collection timing report is not saved, it only applies to the discovery that collected
+    the tests.
+    """
+    cache = getattr(config, "cache", None)
+    if cache is not None:
+        payload = {key: value for key, value in payload.items() if key != "timing"}
+        cache.set(
+            PAYLOAD_CACHE_KEY,
+            {"fingerprint": fingerprint, "file_hashes": file_hashes, "payload": payload},
+        )
@@ -0,0 +1,96 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Sends the cases of large parametrized functions as pages that the extension loads on demand.
+
+A function with more cases than the threshold is sent without children, with the number of
+cases in `count` and the path of its first page in `cursor`. The pages are JSON files in pytest's
+cache directory, each with up to `threshold` test nodes in `children` and the path of the next
+page in `next`. The extension reads the pages when the function is expanded or run.
+
+Each discovery replaces the pages of the previous one.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import shutil
+from typing import TYPE_CHECKING, Any
+
+from ._discovery_cache import new_cache_id
+from ._pytest_compat import get_cache_dir
+
+if TYPE_CHECKING:
+    import pytest
+
+PAGES_CACHE_DIR = "vscode-discovery-pages"
+
+
+def get_threshold(value: str | None) -> int:
+    """Returns the threshold from the value of its environment variable, 0 when disabled."""
+    if value and value.isdigit():
+        return int(value)
+    return 0
+
+
+def new_pages_dir(config: pytest.Config) -> pathlib.Path | None:
+    """Returns a new folder for the pages of a discovery, after removing the previous ones.
+
+    Returns None if pytest's cache provider is disabled.
+    """
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return None
+    pages_root = get_cache_dir(cache, PAGES_CACHE_DIR)
+    for previous_dir in pages_root.iterdir():
+        shutil.rmtree(previous_dir, ignore_errors=True)
+    pages_dir = pages_root / new_cache_id()
+    pages_dir.mkdir()
+    return pages_dir
+
+
+def page_large_functions(
+    node: dict[str, Any], threshold: int, pages_dir: pathlib.Path, cls_encoder=None
+) -> int:
+    """Moves the cases of the functions with more than `threshold` cases to pages.
+
+    Returns the number of functions that were paged.
+
+    Keyword arguments:
+    node -- the root of the tree, it is updated in place.
+    threshold -- the largest number of cases a function is sent with, and the size of a page.
+    pages_dir -- the folder the pages are written to.
+    cls_encoder -- the JSON encoder for the nodes, for their `pathlib.Path` paths.
+    """
+    paged = 0
+    nodes = [node]
+    while nodes:
+        for child in nodes.pop().get("children", []):
+            if child is None or "children" not in child:
+                continue
+            if child["type_"] == "function" and len(child["children"]) > threshold:
+                write_pages(child, threshold, pages_dir / str(paged), cls_encoder)
+                paged += 1
+            else:
+                nodes.append(child)
+    return paged
+
+
+def write_pages(
+    function_node: dict[str, Any], page_size: int, path_prefix: pathlib.Path, cls_encoder=None
+) -> None:
+    """Writes the cases of a function node to pages and replaces them with a count and a cursor."""
+    cases = function_node["children"]
+    page_count = (len(cases) + page_size - 1) // page_size
+    page_paths = [pathlib.Path(f"{path_prefix}-{number}.json") for number in range(page_count)]
+    for number, page_path in enumerate(page_paths):
+        next_path = page_paths[number + 1] if number + 1 < len(page_paths) else None
+        page = {
+            "children": cases[number * page_size : (number + 1) * page_size],
+            "next": os.fspath(next_path) if next_path else None,
+        }
+        page_path.write_text(json.dumps(page, cls=cls_encoder), encoding="utf-8")
+    function_node["children"] = []
+    function_node["count"] = len(cases)
+    function_node["cursor"] = os.fspath(page_paths[0])
@@ -0,0 +1,96 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Profiles the setup and teardown of the fixtures of a run.
+
+When TEST_FIXTURE_PROFILE_ENABLED is "True" the plugin records how many times each fixture was
+set up and the time spent in its setup and teardown, in total and per scope. A function scoped
+fixture that is set up for every test but costs the same each time is often better in a wider
+scope.
+
+The setup of a fixture is timed around `pytest_fixture_setup`, without the fixtures it requests
+if they are set up during it. Its teardown is timed from a finalizer that is added once it is
+set up, which runs before its other finalizers, to `pytest_fixture_post_finalizer`, which runs
+after them.
+"""
+
+from __future__ import annotations
+
+import functools
+import time
+from typing import Iterator, TypedDict
+
+import pytest
+
+FIXTURE_PROFILE_ENV = "TEST_FIXTURE_PROFILE_ENABLED"
+
+
+class FixtureStatsDict(TypedDict):
+    count: int
+    setup: float
+    teardown: float
+
+
+class FixtureProfileEntryDict(FixtureStatsDict):
+    name: str
+    scope: str
+    # The node id prefix the fixture is visible from, empty for the fixtures of plugins.
+    baseid: str
+
+
+class FixtureProfileDict(TypedDict):
+    fixtures: list[FixtureProfileEntryDict]
+    scopes: dict[str, FixtureStatsDict]
+
+
+class FixtureProfilerPlugin:
+    """Records the setups and teardowns of each fixture definition."""
+
+    def __init__(self) -> None:
+        self.stats: dict[tuple[str, str, str], FixtureStatsDict] = {}
+        # The time spent setting up the fixtures requested during the setup that is timed.
+        self.nested_setups: list[float] = []
+        self.teardown_starts: dict[pytest.FixtureDef, float] = {}
+
+    def get_stats(self, fixturedef: pytest.FixtureDef) -> FixtureStatsDict:
+        key = (fixturedef.argname, fixturedef.scope, fixturedef.baseid)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = {"count": 0, "setup": 0.0, "teardown": 0.0}
+        return stats
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef: pytest.FixtureDef) -> Iterator[None]:
+        start = time.perf_counter()
+        self.nested_setups.append(0.0)
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            nested = self.nested_setups.pop()
+            if self.nested_setups:
+                self.nested_setups[-1] += duration
+            stats = self.get_stats(fixturedef)
+            stats["count"] += 1
+            stats["setup"] += duration - nested
+            fixturedef.addfinalizer(functools.partial(self.start_teardown, fixturedef))
+
+    def start_teardown(self, fixturedef: pytest.FixtureDef) -> None:
+        self.teardown_starts[fixturedef] = time.perf_counter()
+
+    def pytest_fixture_post_finalizer(self, fixturedef: pytest.FixtureDef) -> None:
+        start = self.teardown_starts.pop(fixturedef, None)
+        if start is not None:
+            self.get_stats(fixturedef)["teardown"] += time.perf_counter() - start
+
+    def get_profile(self) -> FixtureProfileDict:
+        """Returns the stats of each fixture, slowest first, and their totals per scope."""
+        fixtures: list[FixtureProfileEntryDict] = []
+        scopes: dict[str, FixtureStatsDict] = {}
+        for (name, scope, baseid), stats in self.stats.items():
+            fixtures.append({"name": name, "scope": scope, "baseid": baseid, **stats})
+            scope_stats = scopes.setdefault(scope, {"count": 0, "setup": 0.0, "teardown": 0.0})
+            scope_stats["count"] += stats["count"]
+            scope_stats["setup"] += stats["setup"]
+            scope_stats["teardown"] += stats["teardown"]
+        fixtures.sort(key=lambda fixture: fixture["setup"] + fixture["teardown"], reverse=True)
+        return {"fixtures": fixtures, "scopes": scopes}
@@ -0,0 +1,348 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""A long-lived process that runs the tests of each execution in a fresh fork of itself.
+
+The server imports pytest, its plugins and the modules listed in TEST_FORK_SERVER_PRELOAD once. For each run
+request it forks a child which inherits those imports, so the run does not pay for starting the
+interpreter and importing them. Conftest files and the code under test are not preloaded, they
+are imported by each child. The server exits, and the run falls back to a regular process, when
+any file of a preloaded module, a conftest or configuration file of the cwd or its parents, or the
+installed packages changed, or when it was idle for too long.
+
+The client sends its standard streams with the request, so the output of the child goes where
+the output of a regular run would go. Only available where `os.fork` and Unix sockets are.
+
+This module must not import pytest or the vscode_pytest package, so that the client starts fast.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import gc
+import hashlib
+import importlib
+import json
+import os
+import pathlib
+import select
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from multiprocessing import reduction
+from typing import Any
+
+IDLE_TIMEOUT = 30 * 60
+CONNECT_TIMEOUT = 1.0
+# Environment variables of a single run, which the server process must not keep.
+RUN_ENV_VARS = ("TEST_RUN_PIPE", "RUN_TEST_IDS_PIPE")
+# The files of the cwd and its parents that change how pytest loads its plugins and conftests.
+CONFIG_FILES = (
+    "conftest.py",
+    "pytest.ini",
+    ".pytest.ini",
+    "pyproject.toml",
+    "tox.ini",
+    "setup.cfg",
+)
+
+
+def is_supported() -> bool:
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+def get_preload_modules(env: dict[str, str]) -> list[str]:
+    """Returns the modules to preload from the TEST_FORK_SERVER_PRELOAD environment variable."""
+    value = env.get("TEST_FORK_SERVER_PRELOAD", "")
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def get_server_key(cwd: str, preload: list[str], env: dict[str, str]) -> str:
+    """Returns the key of the server that can run tests for an environment, cwd and preload.
+
+    The environment is the interpreter, its PYTHONPATH and its `sys.path`, so a server is not
+    reused for runs which would import other modules.
+    """
+    return json.dumps([sys.executable, env.get("PYTHONPATH", ""), sys.path, cwd, preload])
+
+
+def is_private_folder(folder: pathlib.Path) -> bool:
+    """Returns whether the folder is a directory, not a link, that only the current user can use."""
+    try:
+        folder_stat = folder.lstat()
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(folder_stat.st_mode)
+        and folder_stat.st_uid == os.getuid()
+        and stat.S_IMODE(folder_stat.st_mode) == 0o700
+    )
+
+
+def get_socket_path(env: dict[str, str], server_key: str) -> pathlib.Path | None:
+    """Returns the socket of the server, TEST_FORK_SERVER_SOCKET or one in a per-user folder.
+
+    The name of the per-user folder is predictable, so another user could create it first and
+    serve the runs. Returns None if the folder of the socket is not private to the current user.
+    """
+    if env.get("TEST_FORK_SERVER_SOCKET"):
+        socket_path = pathlib.Path(env["TEST_FORK_SERVER_SOCKET"])
+    else:
+        folder = pathlib.Path(tempfile.gettempdir(), f"vscode-pytest-{os.getuid()}")
+        try:
+            folder.mkdir(mode=0o700, exist_ok=True)
+        except OSError:
+            return None
+        key_hash = hashlib.sha256(server_key.encode()).hexdigest()[:16]
+        socket_path = folder / f"fork-server-{key_hash}.sock"
+    if not is_private_folder(socket_path.parent):
+        return None
+    return socket_path
+
+
+def send_json(conn: socket.socket, data: dict[str, Any]) -> None:
+    conn.sendall(json.dumps(data).encode() + b"\n")
+
+
+def receive_json(conn: socket.socket) -> dict[str, Any] | None:
+    """Receives one message, or None if the connection closed first."""
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    return json.loads(data)
+
+
+def get_mtime(file: str) -> int | None:
+    try:
+        return os.stat(file).st_mtime_ns  # noqa: PTH116
+    except OSError:
+        return None
+
+
+def get_module_mtimes() -> dict[str, int | None]:
+    """Returns the modification times of the files of the imported modules."""
+    files = {getattr(module, "__file__", None) for module in list(sys.modules.values())}
+    return {file: get_mtime(file) for file in files if file}
+
+
+def get_config_mtimes(cwd: pathlib.Path) -> dict[str, int | None]:
+    """Returns the modification times of the files which change the plugins of a run.
+
+    These are the conftest and configuration files of the cwd and its parents, None for the ones
+    that do not exist so adding them is a change, and the folders of the installed packages,
+    which change when a plugin is installed or removed.
+    """
+    files = [os.fspath(folder / name) for folder in (cwd, *cwd.parents) for name in CONFIG_FILES]
+    files.extend(
+        path for path in sys.path if pathlib.Path(path).name in ("site-packages", "dist-packages")
+    )
+    return {file: get_mtime(file) for file in files}
+
+
+def is_stale(mtimes: dict[str, int | None]) -> bool:
+    """Returns whether any of the files changed since their modification times were recorded."""
+    return any(get_mtime(file) != mtime for file, mtime in mtimes.items())
+
+
+def run_child(request: dict[str, Any], fds: list[int]) -> int:
+    """Runs pytest in the forked child, with the streams, environment and cwd of the client."""
+    for target_fd, fd in zip((0, 1, 2), fds):
+        os.dup2(fd, target_fd)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # The plugin reads its settings from the environment when it is imported.
+    for name in [name for name in sys.modules if name.split(".")[0] == "vscode_pytest"]:
+        del sys.modules[name]
+    import pytest
+
+    arg_array = ["-p", "vscode_pytest", *request["args"], *request["ids"]]
+    print("Running pytest in the fork server with args: " + str(arg_array))
+    return pytest.main(arg_array)
+
+
+def handle_run(conn: socket.socket, request: dict[str, Any], fds: list[int]) -> None:
+    """Forks a child for the run and reports its exit code once it finishes.
+
+    The child is killed if the client goes away, like when the run is cancelled.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 3
+        try:
+            conn.close()
+            exit_code = int(run_child(request, fds))
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            # Exit handlers flush the plugin's messages, os._exit does not run them.
+            atexit._run_exitfuncs()  # noqa: SLF001
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    for fd in fds:
+        os.close(fd)
+    # The child is waited for in a thread, which closes the pipe once it exited.
+    read_fd, write_fd = os.pipe()
+    statuses: list[int] = []
+
+    def wait_for_child() -> None:
+        statuses.append(os.waitpid(pid, 0)[1])
+        os.close(write_fd)
+
+    waiter = threading.Thread(target=wait_for_child, daemon=True)
+    waiter.start()
+    try:
+        while True:
+            readable, _, _ = select.select([conn, read_fd], [], [])
+            if read_fd in readable:
+                break
+            if not conn.recv(1):
+                os.kill(pid, signal.SIGKILL)
+                return
+    finally:
+        waiter.join()
+        os.close(read_fd)
+    status = statuses[0]
+    exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    with contextlib.suppress(OSError):
+        send_json(conn, {"status": "done", "exit_code": exit_code})
+
+
+def serve(socket_path: pathlib.Path, server_key: str, preload: list[str]) -> None:
+    """Preloads the modules and runs the requests of the clients until the server is stale."""
+    import pytest
+
+    # Parsing the arguments imports the plugins of pytest and of the installed packages.
+    pytest.main(["--version"])
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:  # noqa: PERF203
+            traceback.print_exc()
+    mtimes = {**get_module_mtimes(), **get_config_mtimes(pathlib.Path.cwd())}
+    # Keeps the collector of the children away from the preloaded objects, collecting them
+    # would copy the memory pages the children share with the server.
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+    with contextlib.suppress(OSError):
+        socket_path.unlink()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(os.fspath(socket_path))
+    socket_path.chmod(0o600)
+    server.listen()
+    server.settimeout(IDLE_TIMEOUT)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                return
+            with conn:
+                conn.settimeout(None)
+                try:
+                    fds = list(reduction.recvfds(conn, 3))
+                    request = receive_json(conn)
+                except (OSError, EOFError, RuntimeError, ValueError):
+                    continue
+                if request is None or request.get("command") == "stop":
+                    for fd in fds:
+                        os.close(fd)
+                    if request is None:
+                        continue
+                    return
+                if request.get("key") != server_key or is_stale(mtimes):
+                    for fd in fds:
+                        os.close(fd)
+                    send_json(conn, {"status": "stale"})
+                    return
+                handle_run(conn, request, fds)
+    finally:
+        server.close()
+        with contextlib.suppress(OSError):
+            socket_path.unlink()
+
+
+def start_server(socket_path: pathlib.Path, server_key: str, preload: list[str]) -> None:
+    """Starts a server in the background, for the next runs."""
+    python_files_dir = pathlib.Path(__file__).parent.parent
+    env = {name: value for name, value in os.environ.items() if name not in RUN_ENV_VARS}
+    python_path = [python_files_dir, python_files_dir / "lib" / "python"]
+    env["PYTHONPATH"] = os.pathsep.join(
+        [*map(os.fspath, python_path), *filter(None, [os.environ.get("PYTHONPATH")])]
+    )
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "vscode_pytest._fork_server",
+            os.fspath(socket_path),
+            server_key,
+            *preload,
+        ],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def run_in_fork_server(args: list[str], ids: list[str]) -> int | None:
+    """Runs the tests in the fork server and returns the exit code of the run.
+
+    Returns None if no server could run the tests, after starting one for the next runs.
+    """
+    cwd = os.fspath(pathlib.Path.cwd())
+    preload = get_preload_modules(dict(os.environ))
+    server_key = get_server_key(cwd, preload, dict(os.environ))
+    socket_path = get_socket_path(dict(os.environ), server_key)
+    if socket_path is None:
+        print(
+            "Plugin warning[vscode-pytest]: The folder of the fork server socket is not private to "
+            "the current user, running the tests in a new process."
+        )
+        return None
+    request = {"key": server_key, "cwd": cwd, "env": dict(os.environ), "args": args, "ids": ids}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CONNECT_TIMEOUT)
+            conn.connect(os.fspath(socket_path))
+            conn.settimeout(None)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            reduction.sendfds(conn, [0, 1, 2])
+            send_json(conn, request)
+            response = receive_json(conn)
+    except OSError:
+        response = None
+    if response is not None and response.get("status") == "done":
+        return response["exit_code"]
+    start_server(socket_path, server_key, preload)
+    return None
+
+
+def stop_server(socket_path: pathlib.Path) -> None:
+    """Asks the server listening on the socket to exit."""
+    with contextlib.suppress(OSError), socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(os.fspath(socket_path))
+        reduction.sendfds(conn, [0, 1, 2])
+        send_json(conn, {"command": "stop"})
+
+
+if __name__ == "__main__":
+    # The key is computed by the client, the `sys.path` of the server differs from the client's.
+    serve(pathlib.Path(sys.argv[1]), sys.argv[2], sys.argv[3:])
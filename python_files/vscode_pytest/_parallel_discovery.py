@@ -0,0 +1,153 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Collects the tests of a discovery in parallel worker processes, without pytest-xdist.
+
+Each worker runs the same discovery as the coordinator, with a plugin that ignores the files
+assigned to the other workers, so each test module is imported by a single worker. pytest's own
+rules, like `norecursedirs`, `--ignore` and `collect_ignore`, still decide which files are
+collected.
+
+Files are partitioned rather than folders, so the test modules are spread evenly even when most
+of them are in a few folders. The cost is that every worker traverses all folders and imports all
+of the conftest files and the modules they import, so parallel discovery only pays off when most
+of the discovery time is spent importing the test modules.
+
+The workers export the subtree of each of their test files, and the coordinator nests them in
+folders under the session node like a regular discovery.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import zlib
+from typing import TYPE_CHECKING, TypedDict, cast
+
+import pytest
+
+from ._pytest_compat import legacy_path_hook
+
+if TYPE_CHECKING:
+    from . import TestItem, TestNode
+
+PARTITION_ENV = "TEST_DISCOVERY_PARTITION"
+EXPORT_ENV = "TEST_DISCOVERY_EXPORT"
+# Discovery modes that the workers do not use, the coordinator sends the payload.
+WORKER_DISABLED_ENV = (
+    "TEST_DISCOVERY_WORKERS",
+    "DISCOVERY_STREAMING_ENABLED",
+    "DISCOVERY_CACHE_ENABLED",
+    "DISCOVERY_FINGERPRINT_ENABLED",
+)
+# Files that every worker needs, they are part of the collection of their folder.
+SHARED_FILES = ("__init__.py", "conftest.py")
+
+
+class WorkerExportDict(TypedDict):
+    """What a discovery worker exports for the coordinator."""
+
+    files: list[TestNode]  # The subtree of each collected test file.
+    errors: list[str]
+    exitstatus: int
+
+
+def get_worker_index(path: pathlib.Path, worker_count: int) -> int:
+    """Returns the worker that collects a file, from a stable hash of its path."""
+    return zlib.crc32(os.fsencode(path)) % worker_count
+
+
+def parse_partition(value: str | None) -> tuple[int, int] | None:
+    """Returns the index and the count of the workers from a `<index>/<count>` value."""
+    index, _, count = (value or "").partition("/")
+    if not (index.isdigit() and count.isdigit()) or int(index) >= int(count):
+        return None
+    return int(index), int(count)
+
+
+class PartitionPlugin:
+    """Ignores the files that are collected by the other workers."""
+
+    def __init__(self, index: int, worker_count: int):
+        self.index = index
+        self.worker_count = worker_count
+
+    @pytest.hookimpl(tryfirst=True)
+    @legacy_path_hook
+    def pytest_ignore_collect(self, collection_path: pathlib.Path) -> bool | None:
+        if collection_path.name in SHARED_FILES or collection_path.is_dir():
+            return None
+        if get_worker_index(collection_path, self.worker_count) != self.index:
+            return True
+        return None
+
+
+def write_export(export_path: str, export: WorkerExportDict, cls_encoder=None) -> None:
+    pathlib.Path(export_path).write_text(json.dumps(export, cls=cls_encoder), encoding="utf-8")
+
+
+def run_workers(args: list[str], cwd: pathlib.Path, worker_count: int) -> list[WorkerExportDict]:
+    """Runs the discovery in `worker_count` processes and returns their exports, in order.
+
+    A worker that exits without exporting its tests is reported with an error.
+
+    Keyword arguments:
+    args -- the arguments of the coordinator's pytest session.
+    cwd -- the directory the coordinator's pytest session was invoked from.
+    worker_count -- the number of worker processes.
+    """
+    exports: list[WorkerExportDict] = []
+    with tempfile.TemporaryDirectory(prefix="vscode-pytest-discovery-") as temp_dir:
+        workers: list[tuple[subprocess.Popen, pathlib.Path]] = []
+        for index in range(worker_count):
+            export_path = pathlib.Path(temp_dir, f"worker-{index}.json")
+            env = {
+                name: value for name, value in os.environ.items() if name not in WORKER_DISABLED_ENV
+            }
+            env[PARTITION_ENV] = f"{index}/{worker_count}"
+            env[EXPORT_ENV] = os.fspath(export_path)
+            # The workers print the collected tests, which the coordinator would print again.
+            process = subprocess.Popen(
+                [sys.executable, "-m", "pytest", "-p", "vscode_pytest", *args],
+                cwd=cwd,
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+            workers.append((process, export_path))
+
+        for index, (process, export_path) in enumerate(workers):
+            exit_code = process.wait()
+            try:
+                exports.append(json.loads(export_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                error = (
+                    f"Discovery worker {index + 1} of {worker_count} exited with code "
+                    f"{exit_code} before exporting its tests."
+                )
+                exports.append({"files": [], "errors": [error], "exitstatus": 3})
+    return exports
+
+
+def merge_file_nodes(exports: list[WorkerExportDict]) -> dict[str, TestNode]:
+    """Returns the file subtrees of all workers keyed by path, with `pathlib.Path` file paths.
+
+    A file collected by several workers, like a file given as an argument, is kept once.
+    """
+    file_nodes: dict[str, TestNode] = {}
+    for export in exports:
+        for file_node in export["files"]:
+            path = pathlib.Path(file_node["path"])
+            file_node["path"] = path
+            file_nodes.setdefault(os.fspath(path), file_node)
+    return file_nodes
+
+
+def count_tests(node: TestNode | TestItem) -> int:
+    """Returns the number of test nodes in a subtree."""
+    if node["type_"] == "test":
+        return 1
+    children = cast("TestNode", node)["children"]
+    return sum(count_tests(child) for child in children if child is not None)
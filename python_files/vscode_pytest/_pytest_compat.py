@@ -0,0 +1,57 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compatibility with the older versions of pytest that the plugin supports."""
+
+from __future__ import annotations
+
+import pathlib
+from typing import Any, Callable, TypeVar, cast
+
+import pytest
+
+# pytest 7 passes `collection_path`, a `pathlib.Path`, to the hooks that older versions only pass
+# a `py.path.local` as `path`.
+HAS_COLLECTION_PATH = int(pytest.__version__.split(".")[0]) >= 7
+
+HookT = TypeVar("HookT", bound=Callable[..., Any])
+
+
+def get_cache_dir(cache: Any, name: str) -> pathlib.Path:
+    """Returns the directory `name` in pytest's cache directory, creating it if needed.
+
+    `Cache.mkdir` was added in pytest 7, older versions only have `Cache.makedir`, which returns
+    a `py.path.local`.
+
+    Keyword arguments:
+    cache -- the pytest cache object, `config.cache`.
+    name -- the name of the directory.
+    """
+    mkdir = getattr(cache, "mkdir", None)
+    if mkdir is not None:
+        return mkdir(name)
+    return pathlib.Path(str(cache.makedir(name)))
+
+
+def get_fs_path(node: Any) -> pathlib.Path:
+    """Returns the path of a collection node, `node.path` was added in pytest 7."""
+    path = getattr(node, "path", None)
+    if path is not None:
+        return path
+    return pathlib.Path(str(node.fspath))
+
+
+def legacy_path_hook(hook: HookT) -> HookT:
+    """Adapts a hook method taking `collection_path` to the older versions of pytest.
+
+    pytest validates the argument names of the hooks when a plugin is registered, so on older
+    versions the hook is replaced by one taking `path`. Apply it below `pytest.hookimpl`, so the
+    options of the hook are set on the replacement.
+    """
+    if HAS_COLLECTION_PATH:
+        return hook
+
+    def legacy_hook(self, path):
+        return hook(self, pathlib.Path(str(path)))
+
+    legacy_hook.__name__ = hook.__name__
+    return cast("HookT", legacy_hook)
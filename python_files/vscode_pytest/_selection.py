@@ -0,0 +1,65 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Selects the tests of an execution after collecting each of their files once.
+
+pytest resolves each test id given as an argument on its own, which is slow for large
+selections. Instead only the unique files are passed as arguments and the collected tests that
+were not requested are deselected, with one set lookup per test and parent node.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Callable
+
+import pytest
+
+
+def get_selection_keys(test_id: str) -> list[str]:
+    """Returns the ids that select a test: its own id and the ids of its parent nodes.
+
+    For `/a/test_b.py::TestC::test_d[1]` these are the parametrized and the bare function ids,
+    the class and file ids and the ids of the folders of the file.
+    """
+    keys = [test_id]
+    bare_id = test_id.split("[", 1)[0]
+    parts = bare_id.split("::")
+    keys.extend("::".join(parts[:end]) for end in range(len(parts), 1, -1))
+    path = parts[0]
+    while path and path not in keys:
+        keys.append(path)
+        path = os.path.dirname(path)  # noqa: PTH120
+    return keys
+
+
+class SelectionPlugin:
+    """Deselects the collected tests that are not in the requested test ids.
+
+    The requested ids that select no collected test are recorded in `not_found`.
+    """
+
+    def __init__(self, test_ids: list[str], get_test_id: Callable[[pytest.Item], str]):
+        self.test_ids = test_ids
+        self.get_test_id = get_test_id
+        self.not_found: list[str] = []
+
+    # Runs before the other plugins, so tests they deselect, like with `-k`, are not "not found".
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, config: pytest.Config, items: list[pytest.Item]):
+        requested = set(self.test_ids)
+        found: set[str] = set()
+        selected: list[pytest.Item] = []
+        deselected: list[pytest.Item] = []
+        for item in items:
+            matches = [
+                key for key in get_selection_keys(self.get_test_id(item)) if key in requested
+            ]
+            if matches:
+                found.update(matches)
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+        self.not_found = [test_id for test_id in self.test_ids if test_id not in found]
@@ -0,0 +1,209 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Runs the tests of an execution in parallel shards, without pytest-xdist.
+
+The test ids are split into shards of whole files. Each shard runs `run_pytest_script.py` in
+its own process, which sends its messages to a pipe of the shard. The parent process forwards
+each complete message to the extension's pipe, so messages of different shards never interleave.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import BinaryIO, Iterator
+
+from vscode_pipe_writer import write_message
+
+# pytest exit codes, from the least to the most severe, "no tests collected" is the least severe.
+EXIT_CODE_SEVERITY = [5, 0, 1, 2, 4, 3]
+
+
+def get_shard_count(value: str | None) -> int:
+    """Returns the number of shards from the value of the TEST_RUN_SHARDS environment variable.
+
+    "auto" uses one shard per CPU, invalid values run the tests without sharding.
+    """
+    if value == "auto":
+        return os.cpu_count() or 1
+    if value and value.isdigit():
+        return max(int(value), 1)
+    return 1
+
+
+def split_into_shards(test_ids: list[str], shard_count: int) -> list[list[str]]:
+    """Splits test ids into at most `shard_count` shards of whole files, with balanced sizes.
+
+    The files with the most tests are assigned first, each to the shard with the fewest tests.
+    Test ids keep their order within a shard.
+    """
+    ids_by_file: dict[str, list[str]] = {}
+    for test_id in test_ids:
+        ids_by_file.setdefault(test_id.split("::")[0], []).append(test_id)
+    shard_count = min(shard_count, len(ids_by_file))
+    if shard_count <= 1:
+        return [test_ids] if test_ids else []
+
+    shards: list[list[str]] = [[] for _ in range(shard_count)]
+    for file_ids in sorted(ids_by_file.values(), key=len, reverse=True):
+        min(shards, key=len).extend(file_ids)
+    return shards
+
+
+def merge_exit_codes(exit_codes: list[int]) -> int:
+    """Returns the most severe pytest exit code, codes of crashed processes are internal errors."""
+    known_codes = [code if code in EXIT_CODE_SEVERITY else 3 for code in exit_codes]
+    return max(known_codes, key=EXIT_CODE_SEVERITY.index, default=5)
+
+
+def iter_messages(buffer: bytearray) -> Iterator[bytes]:
+    """Yields and removes the complete messages at the start of the buffer.
+
+    Messages have a "content-length" header, the content is ASCII JSON so its length in
+    characters is its length in bytes.
+    """
+    while True:
+        header_end = buffer.find(b"\r\n\r\n")
+        if header_end == -1:
+            return
+        length = None
+        for line in bytes(buffer[:header_end]).split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        if length is None:
+            raise ValueError("Message header does not contain Content-Length")
+        message_end = header_end + 4 + length
+        if len(buffer) < message_end:
+            return
+        yield bytes(buffer[:message_end])
+        del buffer[:message_end]
+
+
+class ShardMultiplexer:
+    """Forwards the complete messages of the pipes of all shards to a single writer."""
+
+    def __init__(self, writer: BinaryIO, cwd: str):
+        self.writer = writer
+        self.cwd = cwd
+        self.lock = threading.Lock()
+
+    def forward(self, shard_pipe: pathlib.Path, reported_ids: set[str]) -> None:
+        """Reads the pipe of a shard until all of its writers close it.
+
+        Keyword arguments:
+        shard_pipe -- the pipe the shard sends its messages to.
+        reported_ids -- receives the ids of the tests the shard sent results for.
+        """
+        buffer = bytearray()
+        with shard_pipe.open("rb", buffering=0) as reader:
+            while True:
+                data = reader.read(65536)
+                if not data:
+                    break
+                buffer.extend(data)
+                for message in iter_messages(buffer):
+                    with self.lock:
+                        write_message(self.writer, message)
+                    params = json.loads(message.partition(b"\r\n\r\n")[2]).get("params")
+                    if isinstance(params, dict) and isinstance(params.get("result"), dict):
+                        reported_ids.update(params["result"])
+        if buffer:
+            print(
+                f"Plugin warning[vscode-pytest]: Dropped {len(buffer)} bytes of an incomplete "
+                f"message from {shard_pipe}.",
+                file=sys.stderr,
+            )
+
+    def send_error(self, error: str, test_ids: list[str]) -> None:
+        """Sends an execution error, with an error result for each of the test ids."""
+        result = {
+            test_id: {
+                "test": test_id,
+                "outcome": "error",
+                "message": error,
+                "traceback": None,
+                "subtest": None,
+            }
+            for test_id in test_ids
+        }
+        payload = {
+            "cwd": self.cwd,
+            "status": "error",
+            "result": result or None,
+            "not_found": None,
+            "error": [error],
+        }
+        data = json.dumps({"jsonrpc": "2.0", "params": payload})
+        request = f"content-length: {len(data)}\r\ncontent-type: application/json\r\n\r\n{data}"
+        with self.lock:
+            write_message(self.writer, request.encode("utf-8"))
+
+
+def release_reader(shard_pipe: pathlib.Path) -> None:
+    """Unblocks a reader that is still waiting for the shard to open its pipe."""
+    # Opening fails if the reader is not waiting for a writer, it has finished reading then.
+    with contextlib.suppress(OSError):
+        os.close(os.open(shard_pipe, os.O_WRONLY | os.O_NONBLOCK))
+
+
+def run_sharded(
+    script: pathlib.Path, args: list[str], shards: list[list[str]], test_run_pipe: str
+) -> int:
+    """Runs each shard in its own process and returns the merged pytest exit code.
+
+    The tests of a shard whose process crashed, and which have no result, are reported as errors.
+
+    Keyword arguments:
+    script -- the path of run_pytest_script.py, which each shard runs.
+    args -- the pytest arguments, without the test ids.
+    shards -- the test ids of each shard.
+    test_run_pipe -- the extension's pipe, which receives the messages of all shards.
+    """
+    with tempfile.TemporaryDirectory(prefix="vscode-pytest-shards-") as temp_dir, pathlib.Path(
+        test_run_pipe
+    ).open("wb") as writer:
+        multiplexer = ShardMultiplexer(writer, os.fspath(pathlib.Path.cwd()))
+        running_shards: list[tuple[subprocess.Popen, pathlib.Path, threading.Thread, set[str]]] = []
+        for index, shard_ids in enumerate(shards):
+            shard_pipe = pathlib.Path(temp_dir, f"shard-{index}.pipe")
+            os.mkfifo(shard_pipe)
+            ids_path = pathlib.Path(temp_dir, f"shard-{index}.txt")
+            ids_path.write_text("\n".join(shard_ids), encoding="utf-8")
+            reported_ids: set[str] = set()
+            thread = threading.Thread(
+                target=multiplexer.forward,
+                args=(shard_pipe, reported_ids),
+                name=f"vscode-pytest-shard-{index}",
+            )
+            thread.start()
+            env = os.environ.copy()
+            env.update(
+                {
+                    "TEST_RUN_PIPE": os.fspath(shard_pipe),
+                    "RUN_TEST_IDS_PIPE": os.fspath(ids_path),
+                    "TEST_RUN_SHARD": str(index),
+                }
+            )
+            process = subprocess.Popen([sys.executable, os.fspath(script), *args], env=env)
+            running_shards.append((process, shard_pipe, thread, reported_ids))
+
+        exit_codes = []
+        for index, (process, shard_pipe, thread, reported_ids) in enumerate(running_shards):
+            exit_code = process.wait()
+            release_reader(shard_pipe)
+            thread.join()
+            exit_codes.append(exit_code)
+            if exit_code not in EXIT_CODE_SEVERITY:
+                multiplexer.send_error(
+                    f"Test shard {index + 1} of {len(shards)} exited with code {exit_code} "
+                    "before all of its tests finished.",
+                    [test_id for test_id in shards[index] if test_id not in reported_ids],
+                )
+        return merge_exit_codes(exit_codes)
@@ -0,0 +1,185 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Records which tests execute each line, to run only the tests affected by a change.
+
+When TEST_IMPACT_INDEX_ENABLED is "True" during a coverage run, the coverage.py dynamic context
+is switched to the absolute id of each test while it runs, and once the run finishes the lines
+each test executed are added to an index in pytest's cache. Rerunning a test replaces its lines,
+the lines of the tests that did not run are kept.
+
+The lines a module executes when it is imported, like its `def` and `class` statements, are
+executed outside of any test. A change to one of them selects every test that executed the
+file, since it can change the behavior of all of its functions.
+
+The tests of a change are selected from the index by `affected_tests`.
+"""
+
+from __future__ import annotations
+
+import json
+import pathlib
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import pytest
+
+from ._coverage_encoding import decode_lines, encode_lines
+from ._pytest_compat import get_cache_dir
+
+if TYPE_CHECKING:
+    import coverage
+    from coverage.data import CoverageData
+
+IMPACT_ENV = "TEST_IMPACT_INDEX_ENABLED"
+INDEX_DIR = "vscode-test-impact"
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+# Where `get_cache_dir(config.cache, INDEX_DIR)` puts the index, relative to the root of the workspace.
+DEFAULT_INDEX_PATH = pathlib.Path(".pytest_cache", "d", INDEX_DIR, INDEX_FILE)
+
+
+class ImpactContextPlugin:
+    """Switches the dynamic context of coverage.py to the id of each test while it runs."""
+
+    def __init__(self, get_test_id: Callable[[pytest.Item], str]) -> None:
+        self.get_test_id = get_test_id
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item: pytest.Item) -> Iterator[None]:
+        import coverage
+
+        cov = coverage.Coverage.current()
+        if cov is None:
+            yield
+            return
+        cov.switch_context(self.get_test_id(item))
+        try:
+            yield
+        finally:
+            cov.switch_context("")
+
+
+class ImpactIndex:
+    """The lines each test executed in each file, and the lines executed outside of tests."""
+
+    def __init__(self) -> None:
+        self.test_lines: dict[str, dict[str, set[int]]] = {}
+        self.import_lines: dict[str, set[int]] = {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> ImpactIndex:
+        """Returns the index saved in a file, an empty index if it cannot be read."""
+        index = cls()
+        try:
+            with path.open(encoding="utf-8") as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if not isinstance(content, dict) or content.get("version") != INDEX_VERSION:
+            return index
+        tests: list[str] = content["tests"]
+        for file, file_index in content["files"].items():
+            index.test_lines[file] = {
+                tests[int(test)]: set(decode_lines(lines))
+                for test, lines in file_index["tests"].items()
+            }
+            index.import_lines[file] = set(decode_lines(file_index["import_lines"]))
+        return index
+
+    def save(self, path: pathlib.Path) -> None:
+        """Writes the index with each test id once, and the lines as ranges."""
+        test_indexes: dict[str, int] = {}
+        files = {}
+        for file in sorted(self.test_lines.keys() | self.import_lines.keys()):
+            files[file] = {
+                "tests": {
+                    str(test_indexes.setdefault(test_id, len(test_indexes))): encode_lines(lines)
+                    for test_id, lines in self.test_lines.get(file, {}).items()
+                },
+                "import_lines": encode_lines(self.import_lines.get(file, ())),
+            }
+        content = {"version": INDEX_VERSION, "tests": list(test_indexes), "files": files}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(content, f, separators=(",", ":"))
+
+    def update(self, data: CoverageData, static_context: str | None = None) -> int:
+        """Replaces the lines of the tests that ran with the lines they executed in this run.
+
+        Returns the number of tests that ran.
+
+        Keyword arguments:
+        data -- the coverage data of the run, recorded with the test ids as dynamic contexts.
+        static_context -- the static context of the run, which prefixes the dynamic contexts.
+        """
+        prefix = f"{static_context}|" if static_context else ""
+
+        def get_test_id(context: str) -> str:
+            if context == static_context:
+                return ""
+            return context[len(prefix) :] if prefix and context.startswith(prefix) else context
+
+        ran_tests = {get_test_id(context) for context in data.measured_contexts()}
+        ran_tests.discard("")
+        for file_tests in self.test_lines.values():
+            for test_id in ran_tests.intersection(file_tests):
+                del file_tests[test_id]
+        for file in data.measured_files():
+            file_tests = self.test_lines.setdefault(file, {})
+            import_lines = self.import_lines[file] = set()
+            for line, contexts in data.contexts_by_lineno(file).items():
+                for context in contexts:
+                    test_id = get_test_id(context)
+                    if test_id:
+                        file_tests.setdefault(test_id, set()).add(line)
+                    else:
+                        import_lines.add(line)
+        for file in [file for file, file_tests in self.test_lines.items() if not file_tests]:
+            del self.test_lines[file]
+        return len(ran_tests)
+
+    def select(
+        self, changes: dict[str, list[tuple[int, int]] | None]
+    ) -> tuple[set[str], list[str]]:
+        """Returns the ids of the tests affected by the changes, and the files not in the index.
+
+        Keyword arguments:
+        changes -- the changed ranges of lines of each file, first and last line included, or
+            None when the whole file changed.
+        """
+        selected: set[str] = set()
+        unknown_files: list[str] = []
+        for file, ranges in changes.items():
+            if file not in self.test_lines and file not in self.import_lines:
+                unknown_files.append(file)
+                continue
+            file_tests = self.test_lines.get(file, {})
+            if ranges is None:
+                selected.update(file_tests)
+                continue
+            changed_lines = {line for start, end in ranges for line in range(start, end + 1)}
+            if not changed_lines.isdisjoint(self.import_lines.get(file, ())):
+                selected.update(file_tests)
+                continue
+            selected.update(
+                test_id
+                for test_id, lines in file_tests.items()
+                if not lines.isdisjoint(changed_lines)
+            )
+        return selected, unknown_files
+
+
+def update_index(config: pytest.Config, cov: coverage.Coverage) -> None:
+    """Adds the tests of a finished coverage run to the index in pytest's cache."""
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        print("Plugin warning[vscode-pytest]: The test impact index needs pytest's cache provider.")
+        return
+    path = get_cache_dir(cache, INDEX_DIR) / INDEX_FILE
+    index = ImpactIndex.load(path)
+    test_count = index.update(cov.get_data(), cov.config.context)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"Plugin warning[vscode-pytest]: Unable to save the test impact index: {e}")
+        return
+    print(f"Plugin info[vscode-pytest]: Recorded the lines of {test_count} tests in {path}")
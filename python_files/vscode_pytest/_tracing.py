@@ -0,0 +1,129 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Records how long the phases of a discovery or a run take, as a Chrome trace.
+
+When TEST_TRACE_ENABLED is "True" the plugin records spans for the collection, the test loop,
+the building of the discovery tree, and the encoding and pipe write of each message. The trace
+is written to pytest's cache in the trace event format, which `chrome://tracing` and Perfetto
+open, and a summary of the phases is printed. When tracing is disabled the plugin has no tracer
+and only checks that it is None where the phases start and messages are sent.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Any, Iterator
+
+import pytest
+
+from ._pytest_compat import get_cache_dir
+
+TRACE_ENV = "TEST_TRACE_ENABLED"
+TRACE_DIR = "vscode-trace"
+
+
+class Tracer:
+    """Collects complete events, with their start and duration in microseconds from creation."""
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.events: list[dict[str, Any]] = []
+        self.pid = os.getpid()
+
+    def add(self, name: str, category: str, start: float, end: float, **args: Any) -> None:
+        """Records an event between two `time.perf_counter` values."""
+        # Appending to a list is atomic, messages can be sent from the result batching timer.
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "phase", **args: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter(), **args)
+
+    def get_summary(self) -> str:
+        """Returns the total time of each phase, and the number, size and time of the messages."""
+        totals: dict[str, float] = {}
+        message_count = message_bytes = 0
+        for event in self.events:
+            totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"]
+            if event["name"] == "encode":
+                message_count += 1
+                message_bytes += event["args"]["bytes"]
+        phases = ", ".join(
+            f"{name} {duration / 1e6:.3f}s"
+            for name, duration in totals.items()
+            if name not in ("encode", "pipe write")
+        )
+        return (
+            f"{phases}; {message_count} messages of {message_bytes} bytes, "
+            f"encoded in {totals.get('encode', 0.0) / 1e6:.3f}s, "
+            f"written in {totals.get('pipe write', 0.0) / 1e6:.3f}s"
+        )
+
+    def write(self, path: pathlib.Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+class TracingPlugin:
+    """Records the phases of the session and writes the trace when pytest is done."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionstart(self) -> None:
+        # Loading the plugins, conftest files and configuration, since the plugin was imported.
+        self.tracer.add("startup", "phase", self.tracer.origin, time.perf_counter())
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_collection(self) -> Iterator[None]:
+        with self.tracer.span("collection"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtestloop(self) -> Iterator[None]:
+        with self.tracer.span("run"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_sessionfinish(self) -> Iterator[None]:
+        with self.tracer.span("sessionfinish"):
+            yield
+
+    def pytest_unconfigure(self, config: pytest.Config) -> None:
+        cache = getattr(config, "cache", None)
+        folder = (
+            get_cache_dir(cache, TRACE_DIR)
+            if cache is not None
+            else pathlib.Path(tempfile.gettempdir())
+        )
+        # Each pytest-xdist worker writes its own trace next to the one of the main process.
+        worker_id = getattr(config, "workerinput", {}).get("workerid")
+        path = folder / (f"trace-{worker_id}.json" if worker_id else "trace.json")
+        try:
+            self.tracer.write(path)
+        except OSError as e:
+            print(f"Plugin warning[vscode-pytest]: Unable to write the trace: {e}")
+            return
+        print(f"Plugin info[vscode-pytest]: Trace written to {path}: {self.tracer.get_summary()}")
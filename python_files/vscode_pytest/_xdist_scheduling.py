@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""pytest-xdist schedulers that balance the work of the workers using the duration history.
+
+The work units of `--dist loadscope` and `--dist loadfile`, the tests of a module or class and
+the tests of a file, are handed out longest first (LPT scheduling). Each idle worker receives
+the longest remaining unit, so long units do not start last while the other workers idle.
+
+pytest-xdist is an optional dependency, it is only imported by `make_scheduler`. The schedulers
+extend private methods of pytest-xdist's, so `make_scheduler` checks that they still have them
+and otherwise lets pytest-xdist use its own scheduler.
+"""
+
+from __future__ import annotations
+
+import inspect
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+if TYPE_CHECKING:
+    import pathlib
+
+# Returns the expected duration of a test in seconds from its node id, or None without history.
+TestDurations = Callable[[str], "float | None"]
+
+
+def get_absolute_node_id(rootpath: pathlib.Path, nodeid: str) -> str:
+    """Returns the absolute test id of a node id that is relative to the rootdir."""
+    file_part, _, rest = nodeid.partition("::")
+    absolute_path = str(rootpath / file_part)
+    return f"{absolute_path}::{rest}" if rest else absolute_path
+
+
+def get_work_unit_duration(
+    nodeids: Iterable[str], get_duration: TestDurations, default_duration: float
+) -> float:
+    """Returns the expected duration of the tests of a work unit."""
+    total = 0.0
+    for nodeid in nodeids:
+        duration = get_duration(nodeid)
+        total += default_duration if duration is None else duration
+    return total
+
+
+def sort_work_units(
+    work_units: dict[str, dict[str, bool]], get_duration: TestDurations, default_duration: float
+) -> dict[str, dict[str, bool]]:
+    """Returns the work units sorted by their expected duration, longest first.
+
+    Units with the same expected duration keep their order.
+
+    Keyword arguments:
+    work_units -- the node ids of the tests of each work unit, keyed by scope.
+    get_duration -- returns the expected duration of a test, or None if it has no history.
+    default_duration -- the expected duration of the tests without history.
+    """
+    durations = {
+        scope: get_work_unit_duration(nodeids, get_duration, default_duration)
+        for scope, nodeids in work_units.items()
+    }
+    return dict(sorted(work_units.items(), key=lambda item: -durations[item[0]]))
+
+
+def is_supported_scheduler(base: type) -> bool:
+    """Checks that a pytest-xdist scheduler has the private methods the schedulers extend."""
+    assign_work_unit = getattr(base, "_assign_work_unit", None)
+    if not callable(assign_work_unit) or not callable(getattr(base, "remove_node", None)):
+        return False
+    try:
+        parameters = list(inspect.signature(assign_work_unit).parameters)
+    except (TypeError, ValueError):
+        return False
+    return parameters == ["self", "node"]
+
+
+def make_scheduler(config, log, get_duration: TestDurations, default_duration: float):
+    """Returns a pytest-xdist scheduler for `--dist loadscope` or `--dist loadfile`.
+
+    Returns None for the other distribution modes, or if the installed pytest-xdist schedulers
+    cannot be extended, so that pytest-xdist uses its own scheduler.
+    """
+    from collections import OrderedDict
+
+    from xdist.scheduler import LoadFileScheduling, LoadScopeScheduling
+
+    schedulers: dict[str, type[Any]] = {
+        "loadscope": LoadScopeScheduling,
+        "loadfile": LoadFileScheduling,
+    }
+    base = schedulers.get(config.getvalue("dist"))
+    if base is None:
+        return None
+    if not is_supported_scheduler(base):
+        print(
+            "Plugin warning[vscode-pytest]: The installed pytest-xdist scheduler is not "
+            "supported, its work units are not balanced using the duration history."
+        )
+        return None
+
+    class DurationBalancedScheduling(base):
+        """Assigns the work units of the base scheduler longest first."""
+
+        def __init__(self, config, log=None):
+            super().__init__(config, log)
+            self.workqueue_sorted = False
+
+        def _assign_work_unit(self, node):
+            # The base scheduler builds the work queue in collection order when the collection
+            # is complete, sort it before the first unit is assigned.
+            if not self.workqueue_sorted and isinstance(getattr(self, "workqueue", None), dict):
+                self.workqueue = OrderedDict(
+                    sort_work_units(self.workqueue, get_duration, default_duration)
+                )
+                self.workqueue_sorted = True
+            super()._assign_work_unit(node)
+
+        def remove_node(self, node):
+            # The unfinished work of a crashed node is added back to the work queue.
+            crashitem = super().remove_node(node)
+            self.workqueue_sorted = False
+            return crashitem
+
+    return DurationBalancedScheduling(config, log)
@@ -0,0 +1,133 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Prints the ids of the tests affected by a change, from the test impact index.
+
+The index is recorded by running the tests with coverage and TEST_IMPACT_INDEX_ENABLED=True.
+The changes are the output of `git diff -U0`, or changed files and line ranges as arguments:
+
+    git diff -U0 | python -m vscode_pytest.affected_tests --diff - --output ids.txt
+    python -m vscode_pytest.affected_tests src/module.py:10-20 src/other.py
+
+The ids are written one per line, like the RUN_TEST_IDS_PIPE file that the test ids of a run are
+read from. Line numbers are those of the files when the index was recorded, which are the lines
+of the old side of a diff against the indexed revision. Changed files that are not in the index,
+like new test files, are printed and make the command exit with 2, they need a full run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import pathlib
+import re
+import sys
+from typing import Sequence
+
+from ._test_impact import DEFAULT_INDEX_PATH, IMPACT_ENV, ImpactIndex
+
+HUNK_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+
+def parse_diff(diff: str, root: pathlib.Path) -> dict[str, list[tuple[int, int]] | None]:
+    """Returns the changed line ranges of each file of a unified diff, on its old side.
+
+    Lines inserted between two lines count as a change of both, deleted and new files as a
+    change of the whole file.
+    """
+    changes: dict[str, list[tuple[int, int]] | None] = {}
+    lines = diff.splitlines()
+    file: str | None = None
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        index += 1
+        if line.startswith("--- ") and index < len(lines) and lines[index].startswith("+++ "):
+            old_path = line[4:].strip()
+            new_path = lines[index][4:].strip()
+            index += 1
+            path = new_path if old_path == "/dev/null" else old_path
+            # git prefixes the paths with a/ and b/, unless diff.noprefix is set.
+            if path[:2] in ("a/", "b/") and not (root / path).exists():
+                path = path[2:]
+            file = os.fspath((root / path).resolve())
+            if "/dev/null" in (old_path, new_path):
+                changes[file] = None
+            else:
+                changes.setdefault(file, [])
+        elif file is not None and (match := HUNK_PATTERN.match(line)):
+            old_count = int(match.group(2) or 1)
+            new_count = int(match.group(3) or 1)
+            # The lines of the hunk are skipped, removed lines can look like file headers.
+            remaining = old_count + new_count
+            while remaining and index < len(lines):
+                if not lines[index].startswith("\\"):
+                    remaining -= 1
+                index += 1
+            ranges = changes[file]
+            if ranges is not None:
+                start = int(match.group(1))
+                if old_count == 0:
+                    ranges.append((start, start + 1))
+                else:
+                    ranges.append((start, start + old_count - 1))
+    return changes
+
+
+def parse_change(change: str, root: pathlib.Path) -> tuple[str, tuple[int, int] | None]:
+    """Returns the file and the line range of a `path[:start[-end]]` argument."""
+    path, _, lines = change.rpartition(":")
+    if not path or not re.fullmatch(r"\d+(-\d+)?", lines):
+        return os.fspath((root / change).resolve()), None
+    start, _, end = lines.partition("-")
+    return os.fspath((root / path).resolve()), (int(start), int(end or start))
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m vscode_pytest.affected_tests",
+        description="Prints the ids of the tests affected by changed files and lines.",
+    )
+    parser.add_argument(
+        "changes", nargs="*", help="changed files, as path, path:line or path:start-end"
+    )
+    parser.add_argument("--diff", help="a file with the output of `git diff -U0`, - for stdin")
+    parser.add_argument("--index", type=pathlib.Path, default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--root", type=pathlib.Path, default=pathlib.Path.cwd())
+    parser.add_argument("--output", type=pathlib.Path, help="the file to write the ids to")
+    args = parser.parse_args(argv)
+
+    if not args.index.exists():
+        print(
+            f"No test impact index at {args.index}, run the tests with coverage and {IMPACT_ENV}=True.",
+            file=sys.stderr,
+        )
+        return 1
+    changes: dict[str, list[tuple[int, int]] | None] = {}
+    if args.diff:
+        diff = (
+            sys.stdin.read()
+            if args.diff == "-"
+            else pathlib.Path(args.diff).read_text(encoding="utf-8")
+        )
+        changes.update(parse_diff(diff, args.root))
+    for change in args.changes:
+        file, line_range = parse_change(change, args.root)
+        ranges = changes.setdefault(file, [])
+        if line_range is None or ranges is None:
+            changes[file] = None
+        else:
+            ranges.append(line_range)
+
+    selected, unknown_files = ImpactIndex.load(args.index).select(changes)
+    output = "".join(f"{test_id}\n" for test_id in sorted(selected))
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    else:
+        sys.stdout.write(output)
+    for file in unknown_files:
+        print(f"Not in the test impact index: {file}", file=sys.stderr)
+    return 2 if unknown_files else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""History of the durations and outcomes of the tests run by vscode_pytest.
+
+When TEST_DURATION_HISTORY_ENABLED is "True", each finished test appends one JSON line to a file
+in pytest's cache directory of the workspace.
+The shards of a run append to the same file, so it is locked while it is written.
+Running this module prints the slowest tests and the tests whose durations regressed:
+
+    python vscode_pytest/duration_history.py --rootdir <workspace> --slowest 20 --regressed
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import pathlib
+import sys
+import tempfile
+from typing import Iterable, Iterator, TypedDict, cast
+
+HISTORY_DIR = "vscode_test_history"
+HISTORY_FILE = "durations.jsonl"
+# The history is compacted to the latest runs of each test once the file reaches this size.
+MAX_HISTORY_BYTES = 32 * 1024 * 1024
+MAX_RECORDS_PER_TEST = 20
+
+
+class TestRunRecord(TypedDict):
+    """The durations, in seconds, and outcome of one run of a test."""
+
+    test: str  # The absolute test id.
+    outcome: str  # "passed", "failed" or "skipped".
+    setup: float
+    call: float
+    teardown: float
+    time: float  # When the test finished, in seconds since the epoch.
+
+
+def get_history_path(cache_dir: pathlib.Path) -> pathlib.Path:
+    """Returns the path of the history file in pytest's cache directory.
+
+    It matches the directory `get_cache_dir(config.cache, HISTORY_DIR)` creates.
+    """
+    return cache_dir / "d" / HISTORY_DIR / HISTORY_FILE
+
+
+def get_total_duration(record: TestRunRecord) -> float:
+    return record["setup"] + record["call"] + record["teardown"]
+
+
+def read_history(history_path: pathlib.Path) -> Iterator[TestRunRecord]:
+    """Yields the records of the history file, oldest first, skipping lines that are invalid."""
+    try:
+        with history_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "test" in record:
+                    yield cast("TestRunRecord", record)
+    except OSError:
+        return
+
+
+def get_records_by_test(records: Iterable[TestRunRecord]) -> dict[str, list[TestRunRecord]]:
+    """Groups records by test id, keeping them in order."""
+    records_by_test: dict[str, list[TestRunRecord]] = {}
+    for record in records:
+        records_by_test.setdefault(record["test"], []).append(record)
+    return records_by_test
+
+
+@contextlib.contextmanager
+def lock_history(history_path: pathlib.Path) -> Iterator[None]:
+    """Holds an exclusive lock on the history file, waiting for other processes to release it."""
+    lock_path = history_path.with_name(f"{history_path.name}.lock")
+    with lock_path.open("a+b") as lock_file:
+        if sys.platform == "win32":
+            import msvcrt
+
+            # Locks the first byte, retrying for 10 seconds before raising an OSError.
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def append_history(history_path: pathlib.Path, records: list[TestRunRecord]) -> None:
+    """Appends records to the history file, compacting it first if it grew too large."""
+    if not records:
+        return
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_history(history_path):
+        try:
+            compact = history_path.stat().st_size >= MAX_HISTORY_BYTES
+        except OSError:
+            compact = False
+        if compact:
+            compact_history(history_path)
+        with history_path.open("a", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def compact_history(history_path: pathlib.Path) -> None:
+    """Keeps the latest MAX_RECORDS_PER_TEST records of each test, the history must be locked."""
+    kept = [
+        record
+        for test_records in get_records_by_test(read_history(history_path)).values()
+        for record in test_records[-MAX_RECORDS_PER_TEST:]
+    ]
+    kept.sort(key=lambda record: record["time"])
+    fd, temp_name = tempfile.mkstemp(
+        prefix=f"{history_path.name}.", suffix=".tmp", dir=history_path.parent
+    )
+    try:
+        with open(fd, "w", encoding="utf-8") as f:  # noqa: PTH123
+            f.writelines(json.dumps(record) + "\n" for record in kept)
+        pathlib.Path(temp_name).replace(history_path)
+    except BaseException:
+        pathlib.Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Returns the nearest-rank percentile of a non-empty list of values."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def get_expected_duration(test_records: list[TestRunRecord], recent_runs: int = 5) -> float:
+    """Returns the median total duration of the latest runs of a test."""
+    return percentile([get_total_duration(record) for record in test_records[-recent_runs:]], 50)
+
+
+def get_history_order(
+    test_ids: list[str], records_by_test: dict[str, list[TestRunRecord]], *, longest_first: bool
+) -> list[int]:
+    """Returns the indices of the tests in the order they should run.
+
+    The tests that failed in their latest run go first, the other tests keep their order. With
+    `longest_first`, both groups are sorted by their expected duration, longest first, so that
+    parallel workers do not end up waiting for a long test that started last. Tests without
+    history are expected to take the median duration of the tests with history.
+
+    Keyword arguments:
+    test_ids -- the absolute ids of the tests, in collection order.
+    records_by_test -- the history records grouped by test id.
+    longest_first -- whether to sort the tests by expected duration.
+    """
+    failed: list[bool] = []
+    durations: list[float | None] = []
+    for test_id in test_ids:
+        test_records = records_by_test.get(test_id)
+        failed.append(bool(test_records) and test_records[-1]["outcome"] == "failed")
+        durations.append(get_expected_duration(test_records) if test_records else None)
+    if not longest_first:
+        return sorted(range(len(test_ids)), key=lambda index: not failed[index])
+
+    known_durations = [duration for duration in durations if duration is not None]
+    default_duration = percentile(known_durations, 50) if known_durations else 0.0
+    expected_durations = [
+        default_duration if duration is None else duration for duration in durations
+    ]
+    return sorted(
+        range(len(test_ids)), key=lambda index: (not failed[index], -expected_durations[index])
+    )
+
+
+def get_slowest_tests(
+    records_by_test: dict[str, list[TestRunRecord]], count: int
+) -> list[tuple[str, float]]:
+    """Returns the ids and latest total durations of the slowest tests, slowest first."""
+    latest = [
+        (test_id, get_total_duration(test_records[-1]))
+        for test_id, test_records in records_by_test.items()
+    ]
+    latest.sort(key=lambda item: item[1], reverse=True)
+    return latest[:count]
+
+
+def get_regressed_tests(
+    records_by_test: dict[str, list[TestRunRecord]],
+    recent_runs: int = 5,
+    factor: float = 1.5,
+    min_increase: float = 0.1,
+) -> list[tuple[str, float, float]]:
+    """Returns the tests whose p95 duration over their recent runs regressed.
+
+    The p95 of the latest `recent_runs` runs is compared with the p95 of the runs before them,
+    a test regressed if it grew by `factor` and by at least `min_increase` seconds.
+
+    Returns:
+        The ids of the regressed tests with their previous and recent p95 durations, sorted by
+        the largest increase first.
+    """
+    regressed: list[tuple[str, float, float]] = []
+    for test_id, test_records in records_by_test.items():
+        durations = [get_total_duration(record) for record in test_records]
+        if len(durations) <= recent_runs:
+            continue
+        previous_p95 = percentile(durations[-MAX_RECORDS_PER_TEST:-recent_runs], 95)
+        recent_p95 = percentile(durations[-recent_runs:], 95)
+        if recent_p95 >= previous_p95 * factor and recent_p95 - previous_p95 >= min_increase:
+            regressed.append((test_id, previous_p95, recent_p95))
+    regressed.sort(key=lambda item: item[2] - item[1], reverse=True)
+    return regressed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0] if __doc__ else None)
+    parser.add_argument("--rootdir", default=os.fspath(pathlib.Path.cwd()), help="The rootdir.")
+    parser.add_argument(
+        "--cache-dir", default=".pytest_cache", help="pytest's cache directory, if configured."
+    )
+    parser.add_argument("--slowest", type=int, default=0, help="Print the N slowest tests.")
+    parser.add_argument(
+        "--regressed", action="store_true", help="Print the tests whose p95 duration regressed."
+    )
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    history_path = get_history_path(pathlib.Path(args.rootdir, args.cache_dir))
+    records_by_test = get_records_by_test(read_history(history_path))
+    result: dict[str, list] = {}
+    if args.slowest:
+        result["slowest"] = get_slowest_tests(records_by_test, args.slowest)
+    if args.regressed:
+        result["regressed"] = get_regressed_tests(records_by_test)
+
+    if args.json:
+        print(json.dumps(result))
+        return 0
+    for test_id, duration in result.get("slowest", []):
+        print(f"{duration:10.3f}s  {test_id}")
+    for test_id, previous_p95, recent_p95 in result.get("regressed", []):
+        print(f"{previous_p95:10.3f}s -> {recent_p95:.3f}s  {test_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
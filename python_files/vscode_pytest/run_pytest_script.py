@@ -1,12 +1,11 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
+import importlib.util
 import os
 import pathlib
 import sys
 import sysconfig
 
-import pytest
-
 # Adds the scripts directory to the PATH as a workaround for enabling shell for test execution.
 path_var_name = "PATH" if "PATH" in os.environ else "Path"
 os.environ[path_var_name] = (
@@ -19,8 +18,67 @@ sys.path.append(os.fspath(script_dir / "lib" / "python"))
 
 
 def run_pytest(args):
+    # pytest is imported when it runs in this process, runs in the fork server do not need it.
+    import pytest
+
     arg_array = ["-p", "vscode_pytest", *args]
-    pytest.main(arg_array)
+    return pytest.main(arg_array)
+
+
+def import_fork_server():
+    """Import the fork server client without the vscode_pytest package, which imports pytest."""
+    path = script_dir / "vscode_pytest" / "_fork_server.py"
+    spec = importlib.util.spec_from_file_location("vscode_pytest_fork_server", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Unable to import the fork server from {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def get_test_files(ids):
+    """Get the unique existing files of the test ids, the arguments when selecting by file.
+
+    The plugin deselects the collected tests that are not in the ids, and reports the ids of
+    the missing files as not found.
+    """
+    files = dict.fromkeys(test_id.split("::")[0] for test_id in ids if test_id)
+    return [file for file in files if os.path.exists(file)]  # noqa: PTH110
+
+
+def can_run_sharded(args, is_coverage_run):
+    """Check if the tests can run in parallel shards.
+
+    Coverage runs are not sharded since each shard would send its own coverage, neither are
+    debug runs or runs that use pytest-xdist.
+    """
+    return (
+        hasattr(os, "mkfifo")
+        and bool(os.environ.get("TEST_RUN_SHARDS"))
+        and bool(os.environ.get("TEST_RUN_PIPE"))
+        # Shards run this script too, they must not be sharded again.
+        and "TEST_RUN_SHARD" not in os.environ
+        and not is_coverage_run
+        and "debugpy" not in sys.modules
+        and not any(
+            arg in ("-n", "--numprocesses") or arg.startswith("--numprocesses=") for arg in args
+        )
+    )
+
+
+def can_use_fork_server(is_coverage_run):
+    """Check if the tests can run in a fork of the warm fork server.
+
+    Coverage runs do not use it since the preloaded modules were imported before coverage
+    started, neither do debug runs or shards, which would all wait for the same server.
+    """
+    return (
+        os.environ.get("TEST_FORK_SERVER_ENABLED") == "True"
+        and hasattr(os, "fork")
+        and "TEST_RUN_SHARD" not in os.environ
+        and not is_coverage_run
+        and "debugpy" not in sys.modules
+    )
 
 
 # This script handles running pytest via pytest.main(). It is called via run in the
@@ -55,18 +113,48 @@ if __name__ == "__main__":
         try:
             # Read the test ids from the file and run pytest.
             ids = ids_path.read_text(encoding="utf-8").splitlines()
-            arg_array = ["-p", "vscode_pytest", *args, *ids]
-            print("Running pytest with args: " + str(arg_array))
-            pytest.main(arg_array)
+            run_ids = ids
+            if os.environ.get("TEST_RUN_SELECT_BY_FILE") == "True":
+                # Without any existing file pytest would collect the whole workspace.
+                run_ids = get_test_files(ids) or ids
+            exit_code = None
+            if can_run_sharded(args, is_coverage_run == "True"):
+                from vscode_pytest._sharding import get_shard_count, run_sharded, split_into_shards
+
+                shard_count = get_shard_count(os.environ.get("TEST_RUN_SHARDS"))
+                shards = split_into_shards(ids, shard_count)
+                if len(shards) > 1:
+                    print(f"Running pytest in {len(shards)} shards with args: {args}")
+                    exit_code = run_sharded(
+                        pathlib.Path(__file__), args, shards, os.environ["TEST_RUN_PIPE"]
+                    )
+                    print(f"Pytest shards finished with exit code: {exit_code}")
+            if exit_code is None and can_use_fork_server(is_coverage_run == "True"):
+                try:
+                    fork_server = import_fork_server()
+                except ImportError as e:
+                    print(f"Error[vscode-pytest]: unable to use the fork server: {e}")
+                else:
+                    if fork_server.is_supported():
+                        exit_code = fork_server.run_in_fork_server(args, run_ids)
+            if exit_code is None:
+                print("Running pytest with args: " + str(["-p", "vscode_pytest", *args, *run_ids]))
+                exit_code = run_pytest([*args, *run_ids])
         except Exception as e:
             print("Error[vscode-pytest]: unable to read testIds from temp file" + str(e))
-            run_pytest(args)
+            exit_code = run_pytest(args)
         finally:
             # Delete the test ids temp file.
             try:
                 ids_path.unlink()
             except Exception as e:
                 print("Error[vscode-pytest]: unable to delete temp file" + str(e))
+        # Shards report the exit code of pytest to the process that merges their results.
+        if "TEST_RUN_SHARD" in os.environ:
+            sys.exit(exit_code)
+        # The fork server reports a child killed by a signal with a negative exit code.
+        if exit_code < 0:
+            sys.exit(1)
     else:
         print("Error[vscode-pytest]: RUN_TEST_IDS_PIPE env var is not set.")
         run_pytest(args)
@@ -19,19 +19,34 @@ import {
 import * as util from 'util';
 import {
     CoveragePayload,
+    DiscoveredTestNode,
     DiscoveredTestPayload,
+    DiscoveryDelta,
     ExecutionTestPayload,
     FileCoverageMetrics,
     ITestResultResolver,
 } from './types';
 import { TestProvider } from '../../types';
-import { traceError, traceVerbose } from '../../../logging';
+import { traceError, traceInfo, traceVerbose } from '../../../logging';
 import { Testing } from '../../../common/utils/localize';
 import { clearAllChildren, createErrorTestItem, getTestCaseNodes } from './testItemUtilities';
 import { sendTelemetryEvent } from '../../../telemetry';
 import { EventName } from '../../../telemetry/constants';
 import { splitLines } from '../../../common/stringUtils';
-import { buildErrorNodeOptions, populateTestTree, splitTestNameWithRegex } from './utils';
+import {
+    buildErrorNodeOptions,
+    decodeCoveragePayload,
+    decodeDiscoveryPayload,
+    formatCollectionTiming,
+    formatFixtureProfile,
+    getDurationMs,
+    getFileNodeIds,
+    mergeTestTree,
+    populateTestTree,
+    readTestPage,
+    removeTestItem,
+    splitTestNameWithRegex,
+} from './utils';
 
 export class PythonResultResolver implements ITestResultResolver {
     testController: TestController;
@@ -48,6 +63,18 @@ export class PythonResultResolver implements ITestResultResolver {
 
     public detailedCoverageMap = new Map<string, FileCoverageDetail[]>();
 
+    // Ids of the items merged so far while a streamed discovery is in progress, undefined otherwise.
+    private streamedItemIds: Set<string> | undefined;
+
+    private streamedRootIds = new Set<string>();
+
+    public discoveryCacheId: string | undefined;
+
+    public lazyNodes = new Map<string, { item: TestItem; cursor: string }>();
+
+    // Loads of the cases of lazy items, kept so that an item is only loaded once.
+    private lazyNodeLoads = new Map<string, Promise<void>>();
+
     constructor(testController: TestController, testProvider: TestProvider, private workspaceUri: Uri) {
         this.testController = testController;
         this.testProvider = testProvider;
@@ -67,7 +94,15 @@ export class PythonResultResolver implements ITestResultResolver {
 
     public _resolveDiscovery(payload: DiscoveredTestPayload, token?: CancellationToken): void {
         const workspacePath = this.workspaceUri.fsPath;
-        const rawTestData = payload as DiscoveredTestPayload;
+        const rawTestData = decodeDiscoveryPayload(payload as DiscoveredTestPayload);
+        if (rawTestData.stream === 'partial') {
+            // Errors are only reported on the payload that completes the stream.
+            this.resolveDiscoveryStreamPart(rawTestData, token);
+            return;
+        }
+        if (rawTestData.timing) {
+            traceInfo(formatCollectionTiming(rawTestData.timing));
+        }
         // Check if there were any errors in the discovery process.
         if (rawTestData.status === 'error') {
             const testingErrorConst =
@@ -95,7 +130,11 @@ export class PythonResultResolver implements ITestResultResolver {
             // remove error node only if no errors exist.
             this.testController.items.delete(`DiscoveryError:${workspacePath}`);
         }
-        if (rawTestData.tests || rawTestData.tests === null) {
+        if (rawTestData.stream === 'complete') {
+            this.completeDiscoveryStream(rawTestData.deselected ?? []);
+        } else if (rawTestData.delta) {
+            this.resolveDiscoveryDelta(rawTestData.delta, token);
+        } else if (rawTestData.tests || rawTestData.tests === null) {
             // if any tests exist, they should be populated in the test tree, regardless of whether there were errors or not.
             // parse and insert test data.
 
@@ -103,11 +142,15 @@ export class PythonResultResolver implements ITestResultResolver {
             this.runIdToTestItem.clear();
             this.runIdToVSid.clear();
             this.vsIdToRunId.clear();
+            this.lazyNodes.clear();
+            this.lazyNodeLoads.clear();
 
             // If the test root for this folder exists: Workspace refresh, update its children.
             // Otherwise, it is a freshly discovered workspace, and we need to create a new test root and populate the test tree.
             populateTestTree(this.testController, rawTestData.tests, undefined, this, token);
         }
+        // A tree that was only partly updated can no longer be patched by the next delta.
+        this.discoveryCacheId = token?.isCancellationRequested ? undefined : rawTestData.cache_id;
 
         sendTelemetryEvent(EventName.UNITTEST_DISCOVERY_DONE, undefined, {
             tool: this.testProvider,
@@ -115,11 +158,136 @@ export class PythonResultResolver implements ITestResultResolver {
         });
     }
 
+    /**
+     * Adds the cases of a parametrized function that was discovered without them, reading one
+     * page at a time. Does nothing for other items.
+     */
+    public resolveLazyChildren(item: TestItem, token?: CancellationToken): Promise<void> {
+        let load = this.lazyNodeLoads.get(item.id);
+        const lazyNode = this.lazyNodes.get(item.id);
+        if (!load && lazyNode) {
+            load = this.loadLazyChildren(lazyNode.item, lazyNode.cursor, token);
+            this.lazyNodeLoads.set(item.id, load);
+        }
+        return load ?? Promise.resolve();
+    }
+
+    /**
+     * Adds the cases of the lazy parametrized functions under the given items, so they can be run.
+     */
+    public async resolveLazyDescendants(items: readonly TestItem[], token?: CancellationToken): Promise<void> {
+        const lazyItems = Array.from(this.lazyNodes.values())
+            .map(({ item }) => item)
+            .filter((lazyItem) => items.some((item) => lazyItem.id.startsWith(item.id)));
+        await Promise.all(lazyItems.map((item) => this.resolveLazyChildren(item, token)));
+    }
+
+    private async loadLazyChildren(item: TestItem, cursor: string, token?: CancellationToken): Promise<void> {
+        const functionNode: DiscoveredTestNode = {
+            path: item.uri?.fsPath ?? '',
+            name: item.label,
+            type_: 'function',
+            id_: item.id,
+            children: [],
+        };
+        let next: string | null = cursor;
+        item.busy = true;
+        try {
+            while (next && !token?.isCancellationRequested) {
+                const page = await readTestPage(next);
+                populateTestTree(this.testController, { ...functionNode, children: page.children }, item, this, token);
+                next = page.next;
+            }
+            this.lazyNodes.delete(item.id);
+        } catch (ex) {
+            traceError(`Could not load the tests of ${item.id}, refresh the tests to update them.\r\n`, ex);
+        } finally {
+            item.busy = false;
+            if (this.lazyNodes.has(item.id)) {
+                // Cancelled or failed, the next expansion tries again.
+                this.lazyNodeLoads.delete(item.id);
+            }
+        }
+    }
+
+    /**
+     * Patches the test tree with the files that changed since the cached discovery it was built from.
+     */
+    private resolveDiscoveryDelta(delta: DiscoveryDelta, token?: CancellationToken): void {
+        delta.removed.forEach((id) => removeTestItem(this.testController, id, this));
+        // Remove the previous version of updated files so that tests which no longer exist are dropped.
+        delta.updated.forEach((tests) =>
+            getFileNodeIds(tests).forEach((id) => removeTestItem(this.testController, id, this)),
+        );
+        [...delta.added, ...delta.updated].forEach((tests) => {
+            if (!token?.isCancellationRequested) {
+                mergeTestTree(this.testController, tests, undefined, this, new Set<string>(), token);
+            }
+        });
+    }
+
+    private resolveDiscoveryStreamPart(payload: DiscoveredTestPayload, token?: CancellationToken): void {
+        if (!payload.tests) {
+            return;
+        }
+        if (this.streamedItemIds === undefined) {
+            // First payload of a new stream, clear the mappings of the previous discovery.
+            this.runIdToTestItem.clear();
+            this.runIdToVSid.clear();
+            this.vsIdToRunId.clear();
+            this.streamedItemIds = new Set<string>();
+            this.streamedRootIds.clear();
+        }
+        this.streamedRootIds.add(payload.tests.path);
+        mergeTestTree(this.testController, payload.tests, undefined, this, this.streamedItemIds, token);
+    }
+
+    /**
+     * Removes items which were not part of the completed stream, either because they no longer exist
+     * or because they were deselected after being streamed.
+     */
+    private completeDiscoveryStream(deselected: string[]): void {
+        const streamedItemIds = this.streamedItemIds ?? new Set<string>();
+        deselected.forEach((id) => streamedItemIds.delete(id));
+        this.streamedRootIds.forEach((rootId) => {
+            const root = this.testController.items.get(rootId);
+            if (root) {
+                this.pruneUnstreamedChildren(root, streamedItemIds);
+            }
+        });
+        this.streamedItemIds = undefined;
+        this.streamedRootIds.clear();
+    }
+
+    private pruneUnstreamedChildren(item: TestItem, streamedItemIds: Set<string>): void {
+        const idsToRemove: string[] = [];
+        item.children.forEach((child) => {
+            if (streamedItemIds.has(child.id)) {
+                this.pruneUnstreamedChildren(child, streamedItemIds);
+                // Remove folders, files and classes left without any tests.
+                if (child.canResolveChildren && child.children.size === 0) {
+                    idsToRemove.push(child.id);
+                }
+            } else {
+                idsToRemove.push(child.id);
+            }
+        });
+        idsToRemove.forEach((id) => {
+            item.children.delete(id);
+            const runId = this.vsIdToRunId.get(id);
+            if (runId !== undefined) {
+                this.runIdToTestItem.delete(runId);
+                this.runIdToVSid.delete(runId);
+                this.vsIdToRunId.delete(id);
+            }
+        });
+    }
+
     public resolveExecution(payload: ExecutionTestPayload | CoveragePayload, runInstance: TestRun): void {
         if ('coverage' in payload) {
-            // coverage data is sent once per connection
+            // coverage data is sent once per connection, or in chunks of files when encoded as ranges
             traceVerbose('Coverage data received.');
-            this._resolveCoverage(payload as CoveragePayload, runInstance);
+            this._resolveCoverage(decodeCoveragePayload(payload as CoveragePayload), runInstance);
         } else {
             this._resolveExecution(payload as ExecutionTestPayload, runInstance);
         }
@@ -316,7 +484,12 @@ export class PythonResultResolver implements ITestResultResolver {
             if (foundItem.range) {
                 message.location = new Location(foundItem.uri, foundItem.range);
             }
-            runInstance.errored(foundItem, message);
+            const duration = getDurationMs(testItem);
+            if (duration === undefined) {
+                runInstance.errored(foundItem, message);
+            } else {
+                runInstance.errored(foundItem, message, duration);
+            }
         }
     }
 
@@ -339,20 +512,30 @@ export class PythonResultResolver implements ITestResultResolver {
             if (foundItem.range) {
                 message.location = new Location(foundItem.uri, foundItem.range);
             }
-            runInstance.failed(foundItem, message);
+            const duration = getDurationMs(testItem);
+            if (duration === undefined) {
+                runInstance.failed(foundItem, message);
+            } else {
+                runInstance.failed(foundItem, message, duration);
+            }
         }
     }
 
     /**
      * Handle test items that passed during execution
      */
-    private handleTestSuccess(keyTemp: string, runInstance: TestRun): void {
+    private handleTestSuccess(keyTemp: string, testItem: any, runInstance: TestRun): void {
         const grabTestItem = this.runIdToTestItem.get(keyTemp);
 
         if (grabTestItem !== undefined) {
             const foundItem = this.findTestItemByIdEfficient(keyTemp);
             if (foundItem?.uri) {
-                runInstance.passed(grabTestItem);
+                const duration = getDurationMs(testItem);
+                if (duration === undefined) {
+                    runInstance.passed(grabTestItem);
+                } else {
+                    runInstance.passed(grabTestItem, duration);
+                }
             }
         }
     }
@@ -446,7 +629,8 @@ export class PythonResultResolver implements ITestResultResolver {
      */
     public _resolveExecution(payload: ExecutionTestPayload, runInstance: TestRun): void {
         const rawTestExecData = payload as ExecutionTestPayload;
-        if (rawTestExecData !== undefined && rawTestExecData.result !== undefined) {
+        // The result is null on payloads that only carry the tests that were not found or a profile.
+        if (rawTestExecData?.result) {
             for (const keyTemp of Object.keys(rawTestExecData.result)) {
                 const testItem = rawTestExecData.result[keyTemp];
 
@@ -456,7 +640,7 @@ export class PythonResultResolver implements ITestResultResolver {
                 } else if (testItem.outcome === 'failure' || testItem.outcome === 'passed-unexpected') {
                     this.handleTestFailure(keyTemp, testItem, runInstance);
                 } else if (testItem.outcome === 'success' || testItem.outcome === 'expected-failure') {
-                    this.handleTestSuccess(keyTemp, runInstance);
+                    this.handleTestSuccess(keyTemp, testItem, runInstance);
                 } else if (testItem.outcome === 'skipped') {
                     this.handleTestSkipped(keyTemp, runInstance);
                 } else if (testItem.outcome === 'subtest-failure') {
@@ -466,5 +650,16 @@ export class PythonResultResolver implements ITestResultResolver {
                 }
             }
         }
+        // Requested tests that the adapter did not collect, they were renamed or removed since discovery.
+        for (const keyTemp of rawTestExecData?.not_found ?? []) {
+            this.handleTestError(
+                keyTemp,
+                { test: keyTemp, outcome: 'error', message: 'Test not found, refresh the tests to update them.' },
+                runInstance,
+            );
+        }
+        if (rawTestExecData?.fixture_profile) {
+            traceInfo(formatFixtureProfile(rawTestExecData.fixture_profile));
+        }
     }
 }
@@ -147,6 +147,13 @@ export interface ITestResultResolver {
     runIdToTestItem: Map<string, TestItem>;
     vsIdToRunId: Map<string, string>;
     detailedCoverageMap: Map<string, FileCoverageDetail[]>;
+    // Id of the cached discovery the test tree was built from, if discovery is cached.
+    discoveryCacheId?: string;
+    // Items of the parametrized functions whose cases were not loaded yet, with their first page.
+    lazyNodes: Map<string, { item: TestItem; cursor: string }>;
+
+    resolveLazyChildren(item: TestItem, token?: CancellationToken): Promise<void>;
+    resolveLazyDescendants(items: readonly TestItem[], token?: CancellationToken): Promise<void>;
 
     resolveDiscovery(payload: DiscoveredTestPayload, token?: CancellationToken): void;
     resolveExecution(payload: ExecutionTestPayload | CoveragePayload, runInstance: TestRun): void;
@@ -195,13 +202,76 @@ export type DiscoveredTestItem = DiscoveredTestCommon & {
 export type DiscoveredTestNode = DiscoveredTestCommon & {
     children: (DiscoveredTestNode | DiscoveredTestItem)[];
     lineno?: number | string;
+    // Set on parametrized functions whose cases are loaded on demand, `children` is then empty.
+    count?: number;
+    // Path of the first page of the cases, see `DiscoveredTestPage`.
+    cursor?: string;
+};
+
+// A page of the cases of a parametrized function, same as in python_files/vscode_pytest/_discovery_pages.py.
+export type DiscoveredTestPage = {
+    children: DiscoveredTestItem[];
+    // Path of the next page, null on the last page.
+    next: string | null;
 };
 
 export type DiscoveredTestPayload = {
     cwd: string;
+    // The tree is in the compact format when `encoding` is 'v2', see `CompactTestNode`.
     tests?: DiscoveredTestNode;
     status: 'success' | 'error';
     error?: string[];
+    // Set when discovery is streamed, 'partial' payloads carry the subtree of a single file
+    // and a 'complete' payload marks the end of the stream.
+    stream?: 'partial' | 'complete';
+    // Ids of tests that were streamed but then deselected, only set on the 'complete' payload.
+    deselected?: string[];
+    // Set when discovery is cached, the id is passed back with the next discovery to receive a delta.
+    cache_id?: string;
+    // Set instead of tests when only the changes since the previous cached discovery are sent.
+    delta?: DiscoveryDelta;
+    // Set when the tree is sent in the compact format, which is requested with DISCOVERY_ENCODING=v2.
+    encoding?: 'v2';
+    // The path table that the nodes of a compact tree reference by index.
+    paths?: string[];
+    // Set when DISCOVERY_TIMING_REPORT_ENABLED is 'True', the slowest test modules and conftests.
+    timing?: CollectionTiming;
+};
+
+// The collection time of a test module or the import time of a conftest, in seconds.
+export type TimedPath = {
+    path: string;
+    duration: number;
+};
+
+// Same as in python_files/vscode_pytest/_collection_timing.py, `total` is the time of the discovery
+// until the end of the collection and the modules and conftests are the slowest, slowest first.
+export type CollectionTiming = {
+    total: number;
+    modules: TimedPath[];
+    conftests: TimedPath[];
+};
+
+// A node of a tree in the compact 'v2' format, same as in python_files/vscode_pytest/_compact_encoding.py.
+// `path` is an index in the path table, `rid` is the id without the node's path, and `id_` is
+// only set for ids which do not start with the path. Test nodes without a `runID` use their id.
+export type CompactTestNode = {
+    name: string;
+    path: number;
+    type_: DiscoveredTestType;
+    id_?: string;
+    rid?: string;
+    runID?: string;
+    lineno?: number | string;
+    children?: CompactTestNode[];
+};
+
+export type DiscoveryDelta = {
+    // Subtrees of the added and changed files, rooted at the test root.
+    added: DiscoveredTestNode[];
+    updated: DiscoveredTestNode[];
+    // Ids of the files which no longer have tests.
+    removed: string[];
 };
 
 export type CoveragePayload = {
@@ -211,6 +281,10 @@ export type CoveragePayload = {
         [filePathStr: string]: FileCoverageMetrics;
     };
     error: string;
+    // Set when the lines are encoded as ranges, which is requested with COVERAGE_ENCODING=ranges.
+    // The files are then sent in several payloads and the line lists are `gap, length` pairs, same
+    // as in python_files/vscode_pytest/_coverage_encoding.py.
+    encoding?: 'ranges';
 };
 
 // using camel-case for these types to match the python side
@@ -233,8 +307,25 @@ export type ExecutionTestPayload = {
             message?: string;
             traceback?: string;
             subtest?: string;
+            // Duration of the test in seconds, when reported by the adapter.
+            duration?: number;
         };
     };
-    notFound?: string[];
+    not_found?: string[] | null;
+    // Set on the last payload of a run when TEST_FIXTURE_PROFILE_ENABLED is 'True'.
+    fixture_profile?: FixtureProfile;
     error: string;
 };
+
+// The number of setups of a fixture and the time spent in them and in its teardowns, in seconds.
+export type FixtureStats = {
+    count: number;
+    setup: number;
+    teardown: number;
+};
+
+// Same as in python_files/vscode_pytest/_fixture_profiling.py, the fixtures are slowest first.
+export type FixtureProfile = {
+    fixtures: (FixtureStats & { name: string; scope: string; baseid: string })[];
+    scopes: { [scope: string]: FixtureStats };
+};
@@ -9,11 +9,19 @@ import { Message } from 'vscode-jsonrpc';
 import { traceError, traceInfo, traceLog, traceVerbose } from '../../../logging';
 import { DebugTestTag, ErrorTestItemOptions, RunTestTag } from './testItemUtilities';
 import {
+    CollectionTiming,
+    CompactTestNode,
+    CoveragePayload,
     DiscoveredTestItem,
     DiscoveredTestNode,
+    DiscoveredTestPage,
     DiscoveredTestPayload,
     ExecutionTestPayload,
+    FileCoverageMetrics,
+    FixtureProfile,
+    FixtureStats,
     ITestResultResolver,
+    TimedPath,
 } from './types';
 import { Deferred, createDeferred } from '../../../common/utils/async';
 import { createReaderPipe, generateRandomPipeName } from '../../../common/pipes/namedPipes';
@@ -274,16 +282,259 @@ export function populateTestTree(
 
                     testRoot!.children.add(node);
                 }
+                if (child.cursor) {
+                    resultResolver.lazyNodes.set(node.id, { item: node, cursor: child.cursor });
+                }
                 populateTestTree(testController, child, node, resultResolver, token);
             }
         }
     });
 }
 
+function getRangeFromLineno(lineno: number | string | undefined): Range | undefined {
+    if (!lineno) {
+        return undefined;
+    }
+    if (Number(lineno) === 0) {
+        return new Range(new Position(0, 0), new Position(0, 0));
+    }
+    return new Range(new Position(Number(lineno) - 1, 0), new Position(Number(lineno), 0));
+}
+
+/**
+ * Merges a partial test tree into the existing tree, used for streamed discovery payloads.
+ * Unlike populateTestTree, existing items are reused so previously merged children are kept.
+ * The ids of all merged items are added to `mergedIds` so stale items can be pruned once the stream completes.
+ */
+export function mergeTestTree(
+    testController: TestController,
+    testTreeData: DiscoveredTestNode,
+    testRoot: TestItem | undefined,
+    resultResolver: ITestResultResolver,
+    mergedIds: Set<string>,
+    token?: CancellationToken,
+): void {
+    if (!testRoot) {
+        testRoot = testController.items.get(testTreeData.path);
+        if (!testRoot) {
+            testRoot = testController.createTestItem(
+                testTreeData.path,
+                testTreeData.name,
+                Uri.file(testTreeData.path),
+            );
+            testRoot.canResolveChildren = true;
+            testRoot.tags = [RunTestTag, DebugTestTag];
+            testController.items.add(testRoot);
+        }
+    }
+    mergedIds.add(testRoot.id);
+
+    testTreeData.children.forEach((child) => {
+        if (token?.isCancellationRequested) {
+            return;
+        }
+        let node = testRoot!.children.get(child.id_);
+        if (!node) {
+            node = testController.createTestItem(child.id_, child.name, Uri.file(child.path));
+            node.tags = [RunTestTag, DebugTestTag];
+            node.canResolveChildren = !isTestItem(child);
+            testRoot!.children.add(node);
+        }
+        node.range = getRangeFromLineno(child.lineno);
+        mergedIds.add(child.id_);
+        if (isTestItem(child)) {
+            resultResolver.runIdToTestItem.set(child.runID, node);
+            resultResolver.runIdToVSid.set(child.runID, child.id_);
+            resultResolver.vsIdToRunId.set(child.id_, child.runID);
+        } else {
+            mergeTestTree(testController, child, node, resultResolver, mergedIds, token);
+        }
+    });
+}
+
+/**
+ * Removes the item with the given id from the test tree, along with the parents it leaves without children.
+ * Only children whose id is a prefix of the given id are searched, as is the case for the folders containing a file.
+ * Returns whether the item was found.
+ */
+export function removeTestItem(
+    testController: TestController,
+    id: string,
+    resultResolver: ITestResultResolver,
+): boolean {
+    let removed = false;
+    testController.items.forEach((testRoot) => {
+        if (!removed && id.startsWith(testRoot.id)) {
+            removed = removeChildTestItem(testRoot, id, resultResolver);
+        }
+    });
+    return removed;
+}
+
+function removeChildTestItem(parent: TestItem, id: string, resultResolver: ITestResultResolver): boolean {
+    const item = parent.children.get(id);
+    if (item) {
+        removeFromResolverMaps(item, resultResolver);
+        parent.children.delete(id);
+        return true;
+    }
+    let removed = false;
+    parent.children.forEach((child) => {
+        if (!removed && id.startsWith(child.id) && removeChildTestItem(child, id, resultResolver)) {
+            removed = true;
+            if (child.children.size === 0) {
+                parent.children.delete(child.id);
+            }
+        }
+    });
+    return removed;
+}
+
+function removeFromResolverMaps(item: TestItem, resultResolver: ITestResultResolver): void {
+    const runId = resultResolver.vsIdToRunId.get(item.id);
+    if (runId !== undefined) {
+        resultResolver.runIdToTestItem.delete(runId);
+        resultResolver.runIdToVSid.delete(runId);
+        resultResolver.vsIdToRunId.delete(item.id);
+    }
+    item.children.forEach((child) => removeFromResolverMaps(child, resultResolver));
+}
+
+/**
+ * Returns the ids of the file nodes in a discovered test tree.
+ */
+export function getFileNodeIds(testTreeData: DiscoveredTestNode): string[] {
+    if (testTreeData.type_ === 'file') {
+        return [testTreeData.id_];
+    }
+    const ids: string[] = [];
+    testTreeData.children.forEach((child) => {
+        if (!isTestItem(child)) {
+            ids.push(...getFileNodeIds(child));
+        }
+    });
+    return ids;
+}
+
 function isTestItem(test: DiscoveredTestNode | DiscoveredTestItem): test is DiscoveredTestItem {
     return test.type_ === 'test';
 }
 
+/**
+ * Reads a page of the cases of a parametrized function that was discovered without them.
+ */
+export async function readTestPage(cursor: string): Promise<DiscoveredTestPage> {
+    return JSON.parse(await fs.promises.readFile(cursor, 'utf-8')) as DiscoveredTestPage;
+}
+
+/**
+ * Returns the payload with its tree decoded from the compact 'v2' format, payloads in the
+ * regular format are returned unchanged.
+ */
+export function decodeDiscoveryPayload(payload: DiscoveredTestPayload): DiscoveredTestPayload {
+    if (payload.encoding !== 'v2' || !payload.tests) {
+        return payload;
+    }
+    const tests = decodeTestNode((payload.tests as unknown) as CompactTestNode, payload.paths ?? []);
+    const decoded: DiscoveredTestPayload = { ...payload, tests: tests as DiscoveredTestNode };
+    delete decoded.encoding;
+    delete decoded.paths;
+    return decoded;
+}
+
+function decodeTestNode(node: CompactTestNode, paths: string[]): DiscoveredTestNode | DiscoveredTestItem {
+    const { path: pathIndex, rid, children, ...rest } = node;
+    const nodePath = paths[pathIndex];
+    const id = rid !== undefined ? nodePath + rid : rest.id_ ?? '';
+    const decoded: Record<string, unknown> = { ...rest, path: nodePath, id_: id };
+    if (children !== undefined) {
+        decoded.children = children.map((child) => decodeTestNode(child, paths));
+    }
+    if (node.type_ === 'test' && decoded.runID === undefined) {
+        decoded.runID = id;
+    }
+    return (decoded as unknown) as DiscoveredTestNode | DiscoveredTestItem;
+}
+
+/**
+ * Returns the sorted lines of a list of `gap, length` pairs, where each pair is a range of
+ * consecutive lines that starts `gap` lines after the end of the previous range.
+ */
+export function decodeCoverageLines(encoded: number[]): number[] {
+    const lines: number[] = [];
+    let end = 0;
+    for (let index = 0; index + 1 < encoded.length; index += 2) {
+        const start = end + encoded[index];
+        end = start + encoded[index + 1];
+        for (let line = start; line < end; line += 1) {
+            lines.push(line);
+        }
+    }
+    return lines;
+}
+
+/**
+ * Returns the payload with the lines of its files decoded from ranges, payloads in the regular
+ * format are returned unchanged.
+ */
+export function decodeCoveragePayload(payload: CoveragePayload): CoveragePayload {
+    if (payload.encoding !== 'ranges' || !payload.result) {
+        return payload;
+    }
+    const result: { [filePathStr: string]: FileCoverageMetrics } = {};
+    for (const [filePath, metrics] of Object.entries(payload.result)) {
+        result[filePath] = {
+            ...metrics,
+            lines_covered: decodeCoverageLines(metrics.lines_covered ?? []),
+            lines_missed: decodeCoverageLines(metrics.lines_missed ?? []),
+        };
+    }
+    const decoded: CoveragePayload = { ...payload, result };
+    delete decoded.encoding;
+    return decoded;
+}
+
+/**
+ * Returns a report of the slowest test modules and conftests of a discovery, with the share of
+ * the discovery time each group took.
+ */
+export function formatCollectionTiming(timing: CollectionTiming): string {
+    const lines = [`Collecting the tests took ${timing.total.toFixed(2)}s.`];
+    const groups: [string, TimedPath[]][] = [
+        ['test modules', timing.modules],
+        ['conftest files', timing.conftests],
+    ];
+    for (const [name, timedPaths] of groups) {
+        if (timedPaths.length === 0) {
+            continue;
+        }
+        const duration = timedPaths.reduce((sum, timedPath) => sum + timedPath.duration, 0);
+        const share = timing.total > 0 ? Math.round((duration / timing.total) * 100) : 0;
+        lines.push(`Slowest ${name}, ${share}% of it:`);
+        lines.push(...timedPaths.map((timedPath) => `    ${timedPath.duration.toFixed(2)}s ${timedPath.path}`));
+    }
+    return lines.join('\n');
+}
+
+/**
+ * Returns a report of the setup and teardown times of the fixtures of a run, per scope and for
+ * the slowest fixtures.
+ */
+export function formatFixtureProfile(profile: FixtureProfile, maxFixtures = 10): string {
+    const formatStats = (stats: FixtureStats) =>
+        `${stats.count} setups, ${stats.setup.toFixed(2)}s setup, ${stats.teardown.toFixed(2)}s teardown`;
+    const lines = ['Fixture setups and teardowns per scope:'];
+    lines.push(...Object.entries(profile.scopes).map(([scope, stats]) => `    ${scope}: ${formatStats(stats)}`));
+    lines.push('Slowest fixtures:');
+    lines.push(
+        ...profile.fixtures.slice(0, maxFixtures).map((fixture) => {
+            const location = fixture.baseid || '<plugin>';
+            return `    ${fixture.name} (${fixture.scope}, ${location}): ${formatStats(fixture)}`;
+        }),
+    );
+    return lines.join('\n');
+}
+
 export function createExecutionErrorPayload(
     code: number | null,
     signal: NodeJS.Signals | null,
@@ -308,6 +559,20 @@ export function createExecutionErrorPayload(
     return etp;
 }
 
+/**
+ * Returns the duration of a test result in milliseconds, as expected by the test run API.
+ *
+ * @param testResult The result of a test, whose optional duration is in seconds.
+ * @returns The duration in milliseconds, or `undefined` if the result has no valid duration.
+ */
+export function getDurationMs(testResult: { duration?: number }): number | undefined {
+    const { duration } = testResult;
+    if (typeof duration !== 'number' || !Number.isFinite(duration) || duration < 0) {
+        return undefined;
+    }
+    return duration * 1000;
+}
+
 export function createDiscoveryErrorPayload(
     code: number | null,
     signal: NodeJS.Signals | null,
@@ -353,6 +353,11 @@ export class PythonTestController implements ITestController, IExtensionSingleAc
     private async resolveChildren(item: TestItem | undefined): Promise<void> {
         if (item) {
             traceVerbose(`Testing: Resolving item ${item.id}`);
+            const workspace = this.workspaceService.getWorkspaceFolder(item.uri);
+            const testAdapter = workspace ? this.testAdapters.get(workspace.uri) : undefined;
+            if (testAdapter?.resultResolver.lazyNodes.has(item.id)) {
+                return testAdapter.resultResolver.resolveLazyChildren(item, this.refreshCancellation.token);
+            }
             const settings = this.configSettings.getSettings(item.uri);
             if (settings.testing.pytestEnabled) {
                 return this.pytest.resolveChildren(this.testController, item, this.refreshCancellation.token);
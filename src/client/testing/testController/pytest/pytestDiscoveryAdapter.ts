@@ -109,6 +109,12 @@ export class PytestTestDiscoveryAdapter implements ITestDiscoveryAdapter {
         const pythonPathCommand = [fullPluginPath, ...pythonPathParts].join(path.delimiter);
         mutableEnv.PYTHONPATH = pythonPathCommand;
         mutableEnv.TEST_RUN_PIPE = discoveryPipeName;
+        // The tree is sent with a path table instead of repeating the path of each node.
+        mutableEnv.DISCOVERY_ENCODING = 'v2';
+        if (this.resultResolver?.discoveryCacheId) {
+            // Lets a cached discovery send only the changes to the tree that is already displayed.
+            mutableEnv.DISCOVERY_CACHE_ID = this.resultResolver.discoveryCacheId;
+        }
         traceInfo(
             `Environment variables set for pytest discovery: PYTHONPATH=${mutableEnv.PYTHONPATH}, TEST_RUN_PIPE=${mutableEnv.TEST_RUN_PIPE}`,
         );
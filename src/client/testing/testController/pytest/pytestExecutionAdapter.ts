@@ -104,6 +104,9 @@ export class PytestTestExecutionAdapter implements ITestExecutionAdapter {
         mutableEnv.TEST_RUN_PIPE = resultNamedPipeName;
         if (profileKind && profileKind === TestRunProfileKind.Coverage) {
             mutableEnv.COVERAGE_ENABLED = 'True';
+            // The files are sent in chunks as they are analyzed, with their lines as ranges, unless
+            // the environment asks for the per-line format with `COVERAGE_ENCODING=lines`.
+            mutableEnv.COVERAGE_ENCODING = mutableEnv.COVERAGE_ENCODING ?? 'ranges';
         }
         const debugBool = profileKind && profileKind === TestRunProfileKind.Debug;
 
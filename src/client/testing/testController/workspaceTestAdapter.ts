@@ -59,6 +59,10 @@ export class WorkspaceTestAdapter {
         const testCaseNodes: TestItem[] = [];
         const testCaseIdsSet = new Set<string>();
         try {
+            if (this.resultResolver.lazyNodes.size > 0) {
+                // Parametrized functions that were discovered without their cases need them to be run.
+                await this.resultResolver.resolveLazyDescendants(includes, token);
+            }
             // first fetch all the individual test Items that we necessarily want
             includes.forEach((t) => {
                 const nodes = getTestCaseNodes(t);
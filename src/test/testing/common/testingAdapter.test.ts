@@ -13,6 +13,7 @@ import {
     ITestController,
     ITestResultResolver,
     ExecutionTestPayload,
+    CoveragePayload,
 } from '../../../client/testing/testController/common/types';
 import { IPythonExecutionFactory } from '../../../client/common/process/types';
 import { IConfigurationService } from '../../../client/common/types';
@@ -805,6 +806,60 @@ suite('End to End Tests: test adapters', () => {
                 assert.ok(collectedOutput, 'expect output to be collected');
             });
     });
+    test('pytest coverage execution with the per-line format, small workspace', async () => {
+        // the extension asks for ranges, the per-line format is still sent when the environment asks for it
+        const { getEnvironmentVariables } = envVarsService;
+        sinon.stub(envVarsService, 'getEnvironmentVariables').callsFake(async (resource) => ({
+            ...(await getEnvironmentVariables.call(envVarsService, resource)),
+            COVERAGE_ENCODING: 'lines',
+        }));
+        resultResolver = new PythonResultResolver(testController, pytestProvider, workspaceUri);
+        const coveragePayloads: CoveragePayload[] = [];
+        const { resolveExecution } = resultResolver;
+        resultResolver.resolveExecution = (payload, runInstance) => {
+            if ('coverage' in payload) {
+                coveragePayloads.push(payload as CoveragePayload);
+            }
+            resolveExecution.call(resultResolver, payload, runInstance);
+        };
+        resultResolver._resolveCoverage = async (payload, _runInstance?) => {
+            assert.ok(payload.result, 'Expected results to be present');
+            const simpleFileCov = payload.result[`${rootPathCoverageWorkspace}/even.py`];
+            assert.ok(simpleFileCov, 'Expected even.py coverage to be present');
+            assert.strictEqual(simpleFileCov.lines_covered.length, 3, 'Expected 3 lines to be covered in even.py');
+            assert.strictEqual(simpleFileCov.lines_missed.length, 1, 'Expected 1 line to be missed in even.py');
+
+            return Promise.resolve();
+        };
+        // set workspace to test workspace folder
+        workspaceUri = Uri.parse(rootPathCoverageWorkspace);
+        configService.getSettings(workspaceUri).testing.pytestArgs = [];
+
+        // run pytest execution
+        const executionAdapter = new PytestTestExecutionAdapter(configService, resultResolver, envVarsService);
+        const testRun = typeMoq.Mock.ofType<TestRun>();
+        testRun
+            .setup((t) => t.token)
+            .returns(
+                () =>
+                    ({
+                        onCancellationRequested: () => undefined,
+                    } as any),
+            );
+        testRun.setup((t) => t.appendOutput(typeMoq.It.isAny())).returns(() => false);
+        await executionAdapter
+            .runTests(
+                workspaceUri,
+                [`${rootPathCoverageWorkspace}/test_even.py::TestNumbers::test_odd`],
+                TestRunProfileKind.Coverage,
+                testRun.object,
+                pythonExecFactory,
+            )
+            .then(() => {
+                assert.strictEqual(coveragePayloads.length, 1, 'Expected the coverage to be sent in one payload');
+                assert.strictEqual(coveragePayloads[0].encoding, undefined, 'Expected the lines not to be encoded');
+            });
+    });
     test('pytest execution adapter large workspace', async () => {
         // result resolver and saved data for assertions
         resultResolver = new PythonResultResolver(testController, pytestProvider, workspaceUri);
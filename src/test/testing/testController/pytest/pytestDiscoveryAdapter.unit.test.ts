@@ -57,6 +57,7 @@ suite('pytest test discovery adapter', () => {
         expectedExtraVariables = {
             PYTHONPATH: fullPluginPath,
             TEST_RUN_PIPE: 'discoveryResultPipe-mockName',
+            DISCOVERY_ENCODING: 'v2',
         };
 
         // set up config service
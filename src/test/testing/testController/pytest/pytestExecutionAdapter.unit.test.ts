@@ -319,6 +319,7 @@ suite('pytest test execution adapter', () => {
                     expectedArgs,
                     typeMoq.It.is<SpawnOptions>((options) => {
                         assert.equal(options.env?.COVERAGE_ENABLED, 'True');
+                        assert.equal(options.env?.COVERAGE_ENCODING, 'ranges');
                         return true;
                     }),
                 ),
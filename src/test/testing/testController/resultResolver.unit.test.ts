@@ -252,6 +252,199 @@ suite('Result Resolver tests', () => {
                 throw new Error("The replace method was called, but it shouldn't have been.");
             }
         });
+        test('resolveDiscovery merges streamed payloads instead of populating the test tree', async () => {
+            testProvider = 'pytest';
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(testController, testProvider, workspaceUri);
+            const tests: DiscoveredTestNode = {
+                path: 'path',
+                name: 'name',
+                type_: 'folder',
+                id_: 'id',
+                children: [],
+            };
+            const partialPayload: DiscoveredTestPayload = {
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                tests,
+                stream: 'partial',
+            };
+            const completePayload: DiscoveredTestPayload = {
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                stream: 'complete',
+                deselected: [],
+            };
+
+            const mergeTestTreeStub = sinon.stub(util, 'mergeTestTree').returns();
+            const populateTestTreeStub = sinon.stub(util, 'populateTestTree').returns();
+
+            resultResolver.resolveDiscovery(partialPayload, cancelationToken);
+            resultResolver.resolveDiscovery(partialPayload, cancelationToken);
+            resultResolver.resolveDiscovery(completePayload, cancelationToken);
+
+            sinon.assert.calledTwice(mergeTestTreeStub);
+            sinon.assert.calledWithMatch(
+                mergeTestTreeStub,
+                testController, // testController
+                tests, // testTreeData
+                undefined, // testRoot
+                resultResolver, // resultResolver
+                sinon.match.instanceOf(Set), // mergedIds
+                cancelationToken, // token
+            );
+            sinon.assert.notCalled(populateTestTreeStub);
+        });
+        test('resolveDiscovery patches the test tree with a cached discovery delta', async () => {
+            testProvider = 'pytest';
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(testController, testProvider, workspaceUri);
+            const added: DiscoveredTestNode = {
+                path: '/foo/bar',
+                name: 'bar',
+                type_: 'folder',
+                id_: '/foo/bar',
+                children: [],
+            };
+            const updated: DiscoveredTestNode = {
+                path: '/foo/bar',
+                name: 'bar',
+                type_: 'folder',
+                id_: '/foo/bar',
+                children: [
+                    {
+                        path: '/foo/bar/test_updated.py',
+                        name: 'test_updated.py',
+                        type_: 'file',
+                        id_: '/foo/bar/test_updated.py',
+                        children: [],
+                    },
+                ],
+            };
+            const payload: DiscoveredTestPayload = {
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                cache_id: 'cache-id',
+                delta: { added: [added], updated: [updated], removed: ['/foo/bar/test_removed.py'] },
+            };
+
+            const removeTestItemStub = sinon.stub(util, 'removeTestItem').returns(true);
+            const mergeTestTreeStub = sinon.stub(util, 'mergeTestTree').returns();
+            const populateTestTreeStub = sinon.stub(util, 'populateTestTree').returns();
+
+            resultResolver.resolveDiscovery(payload, cancelationToken);
+
+            sinon.assert.calledTwice(removeTestItemStub);
+            sinon.assert.calledWith(removeTestItemStub, testController, '/foo/bar/test_removed.py', resultResolver);
+            sinon.assert.calledWith(removeTestItemStub, testController, '/foo/bar/test_updated.py', resultResolver);
+            sinon.assert.calledTwice(mergeTestTreeStub);
+            sinon.assert.calledWithMatch(mergeTestTreeStub, testController, added, undefined, resultResolver);
+            sinon.assert.calledWithMatch(mergeTestTreeStub, testController, updated, undefined, resultResolver);
+            sinon.assert.notCalled(populateTestTreeStub);
+            assert.strictEqual(resultResolver.discoveryCacheId, 'cache-id');
+        });
+        test('resolveDiscovery decodes a tree in the compact format', async () => {
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(testController, testProvider, workspaceUri);
+            const tests: DiscoveredTestNode = {
+                path: '/foo/bar',
+                name: 'bar',
+                type_: 'folder',
+                id_: '/foo/bar',
+                children: [
+                    {
+                        path: '/foo/bar/test_a.py',
+                        name: 'test_a.py',
+                        type_: 'file',
+                        id_: '/foo/bar/test_a.py',
+                        children: [
+                            {
+                                path: '/foo/bar/test_a.py',
+                                name: 'test_b',
+                                type_: 'test',
+                                id_: '/foo/bar/test_a.py::test_b',
+                                runID: '/foo/bar/test_a.py::test_b',
+                                lineno: '1',
+                            },
+                        ],
+                    },
+                ],
+            };
+            const payload = ({
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                encoding: 'v2',
+                paths: ['/foo/bar', '/foo/bar/test_a.py'],
+                tests: {
+                    path: 0,
+                    name: 'bar',
+                    type_: 'folder',
+                    rid: '',
+                    children: [
+                        {
+                            path: 1,
+                            name: 'test_a.py',
+                            type_: 'file',
+                            rid: '',
+                            children: [{ path: 1, name: 'test_b', type_: 'test', rid: '::test_b', lineno: '1' }],
+                        },
+                    ],
+                },
+            } as unknown) as DiscoveredTestPayload;
+
+            const populateTestTreeStub = sinon.stub(util, 'populateTestTree').returns();
+
+            resultResolver.resolveDiscovery(payload, cancelationToken);
+
+            sinon.assert.calledOnce(populateTestTreeStub);
+            assert.deepStrictEqual(populateTestTreeStub.firstCall.args[1], tests);
+        });
+        test('resolveLazyChildren adds the cases of a lazy function once, one page at a time', async () => {
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(testController, testProvider, workspaceUri);
+            const functionId = '/foo/bar/test_a.py::test_b';
+            const functionItem = ({
+                id: functionId,
+                label: 'test_b',
+                uri: Uri.file('/foo/bar/test_a.py'),
+                busy: false,
+            } as unknown) as TestItem;
+            const cases = [0, 1, 2].map((index) => ({
+                path: '/foo/bar/test_a.py',
+                name: `test_b[${index}]`,
+                type_: 'test' as const,
+                id_: `${functionId}[${index}]`,
+                runID: `${functionId}[${index}]`,
+                lineno: '1',
+            }));
+            resultResolver.lazyNodes.set(functionId, { item: functionItem, cursor: '/pages/0-0.json' });
+
+            const readTestPageStub = sinon.stub(util, 'readTestPage');
+            readTestPageStub
+                .withArgs('/pages/0-0.json')
+                .resolves({ children: cases.slice(0, 2), next: '/pages/0-1.json' });
+            readTestPageStub.withArgs('/pages/0-1.json').resolves({ children: cases.slice(2), next: null });
+            const populateTestTreeStub = sinon.stub(util, 'populateTestTree').returns();
+
+            await Promise.all([
+                resultResolver.resolveLazyChildren(functionItem, cancelationToken),
+                resultResolver.resolveLazyDescendants([({ id: '/foo/bar' } as unknown) as TestItem], cancelationToken),
+            ]);
+
+            sinon.assert.calledTwice(readTestPageStub);
+            sinon.assert.calledTwice(populateTestTreeStub);
+            assert.deepStrictEqual(populateTestTreeStub.firstCall.args[1].children, cases.slice(0, 2));
+            assert.deepStrictEqual(populateTestTreeStub.secondCall.args[1].children, cases.slice(2));
+            sinon.assert.calledWith(
+                populateTestTreeStub,
+                testController,
+                sinon.match.any,
+                functionItem,
+                resultResolver,
+            );
+            assert.strictEqual(resultResolver.lazyNodes.has(functionId), false);
+            assert.strictEqual(functionItem.busy, false);
+        });
     });
     suite('Test execution result resolver', () => {
         let resultResolver: ResultResolver.PythonResultResolver;
@@ -534,6 +727,56 @@ suite('Result Resolver tests', () => {
             // verify that the passed function was called for the single test item
             runInstance.verify((r) => r.passed(typemoq.It.isAny()), typemoq.Times.once());
         });
+        test('resolveExecution reports the duration of a test in milliseconds', async () => {
+            testProvider = 'pytest';
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(
+                testControllerMock.object,
+                testProvider,
+                workspaceUri,
+            );
+            resultResolver.runIdToVSid.set('mockTestItem1', 'mockTestItem1');
+            resultResolver.runIdToTestItem.set('mockTestItem1', mockTestItem1);
+
+            const successPayload: ExecutionTestPayload = {
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                result: {
+                    mockTestItem1: {
+                        test: 'test',
+                        outcome: 'success',
+                        duration: 1.5,
+                    },
+                },
+                error: '',
+            };
+
+            resultResolver.resolveExecution(successPayload, runInstance.object);
+
+            runInstance.verify((r) => r.passed(typemoq.It.isAny(), 1500), typemoq.Times.once());
+        });
+        test('resolveExecution reports tests that were not found as errored', async () => {
+            testProvider = 'pytest';
+            workspaceUri = Uri.file('/foo/bar');
+            resultResolver = new ResultResolver.PythonResultResolver(
+                testControllerMock.object,
+                testProvider,
+                workspaceUri,
+            );
+            resultResolver.runIdToVSid.set('mockTestItem1', 'mockTestItem1');
+            resultResolver.runIdToTestItem.set('mockTestItem1', mockTestItem1);
+
+            const notFoundPayload: ExecutionTestPayload = {
+                cwd: workspaceUri.fsPath,
+                status: 'success',
+                not_found: ['mockTestItem1'],
+                error: '',
+            };
+
+            resultResolver.resolveExecution(notFoundPayload, runInstance.object);
+
+            runInstance.verify((r) => r.errored(typemoq.It.isAny(), typemoq.It.isAny()), typemoq.Times.once());
+        });
         test('resolveExecution handles error correctly', async () => {
             // test specific constants used expected values
             testProvider = 'pytest';
@@ -3,7 +3,18 @@ import * as sinon from 'sinon';
 import * as fs from 'fs';
 import * as path from 'path';
 import { CancellationToken, TestController, TestItem, Uri, Range, Position } from 'vscode';
-import { writeTestIdsFile, populateTestTree } from '../../../client/testing/testController/common/utils';
+import {
+    writeTestIdsFile,
+    populateTestTree,
+    mergeTestTree,
+    removeTestItem,
+    getFileNodeIds,
+    getDurationMs,
+    formatCollectionTiming,
+    formatFixtureProfile,
+    decodeCoverageLines,
+    decodeCoveragePayload,
+} from '../../../client/testing/testController/common/utils';
 import { EXTENSION_ROOT_DIR } from '../../../client/constants';
 import {
     DiscoveredTestNode,
@@ -749,3 +760,300 @@ suite('populateTestTree tests', () => {
         assert.deepStrictEqual(mockTestItem2.range, new Range(new Position(6, 0), new Position(7, 0)));
     });
 });
+
+suite('mergeTestTree tests', () => {
+    let sandbox: sinon.SinonSandbox;
+    let testController: TestController;
+    let resultResolver: ITestResultResolver;
+    let createTestItemStub: sinon.SinonStub;
+
+    setup(() => {
+        sandbox = sinon.createSandbox();
+        createTestItemStub = sandbox.stub();
+        testController = {
+            createTestItem: createTestItemStub,
+            items: {
+                add: sandbox.stub(),
+                get: sandbox.stub(),
+            },
+        } as any;
+        resultResolver = {
+            runIdToTestItem: new Map(),
+            runIdToVSid: new Map(),
+            vsIdToRunId: new Map(),
+            detailedCoverageMap: new Map(),
+            resolveDiscovery: sandbox.stub(),
+            resolveExecution: sandbox.stub(),
+            _resolveDiscovery: sandbox.stub(),
+            _resolveExecution: sandbox.stub(),
+            _resolveCoverage: sandbox.stub(),
+        };
+    });
+
+    teardown(() => {
+        sandbox.restore();
+    });
+
+    test('should reuse existing children and only create missing ones', () => {
+        // Tree structure:
+        // RootTest (folder)
+        // └── test_file.py (file, already in the tree)
+        //     └── test_new (test, not yet in the tree)
+        const newTestItem: DiscoveredTestItem = {
+            path: '/test/path/test_file.py',
+            name: 'test_new',
+            type_: 'test',
+            id_: 'test-new-id',
+            lineno: 3,
+            runID: 'test-new-run-id',
+        };
+        const fileNode: DiscoveredTestNode = {
+            path: '/test/path/test_file.py',
+            name: 'test_file.py',
+            type_: 'file',
+            id_: 'file-id',
+            children: [newTestItem],
+        };
+        const testTreeData: DiscoveredTestNode = {
+            path: '/test/path',
+            name: 'RootTest',
+            type_: 'folder',
+            id_: '/test/path',
+            children: [fileNode],
+        };
+
+        const fileChildrenAddStub = sandbox.stub();
+        const existingFileItem: TestItem = {
+            id: 'file-id',
+            children: { get: sandbox.stub().returns(undefined), add: fileChildrenAddStub },
+        } as any;
+        const rootItem: TestItem = {
+            id: '/test/path',
+            children: { get: sandbox.stub().withArgs('file-id').returns(existingFileItem), add: sandbox.stub() },
+        } as any;
+        const newItem: TestItem = { id: 'test-new-id', tags: [] } as any;
+        createTestItemStub.returns(newItem);
+        const mergedIds = new Set<string>();
+
+        mergeTestTree(testController, testTreeData, rootItem, resultResolver, mergedIds);
+
+        assert.ok(createTestItemStub.calledOnceWith('test-new-id', 'test_new', sinon.match.any));
+        assert.ok(fileChildrenAddStub.calledOnceWith(newItem));
+        assert.strictEqual(newItem.canResolveChildren, false);
+        assert.deepStrictEqual(newItem.range, new Range(new Position(2, 0), new Position(3, 0)));
+        assert.deepStrictEqual(Array.from(mergedIds).sort(), ['/test/path', 'file-id', 'test-new-id']);
+        assert.strictEqual(resultResolver.runIdToTestItem.get('test-new-run-id'), newItem);
+        assert.strictEqual(resultResolver.vsIdToRunId.get('test-new-id'), 'test-new-run-id');
+    });
+});
+
+suite('removeTestItem tests', () => {
+    function createItem(id: string, children: TestItem[] = []): TestItem {
+        const childMap = new Map(children.map((child) => [child.id, child]));
+        return {
+            id,
+            children: {
+                get: (childId: string) => childMap.get(childId),
+                delete: (childId: string) => childMap.delete(childId),
+                forEach: (callback: (item: TestItem) => void) => childMap.forEach((child) => callback(child)),
+                get size() {
+                    return childMap.size;
+                },
+            },
+        } as any;
+    }
+
+    function createResultResolver(): ITestResultResolver {
+        return {
+            runIdToTestItem: new Map(),
+            runIdToVSid: new Map(),
+            vsIdToRunId: new Map(),
+            detailedCoverageMap: new Map(),
+            resolveDiscovery: sinon.stub(),
+            resolveExecution: sinon.stub(),
+            _resolveDiscovery: sinon.stub(),
+            _resolveExecution: sinon.stub(),
+            _resolveCoverage: sinon.stub(),
+        };
+    }
+
+    test('should remove the item, its run ids and the folders left empty', () => {
+        // Tree structure:
+        // /root (folder)
+        // ├── /root/sub (folder)
+        // │   └── /root/sub/test_a.py (file)
+        // │       └── /root/sub/test_a.py::test_a (test)
+        // └── /root/test_b.py (file)
+        const testA = createItem('/root/sub/test_a.py::test_a');
+        const sub = createItem('/root/sub', [createItem('/root/sub/test_a.py', [testA])]);
+        const testB = createItem('/root/test_b.py');
+        const root = createItem('/root', [sub, testB]);
+        const testController = { items: createItem('items', [root]).children } as any;
+        const resultResolver = createResultResolver();
+        resultResolver.runIdToTestItem.set('test_a', testA);
+        resultResolver.runIdToVSid.set('test_a', testA.id);
+        resultResolver.vsIdToRunId.set(testA.id, 'test_a');
+
+        assert.ok(removeTestItem(testController, '/root/sub/test_a.py', resultResolver));
+
+        assert.strictEqual(root.children.get('/root/sub'), undefined);
+        assert.strictEqual(root.children.get('/root/test_b.py'), testB);
+        assert.strictEqual(resultResolver.runIdToTestItem.size, 0);
+        assert.strictEqual(resultResolver.runIdToVSid.size, 0);
+        assert.strictEqual(resultResolver.vsIdToRunId.size, 0);
+    });
+
+    test('should return false if the item is not in the tree', () => {
+        const root = createItem('/root', [createItem('/root/test_b.py')]);
+        const testController = { items: createItem('items', [root]).children } as any;
+
+        assert.ok(!removeTestItem(testController, '/root/test_c.py', createResultResolver()));
+        assert.strictEqual(root.children.size, 1);
+    });
+
+    test('getFileNodeIds should return the ids of the file nodes', () => {
+        const testTreeData: DiscoveredTestNode = {
+            path: '/root',
+            name: 'root',
+            type_: 'folder',
+            id_: '/root',
+            children: [
+                {
+                    path: '/root/test_a.py',
+                    name: 'test_a.py',
+                    type_: 'file',
+                    id_: '/root/test_a.py',
+                    children: [],
+                },
+            ],
+        };
+
+        assert.deepStrictEqual(getFileNodeIds(testTreeData), ['/root/test_a.py']);
+    });
+});
+
+suite('getDurationMs tests', () => {
+    test('converts a duration in seconds to milliseconds', () => {
+        assert.strictEqual(getDurationMs({ duration: 0.25 }), 250);
+        assert.strictEqual(getDurationMs({ duration: 0 }), 0);
+    });
+
+    test('returns undefined for a missing or invalid duration', () => {
+        assert.strictEqual(getDurationMs({}), undefined);
+        assert.strictEqual(getDurationMs({ duration: -1 }), undefined);
+        assert.strictEqual(getDurationMs({ duration: Number.NaN }), undefined);
+    });
+});
+
+suite('formatCollectionTiming tests', () => {
+    test('reports the slowest modules and conftests with their share of the discovery', () => {
+        const report = formatCollectionTiming({
+            total: 2,
+            modules: [
+                { path: '/repo/tests/test_heavy.py', duration: 1.2 },
+                { path: '/repo/tests/test_light.py', duration: 0.2 },
+            ],
+            conftests: [{ path: '/repo/conftest.py', duration: 0.5 }],
+        });
+        assert.strictEqual(
+            report,
+            [
+                'Collecting the tests took 2.00s.',
+                'Slowest test modules, 70% of it:',
+                '    1.20s /repo/tests/test_heavy.py',
+                '    0.20s /repo/tests/test_light.py',
+                'Slowest conftest files, 25% of it:',
+                '    0.50s /repo/conftest.py',
+            ].join('\n'),
+        );
+    });
+
+    test('omits the groups without entries', () => {
+        const report = formatCollectionTiming({ total: 0, modules: [], conftests: [] });
+        assert.strictEqual(report, 'Collecting the tests took 0.00s.');
+    });
+});
+
+suite('formatFixtureProfile tests', () => {
+    test('reports the totals per scope and the slowest fixtures', () => {
+        const report = formatFixtureProfile(
+            {
+                fixtures: [
+                    { name: 'database', scope: 'session', baseid: 'tests', count: 1, setup: 2, teardown: 0.5 },
+                    { name: 'row', scope: 'function', baseid: 'tests', count: 40, setup: 1.2, teardown: 0.4 },
+                    { name: 'tmp_path', scope: 'function', baseid: '', count: 40, setup: 0.1, teardown: 0 },
+                ],
+                scopes: {
+                    session: { count: 1, setup: 2, teardown: 0.5 },
+                    function: { count: 80, setup: 1.3, teardown: 0.4 },
+                },
+            },
+            2,
+        );
+        assert.strictEqual(
+            report,
+            [
+                'Fixture setups and teardowns per scope:',
+                '    session: 1 setups, 2.00s setup, 0.50s teardown',
+                '    function: 80 setups, 1.30s setup, 0.40s teardown',
+                'Slowest fixtures:',
+                '    database (session, tests): 1 setups, 2.00s setup, 0.50s teardown',
+                '    row (function, tests): 40 setups, 1.20s setup, 0.40s teardown',
+            ].join('\n'),
+        );
+    });
+});
+
+suite('decodeCoveragePayload tests', () => {
+    test('decodes gap, length pairs into sorted lines', () => {
+        assert.deepStrictEqual(decodeCoverageLines([]), []);
+        assert.deepStrictEqual(decodeCoverageLines([1, 3, 3, 2, 1, 1]), [1, 2, 3, 7, 8, 10]);
+    });
+
+    test('decodes the lines of each file of a ranges payload', () => {
+        const decoded = decodeCoveragePayload({
+            coverage: true,
+            cwd: '/a/b',
+            error: '',
+            encoding: 'ranges',
+            result: {
+                '/a/b/c.py': {
+                    lines_covered: [1, 2],
+                    lines_missed: [4, 1, 2, 2],
+                    executed_branches: 1,
+                    total_branches: 2,
+                },
+            },
+        });
+        assert.deepStrictEqual(decoded, {
+            coverage: true,
+            cwd: '/a/b',
+            error: '',
+            result: {
+                '/a/b/c.py': {
+                    lines_covered: [1, 2],
+                    lines_missed: [4, 7, 8],
+                    executed_branches: 1,
+                    total_branches: 2,
+                },
+            },
+        });
+    });
+
+    test('returns regular payloads unchanged', () => {
+        const payload = {
+            coverage: true,
+            cwd: '/a/b',
+            error: '',
+            result: {
+                '/a/b/c.py': {
+                    lines_covered: [3, 1],
+                    lines_missed: [2],
+                    executed_branches: 0,
+                    total_branches: -1,
+                },
+            },
+        };
+        assert.strictEqual(decodeCoveragePayload(payload), payload);
+    });
+});
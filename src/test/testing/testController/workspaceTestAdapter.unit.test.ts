@@ -281,6 +281,7 @@ suite('Workspace test adapter', () => {
                 vsIdToRunId: {
                     get: sinon.stub().returns('expectedRunId'),
                 },
+                lazyNodes: new Map(),
             } as unknown) as ITestResultResolver;
             const testItem = ({
                 canResolveChildren: false,